@@ -1,8 +1,9 @@
 import logging
+import mimetypes
 import os
 
 from celery import Celery
-from flask import g, Flask, jsonify, send_from_directory
+from flask import g, Flask, jsonify, Response, send_from_directory
 from flask_restplus import Api
 from flask_mail import Mail
 from flask_migrate import Migrate
@@ -26,6 +27,7 @@ from .config import configs, Config
 celery = Celery(__name__, broker=Config.CELERY_BROKER_URL)
 
 from .lib import constants
+from .lib.blobs import get_fulltext_relpath
 from .lib.utils import get_rotating_file_handler, get_console_handler
 
 from .api.errors import not_found_error, forbidden_error
@@ -56,6 +58,8 @@ def create_app(config_name):
     config.init_app(app)
     os.makedirs(config.FULLTEXT_UPLOADS_DIR, exist_ok=True)
     os.makedirs(config.RANKING_MODELS_DIR, exist_ok=True)
+    os.makedirs(config.EXPORTS_DIR, exist_ok=True)
+    os.makedirs(config.CITATIONS_DIR, exist_ok=True)
 
     app.logger.addHandler(
         get_rotating_file_handler(os.path.join(config.LOGS_DIR, config.LOG_FILENAME)))
@@ -111,18 +115,16 @@ def create_app(config_name):
         })
     def get_uploaded_fulltext_file(id, review_id):
         """get fulltext content file for a single fulltext by id"""
-        filename = None
-        if review_id is None:
-            for dirname, _, filenames in os.walk(app.config['FULLTEXT_UPLOADS_DIR']):
-                for ext in app.config['ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS']:
-                    fname = '{}{}'.format(id, ext)
-                    if fname in filenames:
-                        filename = fname
-                        upload_dir = dirname
-                        break
-        else:
+        # resolve the file's location from the db, rather than searching disk for it
+        from colandr.models import Fulltext, Review
+        fulltext = db.session.query(
+            Fulltext.review_id, Fulltext.filename, Fulltext.content_hash)\
+            .filter_by(id=id).one_or_none()
+        if not fulltext or not fulltext.filename:
+            return not_found_error(
+                'no uploaded file for <Fulltext(id={})> found'.format(id))
+        if review_id is not None:
             # authenticate current user
-            from colandr.models import Review
             review = db.session.query(Review).get(review_id)
             if not review:
                 return not_found_error('<Review(id={})> not found'.format(review_id))
@@ -130,17 +132,20 @@ def create_app(config_name):
                     review.users.filter_by(id=g.current_user.id).one_or_none() is None):
                 return forbidden_error(
                     '{} forbidden to get this review\'s fulltexts'.format(g.current_user))
-            upload_dir = os.path.join(
-                app.config['FULLTEXT_UPLOADS_DIR'], str(review_id))
-            for ext in app.config['ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS']:
-                fname = '{}{}'.format(id, ext)
-                if os.path.isfile(os.path.join(upload_dir, fname)):
-                    filename = fname
-                    break
-        if not filename:
-            return not_found_error(
-                'no uploaded file for <Fulltext(id={})> found'.format(id))
-        return send_from_directory(upload_dir, filename)
+            if fulltext.review_id != review_id:
+                return not_found_error(
+                    'no uploaded file for <Fulltext(id={})> found in {}'.format(id, review))
+        relpath = get_fulltext_relpath(
+            fulltext.review_id, fulltext.filename, fulltext.content_hash)
+        # let the web server send the file's bytes, if configured to do so
+        accel_redirect_location = app.config['FULLTEXT_ACCEL_REDIRECT_LOCATION']
+        if accel_redirect_location:
+            response = Response(
+                mimetype=mimetypes.guess_type(fulltext.filename)[0] or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = '{}/{}'.format(
+                accel_redirect_location.rstrip('/'), relpath.replace(os.sep, '/'))
+            return response
+        return send_from_directory(app.config['FULLTEXT_UPLOADS_DIR'], relpath)
 
     @app.errorhandler(Exception)
     def handle_error(err):
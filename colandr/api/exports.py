@@ -0,0 +1,105 @@
+"""
+Queries for exporting a review's studies and screenings, shared by the streamed
+CSV export endpoint and the background columnar export task. Each is a single
+select, meant to be executed via a server-side cursor and consumed in chunks.
+"""
+from sqlalchemy import distinct, func, literal, select, union_all
+
+from ..models import (db, Citation, CitationScreening, DataExtraction, DataSource,
+                      Fulltext, FulltextScreening, ReviewPlan, Study)
+
+
+STUDIES_EXPORT_FIELDNAMES = [
+    'study_id',
+    'deduplication_status',
+    'citation_screening_status',
+    'fulltext_screening_status',
+    'data_extraction_screening_status',
+    'data_source_type',
+    'data_source_name',
+    'data_source_url',
+    'citation_title',
+    'citation_abstract',
+    'citation_authors',
+    'citation_journal_name',
+    'citation_journal_volume',
+    'citation_pub_year',
+    'citation_keywords',
+    'fulltext_filename',
+    'fulltext_exclude_reasons'
+    ]
+
+
+def get_data_extraction_fields(review_id):
+    """
+    Returns:
+        List[Tuple[str, str]]: (label, field_type) pairs of the review's data
+            extraction form, in order; empty if it doesn't have a form
+    """
+    data_extraction_form = db.session.query(ReviewPlan.data_extraction_form)\
+        .filter_by(id=review_id).one_or_none()
+    if not data_extraction_form or not data_extraction_form[0]:
+        return []
+    return [(item['label'], item['field_type']) for item in data_extraction_form[0]]
+
+
+def get_studies_export_query(review_id):
+    """
+    Get a query for all of a review's studies, joined with their data sources,
+    citations, fulltexts, and extracted data, in order of study id.
+    """
+    # aggregate each fulltext's exclude reasons across its screenings up front,
+    # rather than loading all screenings for each fulltext one by one
+    reasons = select([FulltextScreening.fulltext_id,
+                      func.unnest(FulltextScreening.exclude_reasons).label('reason')])\
+        .where(FulltextScreening.review_id == review_id)\
+        .alias('reasons')
+    exclude_reasons = select([reasons.c.fulltext_id,
+                              func.array_agg(distinct(reasons.c.reason)).label('exclude_reasons')])\
+        .group_by(reasons.c.fulltext_id)\
+        .alias('exclude_reasons')
+    return select([Study.id, Study.dedupe_status, Study.citation_status,
+                   Study.fulltext_status, Study.data_extraction_status,
+                   DataSource.source_type, DataSource.source_name, DataSource.source_url,
+                   Citation.title, Citation.abstract, Citation.authors,
+                   Citation.journal_name, Citation.volume, Citation.pub_year,
+                   Citation.keywords,
+                   Fulltext.id.label('fulltext_id'), Fulltext.original_filename,
+                   exclude_reasons.c.exclude_reasons,
+                   DataExtraction.id.label('data_extraction_id'),
+                   DataExtraction.extracted_items])\
+        .select_from(
+            Study.__table__
+            .join(DataSource.__table__, Study.data_source_id == DataSource.id)
+            .outerjoin(Citation.__table__, Citation.id == Study.id)
+            .outerjoin(Fulltext.__table__, Fulltext.id == Study.id)
+            .outerjoin(exclude_reasons, exclude_reasons.c.fulltext_id == Study.id)
+            .outerjoin(DataExtraction.__table__, DataExtraction.id == Study.id))\
+        .where(Study.review_id == review_id)\
+        .order_by(Study.id)
+
+
+def get_screenings_export_query(review_id):
+    """
+    Get a query for all of a review's citation and fulltext screenings, i.e.
+    individual users' screening decisions, in order of stage and study id.
+    """
+    citation_screenings = select([
+        literal('citation').label('stage'),
+        CitationScreening.citation_id.label('study_id'),
+        CitationScreening.user_id,
+        CitationScreening.status,
+        CitationScreening.exclude_reasons,
+        CitationScreening.created_at])\
+        .where(CitationScreening.review_id == review_id)
+    fulltext_screenings = select([
+        literal('fulltext').label('stage'),
+        FulltextScreening.fulltext_id.label('study_id'),
+        FulltextScreening.user_id,
+        FulltextScreening.status,
+        FulltextScreening.exclude_reasons,
+        FulltextScreening.created_at])\
+        .where(FulltextScreening.review_id == review_id)
+    screenings = union_all(citation_screenings, fulltext_screenings).alias('screenings')
+    return select([screenings])\
+        .order_by(screenings.c.stage, screenings.c.study_id, screenings.c.user_id)
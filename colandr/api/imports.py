@@ -0,0 +1,207 @@
+"""
+Load citations parsed from an uploaded file into a review in fixed-size chunks,
+each one written to the database via Postgres ``COPY``, so that memory use
+stays bounded no matter how many records the file contains.
+"""
+import collections
+import io
+import json
+import os
+
+from sqlalchemy import text
+
+from ..lib.parsers import BibTexFile, RisFile
+from ..lib.utils import get_console_logger, iter_chunks
+from .schemas import CitationSchema
+
+
+CITATIONS_FILE_PARSERS = {
+    '.bib': BibTexFile,
+    '.ris': RisFile,
+    '.txt': RisFile,
+    }
+
+STUDY_COPY_COLUMNS = (
+    'id', 'user_id', 'review_id', 'data_source_id', 'citation_status')
+CITATION_COPY_COLUMNS = (
+    'id', 'review_id', 'type_of_work', 'title', 'secondary_title', 'abstract',
+    'pub_year', 'pub_month', 'authors', 'keywords', 'type_of_reference',
+    'journal_name', 'volume', 'issue_number', 'doi', 'issn', 'publisher',
+    'language', 'other_fields')
+FULLTEXT_COPY_COLUMNS = ('id', 'review_id')
+
+# claim a block of study ids up front, so citations can be copied alongside
+# their studies without a round trip to get each inserted study's id back
+RESERVE_STUDY_IDS = text("""
+    SELECT nextval(pg_get_serial_sequence('studies', 'id'))
+    FROM generate_series(1, :n)
+    """)
+
+logger = get_console_logger(__name__)
+
+
+def get_citations_file_parser(filename):
+    """
+    Returns:
+        type: :class:`RisFile` or :class:`BibTexFile`, depending on the
+            extension of ``filename``, or None if it's not a known file type
+    """
+    return CITATIONS_FILE_PARSERS.get(os.path.splitext(filename)[1].lower())
+
+
+def get_import_filepath(citations_dir, review_id, import_id, filename):
+    """Get the path on disk to which the file uploaded for an import is saved."""
+    return os.path.join(
+        citations_dir, str(review_id),
+        '{}{}'.format(import_id, os.path.splitext(filename)[1].lower()))
+
+
+def remove_import_file(filepath):
+    """Remove the file uploaded for an import from disk, if it's still there."""
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+
+def iter_citations(records, review_id, counts=None):
+    """
+    Validate parsed citation records, skipping (and counting, under the
+    'failed' key of ``counts``, if given) any that can't be loaded.
+
+    Yields:
+        dict: next citation, as loaded by :class:`CitationSchema`
+    """
+    citation_schema = CitationSchema()
+    # rather than a for loop, we use a while loop so that parsing errors
+    # on individual citations can be caught and logged
+    while True:
+        try:
+            record = next(records)
+            record['review_id'] = review_id
+            yield citation_schema.load(record).data
+        except StopIteration:
+            return
+        except Exception as e:
+            logger.warning('parsing error: %s', e)
+            if counts is not None:
+                counts['failed'] += 1
+
+
+def validate_citations(records, review_id):
+    """
+    Validate parsed citation ``records`` as they would be imported into
+    review ``review_id``, without importing them.
+
+    Returns:
+        Tuple[int, int]: numbers of citations that would be imported and failed
+    """
+    counts = collections.Counter()
+    for _ in iter_citations(records, review_id, counts=counts):
+        counts['imported'] += 1
+    return counts['imported'], counts['failed']
+
+
+def _format_copy_value(value):
+    """Format ``value`` as a field in Postgres' ``COPY`` text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (list, tuple)):
+        value = '{' + ','.join(
+            '"' + str(val).replace('\\', '\\\\').replace('"', '\\"') + '"'
+            for val in value) + '}'
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\')\
+        .replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_rows(cursor, table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_format_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(
+        'COPY {} ({}) FROM STDIN'.format(table, ', '.join(columns)), buffer)
+
+
+def copy_citations(connection, citations, review_id, user_id, data_source_id,
+                   status=None):
+    """
+    Insert a chunk of citations into review ``review_id``, along with their
+    studies and, if ``status`` is 'included', their fulltexts.
+
+    Args:
+        connection (:class:`sqlalchemy.engine.Connection`)
+        citations (List[dict]): as yielded by :func:`iter_citations`
+        review_id (int)
+        user_id (int)
+        data_source_id (int)
+        status (str): known citation screening status of all citations, if any
+
+    Returns:
+        List[int]: ids of the inserted studies, in the order of ``citations``
+    """
+    study_ids = [
+        row[0] for row in connection.execute(RESERVE_STUDY_IDS, n=len(citations))]
+    cursor = connection.connection.cursor()
+    try:
+        _copy_rows(
+            cursor, 'studies', STUDY_COPY_COLUMNS,
+            ((study_id, user_id, review_id, data_source_id, status or 'not_screened')
+             for study_id in study_ids))
+        _copy_rows(
+            cursor, 'citations', CITATION_COPY_COLUMNS,
+            ([study_id, review_id] +
+             [citation.get('title') or 'untitled' if column == 'title'
+              else citation.get('other_fields', {}) if column == 'other_fields'
+              else citation.get(column)
+              for column in CITATION_COPY_COLUMNS[2:]]
+             for study_id, citation in zip(study_ids, citations)))
+        # bulk operations won't trigger the fancy events defined in models.py,
+        # so included citations' fulltexts have to be inserted here
+        if status == 'included':
+            _copy_rows(
+                cursor, 'fulltexts', FULLTEXT_COPY_COLUMNS,
+                ((study_id, review_id) for study_id in study_ids))
+    finally:
+        cursor.close()
+    return study_ids
+
+
+def import_citations(connection, records, review_id, user_id, data_source_id,
+                     status=None, chunk_size=2000, on_progress=None):
+    """
+    Stream parsed citation ``records`` into review ``review_id``, copying
+    them into the database ``chunk_size`` at a time.
+
+    Args:
+        connection (:class:`sqlalchemy.engine.Connection`)
+        records (Iterator[dict]): as yielded by ``RisFile.parse()``
+            or ``BibTexFile.parse()``
+        review_id (int)
+        user_id (int)
+        data_source_id (int)
+        status (str)
+        chunk_size (int)
+        on_progress (callable): if given, called after each chunk with the
+            numbers of records imported and failed so far
+
+    Returns:
+        Tuple[int, int]: numbers of citations imported and failed
+    """
+    counts = collections.Counter()
+    citations = iter_citations(records, review_id, counts=counts)
+    for chunk in iter_chunks(citations, chunk_size):
+        copy_citations(
+            connection, chunk, review_id, user_id, data_source_id,
+            status=status)
+        counts['imported'] += len(chunk)
+        logger.debug(
+            '<Review(id=%s)>: copied %s citations', review_id, counts['imported'])
+        if on_progress is not None:
+            on_progress(counts['imported'], counts['failed'])
+    return counts['imported'], counts['failed']
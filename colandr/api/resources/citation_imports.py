@@ -1,3 +1,5 @@
+import os
+
 from flask import g, current_app
 from flask_restplus import Resource
 
@@ -6,15 +8,14 @@ from marshmallow import ValidationError
 from marshmallow.validate import Length, OneOf, Range, URL
 from webargs.flaskparser import use_kwargs
 
-from sqlalchemy import create_engine
-
 from colandr import api_
 from ...lib import constants
-from ...lib.parsers import BibTexFile, RisFile
-from ...models import db, Citation, DataSource, Fulltext, Import, Review, Study
-from ...tasks import deduplicate_citations, get_citations_text_content_vectors
+from ...models import db, DataSource, Import, Review
+from ...tasks import import_citations_file
 from ..errors import not_found_error, forbidden_error, validation_error
-from ..schemas import CitationSchema, DataSourceSchema, ImportSchema
+from ..imports import (get_citations_file_parser, get_import_filepath, remove_import_file,
+                       validate_citations)
+from ..schemas import DataSourceSchema, ImportSchema
 from ..authentication import auth
 
 
@@ -79,9 +80,11 @@ class CitationsImportsResource(Resource):
                      'description': 'if True, request will be validated but no data will be affected'},
             },
         responses={
-            200: 'successfully imported citations in bulk',
+            200: 'request was valid, but citations not imported because `test=True`; numbers of records that would be imported and that failed validation are returned',
+            202: 'successfully started importing citations in bulk',
             403: 'current app user forbidden to import citations for this review',
-            404: 'no review with matching id was found'
+            404: 'no review with matching id was found',
+            422: 'unknown or unparseable citations file',
             }
         )
     @use_kwargs({
@@ -109,19 +112,8 @@ class CitationsImportsResource(Resource):
             return forbidden_error(
                 '{} forbidden to add citations to this review'.format(g.current_user))
         fname = uploaded_file.filename
-        if fname.endswith('.bib'):
-            try:
-                citations_file = BibTexFile(uploaded_file.stream)
-            except Exception:
-                return validation_error(
-                    'unable to parse BibTex citations file: "{}"'.format(fname))
-        elif fname.endswith('.ris') or fname.endswith('.txt'):
-            try:
-                citations_file = RisFile(uploaded_file.stream)
-            except Exception:
-                return validation_error(
-                    'unable to parse RIS citations file: "{}"'.format(fname))
-        else:
+        citations_file_parser = get_citations_file_parser(fname)
+        if citations_file_parser is None:
             return validation_error('unknown file type: "{}"'.format(fname))
 
         # upsert the data source
@@ -137,89 +129,79 @@ class CitationsImportsResource(Resource):
         if data_source is None:
             data_source = DataSource(source_type, source_name, source_url=source_url)
             db.session.add(data_source)
-        if test is False:
-            db.session.commit()
-            current_app.logger.info('inserted %s', data_source)
-            data_source_id = data_source.id
-        else:
-            data_source_id = 0
-
-        # TODO: make this an async task?
-        engine = create_engine(current_app.config['SQLALCHEMY_DATABASE_URI'])
-        # parse and iterate over imported citations
-        # create lists of study and citation dicts to insert
-        citation_schema = CitationSchema()
-        citations_to_insert = []
-        # rather than doing it in a for loop, we've switched to a while loop
-        # so that parsing errors on individual citations can be caught and logged
-        # for record in citations_file.parse():
-        #     record['review_id'] = review_id
-        #     citations_to_insert.append(citation_schema.load(record).data)
-        records = citations_file.parse()
-        while True:
-            try:
-                record = next(records)
-                record['review_id'] = review_id
-                citations_to_insert.append(citation_schema.load(record).data)
-            except StopIteration:
-                break
-            except Exception as e:
-                current_app.logger.warning('parsing error: %s', e)
-        n_citations = len(citations_to_insert)
-
-        user_id = g.current_user.id
-        if status is None:
-            studies_to_insert = [
-                {'user_id': user_id,
-                 'review_id': review_id,
-                 'data_source_id': data_source_id}
-                for i in range(n_citations)]
-        else:
-            studies_to_insert = [
-                {'user_id': user_id,
-                 'review_id': review_id,
-                 'data_source_id': data_source_id,
-                 'citation_status': status}
-                for i in range(n_citations)]
-
         if test is True:
             db.session.rollback()
-            return
-
-        # insert studies, and get their primary keys _back_
-        stmt = db.insert(Study).values(studies_to_insert).returning(Study.id)
-        with engine.connect() as conn:
-            study_ids = [result[0] for result in conn.execute(stmt)]
-
-        # add study ids to citations as their primary keys
-        # then bulk insert as mappings
-        # this method is required because not all citations have all fields
-        for study_id, citation in zip(study_ids, citations_to_insert):
-            citation['id'] = study_id
-        db.session.bulk_insert_mappings(Citation, citations_to_insert)
-
-        # if citations' status is "included", we have to bulk insert
-        # the corresponding fulltexts, since bulk operations won't trigger
-        # the fancy events defined in models.py
-        if status == 'included':
-            with engine.connect() as conn:
-                conn.execute(
-                    Fulltext.__table__.insert(),
-                    [{'id': study_id, 'review_id': review_id}
-                     for study_id in study_ids]
-                    )
-
-        # don't forget about a record of the import
+            # parse and validate the file in full, as the import would
+            try:
+                num_records, num_records_failed = validate_citations(
+                    citations_file_parser(uploaded_file.stream).parse(), review_id)
+            except Exception:
+                return validation_error(
+                    'unable to parse citations file: "{}"'.format(fname))
+            return {'num_records': num_records,
+                    'num_records_failed': num_records_failed}, 200
+        db.session.commit()
+        current_app.logger.info('inserted %s', data_source)
+
+        # record the import up front, so clients can poll its progress, but only
+        # once the uploaded file is saved; then import its citations in the background
         citations_import = Import(
-            review_id, user_id, data_source_id, 'citation', n_citations,
-            status=status)
+            review_id, g.current_user.id, data_source.id, 'citation', 0,
+            status=status, import_status='pending', original_filename=fname)
         db.session.add(citations_import)
+        db.session.flush()
+        filepath = get_import_filepath(
+            current_app.config['CITATIONS_DIR'], review_id, citations_import.id, fname)
+        try:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            uploaded_file.save(filepath)
+        except Exception:
+            db.session.rollback()
+            remove_import_file(filepath)
+            raise
         db.session.commit()
+        try:
+            import_citations_file.apply_async(args=[citations_import.id])
+        except Exception:
+            citations_import.import_status = 'failed'
+            db.session.commit()
+            remove_import_file(filepath)
+            raise
         current_app.logger.info(
-            'imported %s citations from file "%s" into %s',
-            n_citations, fname, review)
+            '%s of citations from file "%s" into %s enqueued',
+            citations_import, fname, review)
+
+        return ImportSchema().dump(citations_import).data, 202
+
+
+@ns.route('/<int:id>')
+@ns.doc(
+    summary='get a citation import, e.g. to poll its progress',
+    produces=['application/json'],
+    )
+class CitationsImportResource(Resource):
+
+    method_decorators = [auth.login_required]
 
-        # lastly, don't forget to deduplicate the citations and get their word2vecs
-        deduplicate_citations.apply_async(args=[review_id], countdown=60)
-        get_citations_text_content_vectors.apply_async(
-            args=[review_id], countdown=60)
+    @ns.doc(
+        responses={
+            200: 'successfully got citation import record',
+            403: 'current app user forbidden to get citation import record',
+            404: 'no citation import with matching id was found',
+            }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT))
+        })
+    def get(self, id):
+        """get a citation import record, including its status and record counts"""
+        citations_import = db.session.query(Import).get(id)
+        if not citations_import or citations_import.record_type != 'citation':
+            return not_found_error('<Import(id={})> not found'.format(id))
+        if (g.current_user.is_admin is False and
+                g.current_user.reviews.filter_by(id=citations_import.review_id).one_or_none() is None):
+            return forbidden_error(
+                '{} forbidden to get this citation import'.format(g.current_user))
+        return ImportSchema().dump(citations_import).data
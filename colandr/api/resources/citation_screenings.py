@@ -9,11 +9,13 @@ from webargs.flaskparser import use_args, use_kwargs
 
 from colandr import api_
 from ...lib import constants
-from ...models import db, Citation, CitationScreening, Fulltext, Review, Study, User
+from ...lib.cache import invalidate_prisma_counts
+from ...models import (db, Citation, CitationScreening, Review, User,
+                       enqueue_citation_screening_tasks, update_screening_statuses)
 from ..errors import bad_request_error, forbidden_error, not_found_error, validation_error
 from ..schemas import ScreeningSchema
+from ..screenings import upsert_screenings
 from ..swagger import screening_model
-from ..utils import assign_status
 from ..authentication import auth
 
 
@@ -284,15 +286,16 @@ class CitationsScreeningsResource(Resource):
             'review_id': {'in': 'query', 'type': 'integer', 'required': True,
                           'description': 'unique identifier of review for which to create citation screenings'},
             'user_id': {'in': 'query', 'type': 'integer',
-                        'description': 'unique identifier of user screening citations, if not current app user'},
+                        'description': 'unique identifier of user screening citations, if not current app user (ADMIN ONLY)'},
             'test': {'in': 'query', 'type': 'boolean', 'default': False,
                      'description': 'if True, request will be validated but no data will be affected'},
             },
-        body=([screening_model], 'citation screening records to create'),
+        body=([screening_model], 'citation screening records to create or modify'),
         responses={
-            200: 'successfully created citation screening record(s)',
+            200: 'successfully created or modified citation screening record(s)',
             403: 'current app user forbidden to create citation screening records',
             404: 'no review with matching id was found',
+            422: 'invalid citation screening records',
             }
         )
     @use_args(ScreeningSchema(many=True, partial=['user_id', 'review_id']))
@@ -307,87 +310,60 @@ class CitationsScreeningsResource(Resource):
             location='query', missing=False)
         })
     def post(self, args, review_id, user_id, test):
-        """create one or more citation screenings (ADMIN ONLY)"""
-        if g.current_user.is_admin is False:
-            return forbidden_error('endpoint is admin-only')
+        """create or modify one or more citation screenings in bulk"""
         review = db.session.query(Review).get(review_id)
         if not review:
             return not_found_error(
                 '<Review(id={})> not found'.format(review_id))
-        # bulk insert citation screenings
+        if (g.current_user.is_admin is False and
+                review.users.filter_by(id=g.current_user.id).one_or_none() is None):
+            return forbidden_error(
+                '{} forbidden to screen citations for this review'.format(g.current_user))
         screener_user_id = user_id or g.current_user.id
-        screenings_to_insert = []
+        if screener_user_id != g.current_user.id and g.current_user.is_admin is False:
+            return forbidden_error(
+                '{} forbidden to screen citations as another user'.format(g.current_user))
+        # validate screenings as a batch
+        if len(args) > constants.MAX_BULK_SCREENINGS:
+            return validation_error(
+                'at most {} screenings may be submitted at once'.format(
+                    constants.MAX_BULK_SCREENINGS))
+        screenings = []
         for screening in args:
-            screening['review_id'] = review_id
-            screening['user_id'] = screener_user_id
-            screenings_to_insert.append(screening)
-        if test is False:
-            db.session.bulk_insert_mappings(
-                CitationScreening, screenings_to_insert)
-            db.session.commit()
-            current_app.logger.info(
-                'inserted %s citation screenings', len(screenings_to_insert))
-        # bulk update citation statuses
-        num_screeners = review.num_citation_screening_reviewers
-        citation_ids = sorted(s['citation_id'] for s in screenings_to_insert)
-        # results = db.session.query(CitationScreening)\
-        #     .filter(CitationScreening.citation_id.in_(citation_ids))
-        # studies_to_update = [
-        #     {'id': cid, 'citation_status': assign_status(list(scrns), num_screeners)}
-        #     for cid, scrns in itertools.groupby(results, attrgetter('citation_id'))
-        #     ]
-        with db.engine.connect() as connection:
-            query = """
-                SELECT citation_id, ARRAY_AGG(status)
-                FROM citation_screenings
-                WHERE citation_id IN ({citation_ids})
-                GROUP BY citation_id
-                ORDER BY citation_id
-                """.format(citation_ids=','.join(str(cid) for cid in citation_ids))
-            results = connection.execute(query)
-        studies_to_update = [
-            {'id': row[0], 'citation_status': assign_status(row[1], num_screeners)}
-            for row in results]
-        if test is False:
-            db.session.bulk_update_mappings(
-                Study, studies_to_update)
-            db.session.commit()
-            current_app.logger.info(
-                'updated citation_status for %s studies', len(studies_to_update))
-            # now add fulltexts for included citations
-            # normally this is done automatically, but not when we're hacking
-            # and doing bulk changes to the database
-            results = db.session.query(Study.id)\
-                .filter_by(review_id=review_id)\
-                .filter_by(citation_status='included')\
-                .filter(~Study.fulltext.has())\
-                .order_by(Study.id)
-            fulltexts_to_insert = [
-                {'id': result[0], 'review_id': review_id}
-                for result in results]
-            db.session.bulk_insert_mappings(Fulltext, fulltexts_to_insert)
-            db.session.commit()
-            current_app.logger.info('inserted %s fulltexts', len(fulltexts_to_insert))
-            # now update include/exclude counts on review
-            status_counts = db.session.query(Study.citation_status, db.func.count(1))\
-                .filter(Study.review_id == review_id)\
-                .filter(Study.dedupe_status == 'not_duplicate')\
-                .filter(Study.citation_status.in_(['included', 'excluded']))\
-                .group_by(Study.citation_status)\
-                .all()
-            status_counts = dict(status_counts)
-            n_included = status_counts.get('included', 0)
-            n_excluded = status_counts.get('excluded', 0)
-            review.num_citations_included = n_included
-            review.num_citations_excluded = n_excluded
-            db.session.commit()
-            # do we have to suggest keyterms?
-            if n_included >= 25 and n_excluded >= 25:
-                from colandr.tasks import suggest_keyterms
-                sample_size = min(n_included, n_excluded)
-                suggest_keyterms.apply_async(args=[review_id, sample_size])
-            # do we have to train a ranking model?
-            if n_included >= 100 and n_excluded >= 100:
-                from colandr.tasks import train_citation_ranking_model
-                train_citation_ranking_model.apply_async(
-                    args=[review_id], countdown=30)
+            if screening.get('citation_id') is None:
+                return validation_error('screenings must specify a citation_id')
+            if screening['status'] == 'excluded' and not screening.get('exclude_reasons'):
+                return validation_error('screenings that exclude must provide a reason')
+            screenings.append(
+                {'study_id': screening['citation_id'],
+                 'status': screening['status'],
+                 'exclude_reasons': screening.get('exclude_reasons')})
+        citation_ids = sorted(screening['study_id'] for screening in screenings)
+        if len(set(citation_ids)) != len(citation_ids):
+            return validation_error('citations may only be screened once per request')
+        n_found = db.session.query(Citation.id)\
+            .filter(Citation.review_id == review_id)\
+            .filter(Citation.id.in_(citation_ids))\
+            .count()
+        if n_found != len(citation_ids):
+            return validation_error(
+                '{} citations not found in {}'.format(len(citation_ids) - n_found, review))
+        if test is True:
+            return {'num_screenings': len(screenings)}
+        # upsert screenings and recompute affected studies' statuses in one transaction
+        with db.engine.begin() as connection:
+            n_screenings = upsert_screenings(
+                connection, 'citation', review_id, screener_user_id, screenings)
+            results = update_screening_statuses(
+                connection, 'citation', review_id, citation_ids)
+        current_app.logger.info(
+            'inserted or updated %s citation screenings for %s', n_screenings, review)
+        invalidate_prisma_counts(review_id)
+        if results and results[0].num_included is not None:
+            enqueue_citation_screening_tasks(
+                review_id, results[0].num_included, results[0].num_excluded,
+                results[0].num_included_delta)
+        return {
+            'num_screenings': n_screenings,
+            'citation_statuses': {result.study_id: result.status for result in results},
+            }
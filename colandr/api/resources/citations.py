@@ -10,6 +10,8 @@ from webargs.flaskparser import use_args, use_kwargs
 
 from colandr import api_
 from ...lib import constants
+from ...lib.cache import invalidate_prisma_counts
+from ...lib.feature_matrix import invalidate_feature_matrix
 from ...models import db, Citation, DataSource, Review, Study
 from ..errors import forbidden_error, not_found_error, validation_error
 from ..schemas import CitationSchema, DataSourceSchema
@@ -92,6 +94,8 @@ class CitationResource(Resource):
         if test is False:
             db.session.commit()
             current_app.logger.info('deleted %s', citation)
+            invalidate_feature_matrix(citation.review_id)
+            invalidate_prisma_counts(citation.review_id)
             return '', 204
         else:
             db.session.rollback()
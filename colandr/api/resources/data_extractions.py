@@ -10,6 +10,7 @@ from webargs.flaskparser import use_args, use_kwargs
 
 from colandr import api_
 from ...lib import constants, sanitizers
+from ...lib.cache import invalidate_prisma_counts
 from ...models import db, DataExtraction, ReviewPlan, Study
 from ..errors import forbidden_error, not_found_error, validation_error
 from ..schemas import ExtractedItem, DataExtractionSchema
@@ -105,6 +106,8 @@ class DataExtractionResource(Resource):
         if test is False:
             db.session.commit()
             current_app.logger.info('deleted contents of %s', extracted_data)
+            if not extracted_data.extracted_items:
+                invalidate_prisma_counts(extracted_data.review_id)
             return '', 204
         else:
             db.session.rollback()
@@ -220,6 +223,7 @@ class DataExtractionResource(Resource):
         if test is False:
             db.session.commit()
             current_app.logger.info('modified %s', extracted_data)
+            invalidate_prisma_counts(extracted_data.review_id)
         else:
             db.session.rollback()
         return DataExtractionSchema().dump(extracted_data).data
@@ -9,12 +9,13 @@ from webargs.flaskparser import use_args, use_kwargs
 
 from colandr import api_
 from ...lib import constants
-from ...models import (db, DataExtraction, FulltextScreening, Fulltext,
-                       Review, Study, User)
+from ...lib.cache import invalidate_prisma_counts
+from ...models import (db, FulltextScreening, Fulltext, Review, User,
+                       update_screening_statuses)
 from ..errors import bad_request_error, forbidden_error, not_found_error, validation_error
 from ..schemas import ScreeningSchema
+from ..screenings import upsert_screenings
 from ..swagger import screening_model
-from ..utils import assign_status
 from ..authentication import auth
 
 
@@ -288,15 +289,16 @@ class FulltextsScreeningsResource(Resource):
             'review_id': {'in': 'query', 'type': 'integer', 'required': True,
                           'description': 'unique identifier of review for which to create fulltext screenings'},
             'user_id': {'in': 'query', 'type': 'integer',
-                        'description': 'unique identifier of user screening fulltexts, if not current app user'},
+                        'description': 'unique identifier of user screening fulltexts, if not current app user (ADMIN ONLY)'},
             'test': {'in': 'query', 'type': 'boolean', 'default': False,
                      'description': 'if True, request will be validated but no data will be affected'},
             },
-        body=([screening_model], 'fulltext screening records to create'),
+        body=([screening_model], 'fulltext screening records to create or modify'),
         responses={
-            200: 'successfully created fulltext screening record(s)',
+            200: 'successfully created or modified fulltext screening record(s)',
             403: 'current app user forbidden to create fulltext screening records',
             404: 'no review with matching id was found',
+            422: 'invalid fulltext screening records',
             }
         )
     @use_args(ScreeningSchema(many=True, partial=['user_id', 'review_id']))
@@ -311,75 +313,56 @@ class FulltextsScreeningsResource(Resource):
             location='query', missing=False)
         })
     def post(self, args, review_id, user_id, test):
-        """create one or more fulltext screenings (ADMIN ONLY)"""
-        if g.current_user.is_admin is False:
-            return forbidden_error('FulltextsScreeningsResource.post is admin-only')
-        # check current user authorization
+        """create or modify one or more fulltext screenings in bulk"""
         review = db.session.query(Review).get(review_id)
         if not review:
             return not_found_error(
                 '<Review(id={})> not found'.format(review_id))
-        # bulk insert fulltext screenings
+        if (g.current_user.is_admin is False and
+                review.users.filter_by(id=g.current_user.id).one_or_none() is None):
+            return forbidden_error(
+                '{} forbidden to screen fulltexts for this review'.format(g.current_user))
         screener_user_id = user_id or g.current_user.id
-        screenings_to_insert = []
+        if screener_user_id != g.current_user.id and g.current_user.is_admin is False:
+            return forbidden_error(
+                '{} forbidden to screen fulltexts as another user'.format(g.current_user))
+        # validate screenings as a batch
+        if len(args) > constants.MAX_BULK_SCREENINGS:
+            return validation_error(
+                'at most {} screenings may be submitted at once'.format(
+                    constants.MAX_BULK_SCREENINGS))
+        screenings = []
         for screening in args:
-            screening['review_id'] = review_id
-            screening['user_id'] = screener_user_id
-            screenings_to_insert.append(screening)
-        if test is False:
-            db.session.bulk_insert_mappings(
-                FulltextScreening, screenings_to_insert)
-            db.session.commit()
-            current_app.logger.info(
-                'inserted %s fulltext screenings', len(screenings_to_insert))
-        # bulk update fulltext statuses
-        num_screeners = review.num_fulltext_screening_reviewers
-        fulltext_ids = sorted(s['fulltext_id'] for s in screenings_to_insert)
-        # results = db.session.query(FulltextScreening)\
-        #     .filter(FulltextScreening.fulltext_id.in_(fulltext_ids))
-        # studies_to_update = [
-        #     {'id': cid, 'fulltext_status': assign_status(list(scrns), num_screeners)}
-        #     for cid, scrns in itertools.groupby(results, attrgetter('fulltext_id'))
-        #     ]
-        with db.engine.connect() as connection:
-            query = """
-                SELECT fulltext_id, ARRAY_AGG(status)
-                FROM fulltext_screenings
-                WHERE fulltext_id IN ({fulltext_ids})
-                GROUP BY fulltext_id
-                ORDER BY fulltext_id
-                """.format(fulltext_ids=','.join(str(cid) for cid in fulltext_ids))
-            results = connection.execute(query)
-        studies_to_update = [
-            {'id': row[0], 'fulltext_status': assign_status(row[1], num_screeners)}
-            for row in results]
-        if test is False:
-            db.session.bulk_update_mappings(
-                Study, studies_to_update)
-            db.session.commit()
-            current_app.logger.info(
-                'updated fulltext_status for %s studies', len(studies_to_update))
-            # now add data extractions for included fulltexts
-            # normally this is done automatically, but not when we're hacking
-            # and doing bulk changes to the database
-            results = db.session.query(Study.id)\
-                .filter_by(review_id=review_id)\
-                .filter_by(fulltext_status='included')\
-                .filter(~Study.data_extraction.has())\
-                .order_by(Study.id)
-            data_extractions_to_insert = [
-                {'id': result[0], 'review_id': review_id}
-                for result in results]
-            db.session.bulk_insert_mappings(DataExtraction, data_extractions_to_insert)
-            db.session.commit()
-            current_app.logger.info('inserted %s data extractions', len(data_extractions_to_insert))
-            # now update include/exclude counts on review
-            status_counts = db.session.query(Study.fulltext_status, db.func.count(1))\
-                .filter(Study.review_id == review_id)\
-                .filter(Study.fulltext_status.in_(['included', 'excluded']))\
-                .group_by(Study.fulltext_status)\
-                .all()
-            status_counts = dict(status_counts)
-            review.num_fulltexts_included = status_counts.get('included', 0)
-            review.num_fulltexts_excluded = status_counts.get('excluded', 0)
-            db.session.commit()
+            if screening.get('fulltext_id') is None:
+                return validation_error('screenings must specify a fulltext_id')
+            if screening['status'] == 'excluded' and not screening.get('exclude_reasons'):
+                return validation_error('screenings that exclude must provide a reason')
+            screenings.append(
+                {'study_id': screening['fulltext_id'],
+                 'status': screening['status'],
+                 'exclude_reasons': screening.get('exclude_reasons')})
+        fulltext_ids = sorted(screening['study_id'] for screening in screenings)
+        if len(set(fulltext_ids)) != len(fulltext_ids):
+            return validation_error('fulltexts may only be screened once per request')
+        n_found = db.session.query(Fulltext.id)\
+            .filter(Fulltext.review_id == review_id)\
+            .filter(Fulltext.id.in_(fulltext_ids))\
+            .count()
+        if n_found != len(fulltext_ids):
+            return validation_error(
+                '{} fulltexts not found in {}'.format(len(fulltext_ids) - n_found, review))
+        if test is True:
+            return {'num_screenings': len(screenings)}
+        # upsert screenings and recompute affected studies' statuses in one transaction
+        with db.engine.begin() as connection:
+            n_screenings = upsert_screenings(
+                connection, 'fulltext', review_id, screener_user_id, screenings)
+            results = update_screening_statuses(
+                connection, 'fulltext', review_id, fulltext_ids)
+        current_app.logger.info(
+            'inserted or updated %s fulltext screenings for %s', n_screenings, review)
+        invalidate_prisma_counts(review_id)
+        return {
+            'num_screenings': n_screenings,
+            'fulltext_statuses': {result.study_id: result.status for result in results},
+            }
@@ -1,29 +1,32 @@
-import io
+import collections
+import functools
 import os
-import subprocess
+import zipfile
 
 from flask import current_app, g
 from flask_restplus import Resource
 from werkzeug.utils import secure_filename
 
 from marshmallow import fields as ma_fields
-from marshmallow.validate import Range
+from marshmallow.validate import Length, Range
 from webargs.flaskparser import use_kwargs
 
-from textacy.preprocess import fix_bad_unicode
-
 from colandr import api_
 from ...lib import constants
-from ...models import db, Fulltext
-from ...tasks import get_fulltext_text_content_vector
+from ...lib.blobs import save_blob
+from ...models import db, Fulltext, Review
+from ...tasks import extract_fulltext_text_content
 from ..errors import forbidden_error, not_found_error, validation_error
 from ..schemas import FulltextSchema
+from ..uploads import (check_archive_sizes, get_fulltext_ids_by_doi, get_upload_statuses,
+                       init_upload_statuses, iter_uploaded_files, lock_blob,
+                       match_fulltext_id, remove_fulltext_uploads)
 from ..authentication import auth
 
 
 ns = api_.namespace(
     'fulltext_uploads', path='/fulltexts',
-    description='upload or delete fulltext content files')
+    description='upload or delete fulltext content files, one at a time or in bulk')
 
 
 @ns.route('/<int:id>/upload')
@@ -46,7 +49,7 @@ class FulltextUploadResource(Resource):
                      'description': 'if True, request will be validated but no data will be affected'},
             },
         responses={
-            200: 'successfully upload full-text file',
+            200: 'successfully upload full-text file; its text content is extracted in the background',
             403: 'current app user forbidden to upload full-text files for this review',
             404: 'no fulltext with matching id was found',
             422: 'invalid fulltext upload file type',
@@ -72,37 +75,34 @@ class FulltextUploadResource(Resource):
         _, ext = os.path.splitext(uploaded_file.filename)
         if ext not in current_app.config['ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS']:
             return validation_error('invalid fulltext upload file type: "{}"'.format(ext))
-        # assign filename based an id, and full path
+        # assign filename based an id; content is stored by its hash
+        previous_upload = (fulltext.review_id, fulltext.filename, fulltext.content_hash)
         filename = '{}{}'.format(id, ext)
         fulltext.filename = filename
         fulltext.original_filename = secure_filename(uploaded_file.filename)
-        filepath = os.path.join(
-            current_app.config['FULLTEXT_UPLOADS_DIR'],
-            str(fulltext.review_id),
-            filename)
         if test is False:
-            # save file content to disk
-            uploaded_file.save(filepath)
-            # extract content from disk, depending on type
-            if ext == '.txt':
-                with io.open(filepath, mode='rb') as f:
-                    text_content = f.read()
-            elif ext == '.pdf':
-                extract_text_script = os.path.join(
-                    current_app.config['COLANDR_APP_DIR'],
-                    'pdfestrian/bin/extractText.sh')
-                text_content = subprocess.check_output(
-                    [extract_text_script, '--filename', filepath],
-                    stderr=subprocess.STDOUT)
-            fulltext.text_content = fix_bad_unicode(
-                text_content.decode(errors='ignore'))
+            # save file content to disk, unless identical content is already stored;
+            # it mustn't be removed as unreferenced before the fulltext is committed
+            uploads_dir = current_app.config['FULLTEXT_UPLOADS_DIR']
+            content_hash, _ = save_blob(
+                uploaded_file.stream, uploads_dir, filename,
+                lock=functools.partial(lock_blob, db.session))
+            if content_hash != fulltext.content_hash:
+                # any text content extracted from a previous upload is now stale
+                fulltext.content_hash = content_hash
+                fulltext.text_content = None
+                fulltext.text_content_vector_rep = None
             db.session.commit()
             current_app.logger.info(
                 'uploaded "%s" for %s', fulltext.original_filename, fulltext)
+            if previous_upload[1] and previous_upload[1:] != (filename, content_hash):
+                with db.engine.connect() as conn:
+                    remove_fulltext_uploads(conn, uploads_dir, [previous_upload])
 
-            # parse the fulltext text content and get its word2vec vector
-            get_fulltext_text_content_vector.apply_async(
-                args=[fulltext.review_id, id], countdown=5)
+            # extract the file's text content, then get its word2vec vector,
+            # in the background rather than blocking this request
+            extract_fulltext_text_content.apply_async(
+                args=[fulltext.review_id, id])
 
         return FulltextSchema().dump(fulltext).data
 
@@ -138,20 +138,187 @@ class FulltextUploadResource(Resource):
         if filename is None:
             return validation_error("user can't delete a fulltext upload that doesn't exist")
         if test is False:
-            filepath = os.path.join(
-                current_app.config['FULLTEXT_UPLOADS_DIR'],
-                str(fulltext.review_id),
-                filename)
-            try:
-                os.remove(filepath)
-            except OSError as e:
-                msg = 'error removing uploaded full-text file from disk'
-                current_app.logger.exception(msg + '\n')
-                return not_found_error(msg)
+            previous_upload = (fulltext.review_id, filename, fulltext.content_hash)
             fulltext.filename = None
+            fulltext.content_hash = None
             db.session.commit()
+            # only remove the file if no other fulltext refers to the same content
+            with db.engine.connect() as conn:
+                remove_fulltext_uploads(
+                    conn, current_app.config['FULLTEXT_UPLOADS_DIR'], [previous_upload])
             current_app.logger.info(
                 'deleted uploaded file "%s "for %s', filename, fulltext)
             return '', 204
         else:
             return '', 200
+
+
+@ns.route('/uploads')
+@ns.doc(
+    summary='upload many fulltext content files at once',
+    produces=['application/json'],
+    )
+class FulltextsUploadResource(Resource):
+
+    method_decorators = [auth.login_required]
+
+    @ns.doc(
+        params={
+            'review_id': {'in': 'query', 'type': 'integer', 'required': True,
+                          'description': 'unique identifier of review whose fulltexts are being uploaded'},
+            'uploaded_files': {'in': 'formData', 'type': 'file', 'required': True,
+                               'description': 'full-text content files (.pdf or .txt), and/or zip archives thereof, each named for its fulltext id (e.g. "123.pdf") or its citation\'s DOI (e.g. "10.1000_xyz123.pdf")'},
+            'test': {'in': 'query', 'type': 'boolean', 'default': False,
+                     'description': 'if True, request will be validated but no data will be affected'},
+            },
+        responses={
+            200: 'request was valid, but files not uploaded because `test=True`',
+            202: 'successfully uploaded full-text files; their text content is extracted in the background',
+            403: 'current app user forbidden to upload full-text files for this review',
+            404: 'no review with matching id was found',
+            422: 'invalid zip archive, or one too large once uncompressed',
+            }
+        )
+    @use_kwargs({
+        'review_id': ma_fields.Int(
+            required=True, validate=Range(min=1, max=constants.MAX_INT)),
+        'uploaded_files': ma_fields.List(
+            ma_fields.Raw(), required=True, location='files'),
+        'test': ma_fields.Boolean(missing=False)
+        })
+    def post(self, review_id, uploaded_files, test):
+        """upload many fulltext content files for a review, matched to fulltexts by filename"""
+        review = db.session.query(Review).get(review_id)
+        if not review:
+            return not_found_error('<Review(id={})> not found'.format(review_id))
+        if g.current_user.reviews.filter_by(id=review_id).one_or_none() is None:
+            return forbidden_error(
+                '{} forbidden to upload fulltext files to this review'.format(
+                    g.current_user))
+        for uploaded_file in uploaded_files:
+            if os.path.splitext(uploaded_file.filename)[1].lower() == '.zip':
+                if not zipfile.is_zipfile(uploaded_file.stream):
+                    return validation_error(
+                        'invalid zip archive: "{}"'.format(uploaded_file.filename))
+                uploaded_file.stream.seek(0)
+                # don't let a small archive expand into a huge amount of data on disk
+                error = check_archive_sizes(
+                    uploaded_file,
+                    current_app.config['MAX_FULLTEXT_UPLOAD_FILE_SIZE'],
+                    current_app.config['MAX_FULLTEXT_UPLOAD_ARCHIVE_SIZE'])
+                if error is not None:
+                    return validation_error(error)
+                uploaded_file.stream.seek(0)
+        with db.engine.connect() as conn:
+            fulltext_ids, doi_fulltext_ids = get_fulltext_ids_by_doi(conn, review_id)
+        uploads_dir = current_app.config['FULLTEXT_UPLOADS_DIR']
+        # match files to fulltexts and stream them to disk, one by one,
+        # keeping a report of what happened to each file
+        files = []
+        uploaded = {}
+        for original_filename, f in iter_uploaded_files(uploaded_files):
+            ext = os.path.splitext(original_filename)[1].lower()
+            fulltext_id = None
+            if ext not in current_app.config['ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS']:
+                status = 'invalid_file_type'
+            else:
+                fulltext_id = match_fulltext_id(
+                    original_filename, fulltext_ids, doi_fulltext_ids)
+                if fulltext_id is None:
+                    status = 'unmatched'
+                elif fulltext_id in uploaded:
+                    status = 'duplicate'
+                else:
+                    filename = '{}{}'.format(fulltext_id, ext)
+                    content_hash = None
+                    if test is False:
+                        content_hash, _ = save_blob(
+                            f, uploads_dir, filename,
+                            lock=functools.partial(lock_blob, db.session))
+                    uploaded[fulltext_id] = (
+                        filename, secure_filename(original_filename), content_hash)
+                    status = 'uploaded'
+            files.append({
+                'filename': original_filename,
+                'fulltext_id': fulltext_id,
+                'status': status,
+                })
+        if test is True:
+            return {'upload_id': None, 'num_uploaded': len(uploaded), 'files': files}, 200
+
+        if uploaded:
+            fulltexts = db.session.query(Fulltext)\
+                .filter(Fulltext.id.in_(list(uploaded.keys())))
+            previous_uploads = []
+            for fulltext in fulltexts:
+                filename, original_filename, content_hash = uploaded[fulltext.id]
+                if fulltext.filename and (fulltext.filename, fulltext.content_hash) != (filename, content_hash):
+                    previous_uploads.append(
+                        (fulltext.review_id, fulltext.filename, fulltext.content_hash))
+                if fulltext.content_hash != content_hash:
+                    fulltext.content_hash = content_hash
+                    fulltext.text_content = None
+                    fulltext.text_content_vector_rep = None
+                fulltext.filename = filename
+                fulltext.original_filename = original_filename
+            db.session.commit()
+            with db.engine.connect() as conn:
+                remove_fulltext_uploads(conn, uploads_dir, previous_uploads)
+        upload_id = init_upload_statuses(review_id, list(uploaded.keys()))
+        current_app.logger.info(
+            'uploaded %s of %s files for %s', len(uploaded), len(files), review)
+
+        # extract text content across all celery worker processes, one file per task
+        for fulltext_id in uploaded:
+            extract_fulltext_text_content.apply_async(
+                args=[review_id, fulltext_id], kwargs={'upload_id': upload_id})
+
+        return {'upload_id': upload_id, 'num_uploaded': len(uploaded), 'files': files}, 202
+
+
+@ns.route('/uploads/<upload_id>')
+@ns.doc(
+    summary='get the text extraction statuses of a bulk upload of fulltext content files',
+    produces=['application/json'],
+    )
+class FulltextsUploadStatusResource(Resource):
+
+    method_decorators = [auth.login_required]
+
+    @ns.doc(
+        params={
+            'review_id': {'in': 'query', 'type': 'integer', 'required': True,
+                          'description': 'unique identifier of review whose fulltexts were uploaded'},
+            },
+        responses={
+            200: 'successfully got bulk fulltext upload statuses',
+            403: 'current app user forbidden to get fulltext uploads for this review',
+            404: 'no review or bulk upload with matching id was found',
+            }
+        )
+    @use_kwargs({
+        'upload_id': ma_fields.Str(
+            required=True, location='view_args', validate=Length(equal=32)),
+        'review_id': ma_fields.Int(
+            required=True, validate=Range(min=1, max=constants.MAX_INT)),
+        })
+    def get(self, upload_id, review_id):
+        """get the per-file text extraction statuses of a bulk fulltext upload"""
+        review = db.session.query(Review).get(review_id)
+        if not review:
+            return not_found_error('<Review(id={})> not found'.format(review_id))
+        if (g.current_user.is_admin is False and
+                review.users.filter_by(id=g.current_user.id).one_or_none() is None):
+            return forbidden_error(
+                '{} forbidden to get this review\'s fulltexts'.format(g.current_user))
+        statuses = get_upload_statuses(review_id, upload_id)
+        if statuses is None:
+            return not_found_error(
+                'no fulltext upload "{}" found for {}; it may have expired'.format(
+                    upload_id, review))
+        return {
+            'upload_id': upload_id,
+            'status_counts': dict(collections.Counter(statuses.values())),
+            'statuses': [{'fulltext_id': fulltext_id, 'status': status}
+                         for fulltext_id, status in sorted(statuses.items())],
+            }
@@ -1,26 +1,60 @@
-import collections
 import csv
 import io
-import itertools
+import os
 
-from flask import g, current_app, make_response
+from flask import g, current_app, Response, send_from_directory, stream_with_context
 from flask_restplus import Resource
+from sqlalchemy import text
 
 from marshmallow import fields as ma_fields
-from marshmallow.validate import Range
+from marshmallow.validate import OneOf, Range
 from webargs.flaskparser import use_kwargs
 
 from ...lib import constants
-from ...models import (db, DataSource,
-                       FulltextScreening, Import, Review, ReviewPlan, Study)
+from ...lib.cache import cache_prisma_counts, get_cached_prisma_counts
+from ...lib.columnar import EXPORT_FORMATS, EXPORT_TABLES, get_export_filepath
+from ...models import db, Review
 from ..errors import not_found_error, forbidden_error
+from ..exports import (STUDIES_EXPORT_FIELDNAMES, get_data_extraction_fields,
+                       get_studies_export_query)
 from ..authentication import auth
+from ...tasks import export_review_data
 from colandr import api_
 
 ns = api_.namespace(
     'review_exports', path='/reviews/<int:id>/export',
     description='export review prisma or studies data')
 
+# number of csv rows written per chunk of a streamed response
+EXPORT_CHUNK_SIZE = 1000
+
+PRISMA_COUNTS_QUERY = text("""
+    SELECT
+        (SELECT JSON_OBJECT_AGG(source_type, num_records)
+         FROM (SELECT data_sources.source_type, SUM(imports.num_records) AS num_records
+               FROM imports
+               JOIN data_sources ON imports.data_source_id = data_sources.id
+               WHERE imports.review_id = :review_id AND imports.import_status = 'finished'
+               GROUP BY data_sources.source_type
+               ) AS sources
+         ) AS num_studies_by_source,
+        COUNT(*) FILTER (WHERE dedupe_status = 'not_duplicate') AS num_unique_studies,
+        COUNT(*) FILTER (WHERE citation_status IN ('included', 'excluded')) AS num_screened_citations,
+        COUNT(*) FILTER (WHERE citation_status = 'excluded') AS num_excluded_citations,
+        COUNT(*) FILTER (WHERE fulltext_status IN ('included', 'excluded')) AS num_screened_fulltexts,
+        COUNT(*) FILTER (WHERE fulltext_status = 'excluded') AS num_excluded_fulltexts,
+        COUNT(*) FILTER (WHERE data_extraction_status = 'finished') AS num_studies_data_extracted,
+        (SELECT JSON_OBJECT_AGG(exclude_reason, num_screenings)
+         FROM (SELECT exclude_reason, COUNT(*) AS num_screenings
+               FROM fulltext_screenings, UNNEST(exclude_reasons) AS exclude_reason
+               WHERE review_id = :review_id
+               GROUP BY exclude_reason
+               ) AS reasons
+         ) AS exclude_reason_counts
+    FROM studies
+    WHERE review_id = :review_id
+    """)
+
 
 @ns.route('/prisma')
 @ns.doc(
@@ -51,61 +85,25 @@ class ReviewExportPrismaResource(Resource):
                 review.users.filter_by(id=g.current_user.id).one_or_none() is None):
             return forbidden_error(
                 '{} forbidden to get this review'.format(g.current_user))
-        # get counts by step, i.e. prisma
-        n_studies_by_source = dict(
-            db.session.query(DataSource.source_type, db.func.sum(Import.num_records))
-            .filter(Import.data_source_id == DataSource.id)
-            .filter(Import.review_id == id)
-            .group_by(DataSource.source_type)
-            .all())
-
-        n_unique_studies = db.session.query(Study)\
-            .filter(Study.review_id == id)\
-            .filter_by(dedupe_status='not_duplicate')\
-            .count()
-
-        n_citations_by_status = dict(
-            db.session.query(Study.citation_status, db.func.count(1))
-            .filter(Study.review_id == id)
-            .filter(Study.citation_status.in_(['included', 'excluded']))
-            .group_by(Study.citation_status)
-            .all())
-        n_citations_screened = sum(n_citations_by_status.values())
-        n_citations_excluded = n_citations_by_status.get('excluded', 0)
-
-        n_fulltexts_by_status = dict(
-            db.session.query(Study.fulltext_status, db.func.count(1))
-            .filter(Study.review_id == id)
-            .filter(Study.fulltext_status.in_(['included', 'excluded']))
-            .group_by(Study.fulltext_status)
-            .all())
-        n_fulltexts_screened = sum(n_fulltexts_by_status.values())
-        n_fulltexts_excluded = n_fulltexts_by_status.get('excluded', 0)
-
-        results = db.session.query(FulltextScreening.exclude_reasons)\
-            .filter(FulltextScreening.review_id == id)\
-            .all()
-        exclude_reason_counts = dict(collections.Counter(
-            itertools.chain.from_iterable(
-                [result[0] for result in results if result[0] is not None])))
-
-        n_data_extractions = db.session.query(Study)\
-            .filter(Study.review_id == id)\
-            .filter_by(data_extraction_status='finished')\
-            .count()
+        counts = get_cached_prisma_counts(id)
+        if counts is None:
+            # get counts by step, i.e. prisma, all at once
+            row = db.session.execute(PRISMA_COUNTS_QUERY, {'review_id': id}).fetchone()
+            counts = {
+                'num_studies_by_source': row.num_studies_by_source or {},
+                'num_unique_studies': row.num_unique_studies,
+                'num_screened_citations': row.num_screened_citations,
+                'num_excluded_citations': row.num_excluded_citations,
+                'num_screened_fulltexts': row.num_screened_fulltexts,
+                'num_excluded_fulltexts': row.num_excluded_fulltexts,
+                'exclude_reason_counts': row.exclude_reason_counts or {},
+                'num_studies_data_extracted': row.num_studies_data_extracted,
+                }
+            cache_prisma_counts(id, counts)
 
         current_app.logger.debug('prisma counts exported for %s', review)
 
-        return {
-            'num_studies_by_source': n_studies_by_source,
-            'num_unique_studies': n_unique_studies,
-            'num_screened_citations': n_citations_screened,
-            'num_excluded_citations': n_citations_excluded,
-            'num_screened_fulltexts': n_fulltexts_screened,
-            'num_excluded_fulltexts': n_fulltexts_excluded,
-            'exclude_reason_counts': exclude_reason_counts,
-            'num_studies_data_extracted': n_data_extractions
-            }
+        return counts
 
 
 @ns.route('/studies')
@@ -118,7 +116,7 @@ class ReviewExportStudiesResource(Resource):
     method_decorators = [auth.login_required]
 
     @ns.doc(
-        description='NOTE: Calling this endpoint via Swagger could cause it to crash on account of #BigData',
+        description='NOTE: The CSV is streamed in chunks, so Swagger may struggle to display it for #BigData',
         responses={200: 'successfully got review studies data',
                    403: 'current app user forbidden to export review studies data',
                    404: 'no review with matching id was found',
@@ -139,68 +137,44 @@ class ReviewExportStudiesResource(Resource):
             return forbidden_error(
                 '{} forbidden to get this review'.format(g.current_user))
 
-        query = db.session.query(Study)\
-            .filter_by(review_id=id)\
-            .order_by(Study.id)
-
-        fieldnames = [
-            'study_id',
-            'deduplication_status',
-            'citation_screening_status',
-            'fulltext_screening_status',
-            'data_extraction_screening_status',
-            'data_source_type',
-            'data_source_name',
-            'data_source_url',
-            'citation_title',
-            'citation_abstract',
-            'citation_authors',
-            'citation_journal_name',
-            'citation_journal_volume',
-            'citation_pub_year',
-            'citation_keywords',
-            'fulltext_filename',
-            'fulltext_exclude_reasons'
-            ]
-
-        data_extraction_form = db.session.query(ReviewPlan.data_extraction_form)\
-            .filter_by(id=id).one_or_none()
-        if data_extraction_form:
-            extraction_labels = [item['label'] for item in data_extraction_form[0]]
-            extraction_types = [item['field_type'] for item in data_extraction_form[0]]
+        query = get_studies_export_query(id)
+        fieldnames = list(STUDIES_EXPORT_FIELDNAMES)
+        extraction_fields = get_data_extraction_fields(id)
+        if extraction_fields:
+            extraction_labels = [label for label, _ in extraction_fields]
+            extraction_types = [field_type for _, field_type in extraction_fields]
             fieldnames.extend(extraction_labels)
 
-        rows = []
-        for study in query:
+        def get_row(result):
             row = [
-                study.id,
-                study.dedupe_status,
-                study.citation_status,
-                study.fulltext_status,
-                study.data_extraction_status,
-                study.data_source.source_type,
-                study.data_source.source_name,
-                study.data_source.source_url,
-                study.citation.title,
-                study.citation.abstract,
-                '; '.join(study.citation.authors) if study.citation.authors else None,
-                study.citation.journal_name,
-                study.citation.volume,
-                study.citation.pub_year,
-                '; '.join(study.citation.keywords) if study.citation.keywords else None,
+                result.id,
+                result.dedupe_status,
+                result.citation_status,
+                result.fulltext_status,
+                result.data_extraction_status,
+                result.source_type,
+                result.source_name,
+                result.source_url,
+                result.title,
+                result.abstract,
+                '; '.join(result.authors) if result.authors else None,
+                result.journal_name,
+                result.volume,
+                result.pub_year,
+                '; '.join(result.keywords) if result.keywords else None,
                 ]
-            if study.fulltext:
+            if result.fulltext_id is not None:
                 row.extend(
-                    [study.fulltext.original_filename,
-                     '; '.join(study.fulltext.exclude_reasons) if study.fulltext.exclude_reasons else None]
+                    [result.original_filename,
+                     '; '.join(sorted(result.exclude_reasons)) if result.exclude_reasons else None]
                     )
             else:
                 row.extend([None, None])
-            if data_extraction_form:
-                if study.data_extraction:
+            if extraction_fields:
+                if result.data_extraction_id is not None:
                     extracted_data = {
                         item['label']: item['value']
-                        for item in study.data_extraction.extracted_items}
+                        for item in result.extracted_items}
                     row.extend(
                         '; '.join(extracted_data.get(label, [])) if type_ in ('select_one', 'select_many')
                         else extracted_data.get(label, None)
@@ -208,15 +182,107 @@ class ReviewExportStudiesResource(Resource):
                         )
                 else:
                     row.extend(None for _ in range(len(extraction_labels)))
-            rows.append(row)
+            return row
 
-        f = io.StringIO()
-        writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
-        writer.writerow(fieldnames)
-        writer.writerows(rows)
-        response = make_response(f.getvalue(), 200)
-        response.headers['Content-type'] = 'text/csv'
+        def generate_csv():
+            f = io.StringIO()
+            writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+            writer.writerow(fieldnames)
+            # stream results via a server-side cursor, so that memory use stays
+            # constant no matter how many studies are in the review
+            with db.engine.connect() as conn:
+                results = conn.execution_options(stream_results=True).execute(query)
+                while True:
+                    chunk = results.fetchmany(EXPORT_CHUNK_SIZE)
+                    writer.writerows(get_row(result) for result in chunk)
+                    yield f.getvalue()
+                    if not chunk:
+                        break
+                    f.seek(0)
+                    f.truncate(0)
+            current_app.logger.debug('study data exported for %s', review)
 
-        current_app.logger.debug('study data exported for %s', review)
+        response = Response(stream_with_context(generate_csv()), 200)
+        response.headers['Content-type'] = 'text/csv'
 
         return response
+
+
+@ns.route('/columnar')
+@ns.doc(
+    summary='export typed, columnar files of review studies and screenings data',
+    produces=['application/octet-stream'],
+    )
+class ReviewExportColumnarResource(Resource):
+
+    method_decorators = [auth.login_required]
+
+    @ns.doc(
+        params={'format': {'in': 'query', 'type': 'string', 'default': 'parquet',
+                           'enum': sorted(EXPORT_FORMATS.keys()),
+                           'description': 'columnar file format of the export'},
+                'table': {'in': 'query', 'type': 'string', 'default': 'studies',
+                          'enum': list(EXPORT_TABLES),
+                          'description': 'which review data to download'},
+                },
+        responses={200: 'successfully got review data export file',
+                   403: 'current app user forbidden to export review data',
+                   404: 'no review with matching id was found, or its export has not finished yet',
+                   }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT)),
+        'format': ma_fields.Str(
+            missing='parquet', validate=OneOf(sorted(EXPORT_FORMATS.keys()))),
+        'table': ma_fields.Str(
+            missing='studies', validate=OneOf(EXPORT_TABLES)),
+        })
+    def get(self, id, format, table):
+        """download the latest finished columnar export of review data"""
+        review = db.session.query(Review).get(id)
+        if not review:
+            return not_found_error('<Review(id={})> not found'.format(id))
+        if (g.current_user.is_admin is False and
+                review.users.filter_by(id=g.current_user.id).one_or_none() is None):
+            return forbidden_error(
+                '{} forbidden to get this review'.format(g.current_user))
+        filepath = get_export_filepath(
+            current_app.config['EXPORTS_DIR'], id, table, format)
+        if not os.path.isfile(filepath):
+            return not_found_error(
+                'no {} export of {} for {}; request one first'.format(format, table, review))
+        return send_from_directory(
+            os.path.dirname(filepath), os.path.basename(filepath),
+            as_attachment=True, mimetype='application/octet-stream')
+
+    @ns.doc(
+        params={'format': {'in': 'query', 'type': 'string', 'default': 'parquet',
+                           'enum': sorted(EXPORT_FORMATS.keys()),
+                           'description': 'columnar file format of the export'},
+                },
+        responses={202: 'successfully requested review data export',
+                   403: 'current app user forbidden to export review data',
+                   404: 'no review with matching id was found',
+                   }
+        )
+    @use_kwargs({
+        'id': ma_fields.Int(
+            required=True, location='view_args',
+            validate=Range(min=1, max=constants.MAX_INT)),
+        'format': ma_fields.Str(
+            missing='parquet', validate=OneOf(sorted(EXPORT_FORMATS.keys()))),
+        })
+    def post(self, id, format):
+        """request a columnar export of review data, produced in the background"""
+        review = db.session.query(Review).get(id)
+        if not review:
+            return not_found_error('<Review(id={})> not found'.format(id))
+        if (g.current_user.is_admin is False and
+                review.users.filter_by(id=g.current_user.id).one_or_none() is None):
+            return forbidden_error(
+                '{} forbidden to get this review'.format(g.current_user))
+        export_review_data.apply_async(args=[id, format])
+        current_app.logger.info('%s export requested for %s', format, review)
+        return {'message': '{} export of {} requested; download it from this endpoint once finished'.format(format, review)}, 202
@@ -11,6 +11,7 @@ from webargs.flaskparser import use_args, use_kwargs
 from colandr import api_
 from ...lib import constants
 from ...models import db, Review
+from ...tasks import compute_citation_relevance_scores
 from ..errors import forbidden_error, not_found_error, validation_error
 from ..schemas import ReviewPlanSchema
 from ..swagger import review_plan_model
@@ -167,6 +168,9 @@ class ReviewPlanResource(Resource):
         if test is False:
             db.session.commit()
             current_app.logger.info('modified contents of %s', review_plan)
+            # reviewer keyterms may be used to score citations' relevance
+            if 'keyterms' in args or (fields and 'keyterms' in fields):
+                compute_citation_relevance_scores.apply_async(args=[id])
         else:
             db.session.rollback()
         return ReviewPlanSchema().dump(review_plan).data
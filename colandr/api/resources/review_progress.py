@@ -1,3 +1,5 @@
+import collections
+
 from flask import g, current_app
 from flask_restplus import Resource
 
@@ -7,9 +9,10 @@ from webargs.flaskparser import use_kwargs
 
 from colandr import api_
 from ...lib import constants
-from ...models import db, Review, Study
+from ...models import db, Review, ReviewStatusCount, Study
 from ..errors import forbidden_error, not_found_error
 from ..authentication import auth
+from ..screening_queues import get_citation_user_status, get_fulltext_user_status
 
 
 ns = api_.namespace(
@@ -68,90 +71,52 @@ class ReviewProgressResource(Resource):
                         'data_extraction_form': bool(review_plan.data_extraction_form),
                         }
             response['planning'] = progress  # {key: val for key, val in progress.items()}
+        if step != 'planning':
+            # changes in status counts are appended by a trigger, so just sum them up
+            status_counts = collections.defaultdict(dict)
+            query = db.session.query(ReviewStatusCount.stage,
+                                     ReviewStatusCount.status,
+                                     db.func.sum(ReviewStatusCount.count))\
+                .filter_by(review_id=id)
+            if step != 'all':
+                query = query.filter_by(stage=step)
+            query = query.group_by(ReviewStatusCount.stage, ReviewStatusCount.status)
+            for stage, status, count in query:
+                status_counts[stage][status] = count
         if step in ('citation_screening', 'all'):
             if user_view is False:
-                progress = db.session.query(Study.citation_status, db.func.count(1))\
-                    .filter_by(review_id=id)\
-                    .group_by(Study.citation_status)\
-                    .all()
-                progress = dict(progress)
+                progress = status_counts['citation_screening']
                 progress = {status: progress.get(status, 0)
                             for status in constants.SCREENING_STATUSES}
             else:
-                query = """
-                    SELECT
-                        (CASE
-                             WHEN citation_status IN ('included', 'excluded', 'conflict') THEN citation_status
-                             WHEN citation_status = 'screened_once' AND {user_id} = ANY(user_ids) THEN 'awaiting_coscreener'
-                             WHEN citation_status = 'not_screened' OR NOT {user_id} = ANY(user_ids) THEN 'pending'
-                         END) AS user_status,
-                         COUNT(*)
-                    FROM (SELECT
-                              studies.id,
-                              studies.dedupe_status,
-                              studies.citation_status,
-                              screenings.user_ids
-                          FROM studies
-                          LEFT JOIN (SELECT citation_id, ARRAY_AGG(user_id) AS user_ids
-                                     FROM citation_screenings
-                                     GROUP BY citation_id
-                                     ) AS screenings
-                          ON studies.id = screenings.citation_id
-                          WHERE review_id = {review_id}
-                          ) AS t
-                    WHERE dedupe_status = 'not_duplicate'  -- this is necessary!
-                    GROUP BY user_status;
-                    """.format(user_id=g.current_user.id, review_id=id)
-                progress = dict(row for row in db.engine.execute(query))
+                user_status = get_citation_user_status(g.current_user.id)
+                progress = db.session.query(user_status, db.func.count(1))\
+                    .filter(Study.review_id == id)\
+                    .filter(Study.dedupe_status == 'not_duplicate')\
+                    .group_by(user_status)\
+                    .all()
+                progress = dict(progress)
                 progress = {status: progress.get(status, 0)
                             for status in constants.USER_SCREENING_STATUSES}
             response['citation_screening'] = progress
         if step in ('fulltext_screening', 'all'):
             if user_view is False:
-                progress = db.session.query(Study.fulltext_status, db.func.count(1))\
-                    .filter_by(review_id=id)\
-                    .filter_by(citation_status='included')\
-                    .group_by(Study.fulltext_status)\
-                    .all()
-                progress = dict(progress)
+                progress = status_counts['fulltext_screening']
                 progress = {status: progress.get(status, 0)
                             for status in constants.SCREENING_STATUSES}
             else:
-                query = """
-                    SELECT
-                        (CASE
-                             WHEN fulltext_status IN ('included', 'excluded', 'conflict') THEN fulltext_status
-                             WHEN fulltext_status = 'not_screened' OR NOT {user_id} = ANY(user_ids) THEN 'pending'
-                             WHEN fulltext_status = 'screened_once' AND {user_id} = ANY(user_ids) THEN 'awaiting_coscreener'
-                         END) AS user_status,
-                         COUNT(*)
-                    FROM (SELECT
-                              studies.id,
-                              studies.citation_status,
-                              studies.fulltext_status,
-                              screenings.user_ids
-                          FROM studies
-                          LEFT JOIN (SELECT fulltext_id, ARRAY_AGG(user_id) AS user_ids
-                                     FROM fulltext_screenings
-                                     GROUP BY fulltext_id
-                                     ) AS screenings
-                          ON studies.id = screenings.fulltext_id
-                          WHERE review_id = {review_id}
-                          ) AS t
-                    WHERE citation_status = 'included'  -- this is necessary!
-                    GROUP BY user_status;
-                    """.format(user_id=g.current_user.id, review_id=id)
-                progress = dict(row for row in db.engine.execute(query))
+                user_status = get_fulltext_user_status(g.current_user.id)
+                progress = db.session.query(user_status, db.func.count(1))\
+                    .filter(Study.review_id == id)\
+                    .filter(Study.citation_status == 'included')\
+                    .group_by(user_status)\
+                    .all()
+                progress = dict(progress)
                 progress = {status: progress.get(status, 0)
                             for status in constants.USER_SCREENING_STATUSES}
             response['fulltext_screening'] = progress
         if step in ('data_extraction', 'all'):
-            progress = db.session.query(Study.data_extraction_status, db.func.count(1))\
-                .filter_by(review_id=id)\
-                .filter_by(fulltext_status='included')\
-                .group_by(Study.data_extraction_status)\
-                .all()
-            progress = dict(progress)
+            progress = status_counts['data_extraction']
             progress = {status: progress.get(status, 0)
                         for status in constants.EXTRACTION_STATUSES}
             response['data_extraction'] = progress
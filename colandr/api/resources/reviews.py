@@ -12,9 +12,10 @@ from webargs.flaskparser import use_args, use_kwargs
 
 from colandr import api_
 from ...lib import constants
-from ...models import db, Review
+from ...models import db, Fulltext, Review
 from ..errors import forbidden_error, not_found_error
 from ..schemas import ReviewSchema
+from ..uploads import remove_fulltext_uploads
 from ..swagger import review_model
 from ..authentication import auth
 
@@ -89,14 +90,25 @@ class ReviewResource(Resource):
         if review.owner is not g.current_user:
             return forbidden_error(
                 '{} forbidden to delete this review'.format(g.current_user))
+        # uploaded fulltext files may be shared with other reviews,
+        # so they're only removed if no longer referenced after deletion
+        fulltext_uploads = db.session.query(
+            Fulltext.review_id, Fulltext.filename, Fulltext.content_hash)\
+            .filter(Fulltext.review_id == id, Fulltext.content_hash != None)\
+            .all()
         db.session.delete(review)
         if test is False:
             db.session.commit()
             current_app.logger.info('deleted %s', review)
+            with db.engine.connect() as conn:
+                remove_fulltext_uploads(
+                    conn, current_app.config['FULLTEXT_UPLOADS_DIR'], fulltext_uploads)
             # remove directories on disk for review data
             dirnames = [
                 os.path.join(current_app.config['FULLTEXT_UPLOADS_DIR'], str(id)),
-                os.path.join(current_app.config['RANKING_MODELS_DIR'], str(id))]
+                os.path.join(current_app.config['RANKING_MODELS_DIR'], str(id)),
+                os.path.join(current_app.config['EXPORTS_DIR'], str(id)),
+                os.path.join(current_app.config['CITATIONS_DIR'], str(id))]
             for dirname in dirnames:
                 shutil.rmtree(dirname, ignore_errors=True)
             return '', 204
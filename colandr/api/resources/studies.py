@@ -1,10 +1,8 @@
-from operator import itemgetter
-import os
-import random
-
 from flask import g, current_app
 from flask_restplus import Resource
-from sqlalchemy import asc, desc, text
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import and_, asc, desc, or_, tuple_
+from sqlalchemy.orm import lazyload
 from sqlalchemy.sql import operators
 
 from marshmallow import fields as ma_fields
@@ -12,17 +10,17 @@ from marshmallow.validate import OneOf, Length, Range
 from webargs.fields import DelimitedList
 from webargs.flaskparser import use_args, use_kwargs
 
-import numpy as np
-from sklearn.externals import joblib
-
 from colandr import api_
 from ...lib import constants
 from ...models import db, Citation, Study, Review
-from ...lib.constants import (CITATION_RANKING_MODEL_FNAME, DEDUPE_STATUSES,
-                              EXTRACTION_STATUSES, USER_SCREENING_STATUSES)
-from ...lib.nlp import reviewer_terms
-from ..errors import forbidden_error, not_found_error
+from ...lib.constants import DEDUPE_STATUSES, EXTRACTION_STATUSES, USER_SCREENING_STATUSES
+from ...lib.cache import invalidate_prisma_counts
+from ...lib.feature_matrix import invalidate_feature_matrix
+from ..errors import bad_request_error, forbidden_error, not_found_error
 from ..schemas import StudySchema
+from ..screening_queues import (
+    citation_awaiting_coscreener_for_user, citation_pending_for_user,
+    fulltext_awaiting_coscreener_for_user, fulltext_pending_for_user)
 from ..swagger import study_model
 from ..authentication import auth
 
@@ -31,6 +29,54 @@ ns = api_.namespace(
     'studies', path='/studies',
     description='get, delete, update studies')
 
+CURSOR_SALT = 'studies-cursor'
+
+# studies' relationships that are loaded via (expensive) joins by default
+JOINED_RELATIONSHIPS = ('dedupe', 'citation', 'fulltext', 'data_extraction')
+
+
+def _dump_cursor(order_by, order_dir, study):
+    serializer = URLSafeSerializer(current_app.config['SECRET_KEY'])
+    key = [study.id] if order_by == 'recency' else [study.relevance_score, study.id]
+    return serializer.dumps([order_by, order_dir, key], salt=CURSOR_SALT)
+
+
+def _load_cursor(order_by, order_dir, cursor):
+    """
+    Returns:
+        list: ordering key of the last study on the previous page, or None
+            if ``cursor`` is invalid or was made for a different ordering
+    """
+    serializer = URLSafeSerializer(current_app.config['SECRET_KEY'])
+    try:
+        cursor_order_by, cursor_order_dir, key = serializer.loads(cursor, salt=CURSOR_SALT)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    if cursor_order_by != order_by or cursor_order_dir != order_dir:
+        return None
+    return key
+
+
+def _seek_after(order_by, order_dir, key):
+    """
+    Get a filter for studies that come strictly after the study with ordering
+    ``key`` in the given ordering, so pages can be seeked via index rather than
+    skipped over via offset.
+    """
+    if order_by == 'recency':
+        study_id, = key
+        return Study.id < study_id if order_dir == 'DESC' else Study.id > study_id
+    score, study_id = key
+    # studies without a relevance score always go last, most recent first
+    if score is None:
+        return and_(Study.relevance_score.is_(None), Study.id < study_id)
+    if order_dir == 'DESC':
+        after_score = tuple_(Study.relevance_score, Study.id) < tuple_(score, study_id)
+    else:
+        after_score = or_(Study.relevance_score > score,
+                          and_(Study.relevance_score == score, Study.id < study_id))
+    return or_(after_score, Study.relevance_score.is_(None))
+
 
 @ns.route('/<int:id>')
 @ns.doc(
@@ -102,6 +148,8 @@ class StudyResource(Resource):
         if test is False:
             db.session.commit()
             current_app.logger.info('deleted %s', study)
+            invalidate_feature_matrix(study.review_id)
+            invalidate_prisma_counts(study.review_id)
             return '', 204
         else:
             db.session.rollback()
@@ -143,6 +191,8 @@ class StudyResource(Resource):
         if test is False:
             db.session.commit()
             current_app.logger.info('modified %s', study)
+            if 'data_extraction_status' in args:
+                invalidate_prisma_counts(study.review_id)
         else:
             db.session.rollback()
         return StudySchema().dump(study).data
@@ -187,6 +237,8 @@ class StudiesResource(Resource):
                      'description': 'page number of the collection of ordered, matching studies, starting at 0'},
             'per_page': {'in': 'query', 'type': 'integer',
                          'description': 'number of studies to include per page'},
+            'cursor': {'in': 'query', 'type': 'string',
+                       'description': 'opaque cursor from the `next_cursor` of a previous response, or an empty string to get the first page; if given, `page` is ignored and the response includes a `next_cursor` for the following page'},
             },
         responses={
             200: 'successfully got matching study record(s)',
@@ -223,11 +275,13 @@ class StudiesResource(Resource):
             missing=0, validate=Range(min=0)),
         'per_page': ma_fields.Int(
             missing=25, validate=OneOf([10, 25, 50, 100, 5000])),
+        'cursor': ma_fields.String(
+            missing=None, validate=Length(max=200)),
         })
     def get(self, review_id, fields,
             dedupe_status, citation_status, fulltext_status, data_extraction_status,
             tag, tsquery,
-            order_by, order_dir, page, per_page):
+            order_by, order_dir, page, per_page, cursor):
         """get study record(s) for one or more matching studies"""
         review = db.session.query(Review).get(review_id)
         if not review:
@@ -249,83 +303,19 @@ class StudiesResource(Resource):
             if citation_status in {'conflict', 'excluded', 'included'}:
                 query = query.filter(Study.citation_status == citation_status)
             elif citation_status == 'pending':
-                stmt = """
-                    SELECT t.id
-                    FROM (SELECT
-                              studies.id,
-                              studies.dedupe_status,
-                              studies.citation_status,
-                              screenings.user_ids
-                          FROM studies
-                          LEFT JOIN (SELECT citation_id, ARRAY_AGG(user_id) AS user_ids
-                                     FROM citation_screenings
-                                     GROUP BY citation_id
-                                     ) AS screenings
-                          ON studies.id = screenings.citation_id
-                          ) AS t
-                    WHERE
-                        t.dedupe_status = 'not_duplicate' -- this is necessary!
-                        AND t.citation_status NOT IN ('excluded', 'included', 'conflict')
-                        AND (t.citation_status = 'not_screened' OR NOT {user_id} = ANY(t.user_ids))
-                    """.format(user_id=g.current_user.id)
-                query = query.filter(Study.id.in_(text(stmt)))
+                query = query.filter(citation_pending_for_user(g.current_user.id))
             elif citation_status == 'awaiting_coscreener':
-                stmt = """
-                    SELECT t.id
-                    FROM (SELECT studies.id, studies.citation_status, screenings.user_ids
-                          FROM studies
-                          LEFT JOIN (SELECT citation_id, ARRAY_AGG(user_id) AS user_ids
-                                     FROM citation_screenings
-                                     GROUP BY citation_id
-                                     ) AS screenings
-                          ON studies.id = screenings.citation_id
-                          ) AS t
-                    WHERE
-                        t.citation_status = 'screened_once'
-                        AND {user_id} = ANY(t.user_ids)
-                    """.format(user_id=g.current_user.id)
-                query = query.filter(Study.id.in_(text(stmt)))
+                query = query.filter(
+                    citation_awaiting_coscreener_for_user(g.current_user.id))
 
         if fulltext_status is not None:
             if fulltext_status in {'conflict', 'excluded', 'included'}:
                 query = query.filter(Study.fulltext_status == fulltext_status)
             elif fulltext_status == 'pending':
-                stmt = """
-                    SELECT t.id
-                    FROM (SELECT
-                              studies.id,
-                              studies.citation_status,
-                              studies.fulltext_status,
-                              screenings.user_ids
-                          FROM studies
-                          LEFT JOIN (SELECT fulltext_id, ARRAY_AGG(user_id) AS user_ids
-                                     FROM fulltext_screenings
-                                     GROUP BY fulltext_id
-                                     ) AS screenings
-                          ON studies.id = screenings.fulltext_id
-                          ) AS t
-                    WHERE
-                        t.citation_status = 'included' -- this is necessary!
-                        AND t.fulltext_status NOT IN ('excluded', 'included', 'conflict')
-                        AND (t.fulltext_status = 'not_screened' OR NOT {user_id} = ANY(t.user_ids))
-                    """.format(user_id=g.current_user.id)
-                query = query.filter(Study.id.in_(text(stmt)))
+                query = query.filter(fulltext_pending_for_user(g.current_user.id))
             elif fulltext_status == 'awaiting_coscreener':
-                stmt = """
-                    SELECT t.id
-                    FROM (SELECT studies.id, studies.fulltext_status, screenings.user_ids
-                          FROM studies
-                          LEFT JOIN (SELECT fulltext_id, ARRAY_AGG(user_id) AS user_ids
-                                     FROM fulltext_screenings
-                                     GROUP BY fulltext_id
-                                     ) AS screenings
-                          ON studies.id = screenings.fulltext_id
-                          ) AS t
-                    WHERE
-                        t.fulltext_status = 'screened_once'
-                        AND {user_id} = ANY(t.user_ids)
-                    """.format(user_id=g.current_user.id)
-                query = query.filter(Study.id.in_(text(stmt)))
+                query = query.filter(
+                    fulltext_awaiting_coscreener_for_user(g.current_user.id))
 
         if data_extraction_status is not None:
             if data_extraction_status == 'not_started':
@@ -338,72 +328,43 @@ class StudiesResource(Resource):
             query = query.filter(Study.tags.any(tag, operator=operators.eq))
 
         if tsquery:
-            if order_by != 'relevance':  # HACK...
-                query = query.join(Citation, Citation.id == Study.id)\
-                    .filter(Citation.text_content.match(tsquery))
+            query = query.join(Citation, Citation.id == Study.id)\
+                .filter(Citation.text_content.match(tsquery))
+
+        # don't join-load related records that won't be returned
+        if fields:
+            query = query.options(*[lazyload(rel) for rel in JOINED_RELATIONSHIPS
+                                    if rel not in fields])
 
         # order, offset, and limit
         if order_by == 'recency':
-            order_by = desc(Study.id) if order_dir == 'DESC' else asc(Study.id)
-            query = query.order_by(order_by)
+            order_by_ = desc(Study.id) if order_dir == 'DESC' else asc(Study.id)
+            query = query.order_by(order_by_)
+        elif order_by == 'relevance':
+            # relevance scores are precomputed by a background task
+            # studies without one (yet) always go last, most recent first
+            if order_dir == 'DESC':
+                query = query.order_by(
+                    desc(Study.relevance_score).nullslast(), desc(Study.id))
+            else:
+                query = query.order_by(
+                    asc(Study.relevance_score).nullslast(), desc(Study.id))
+
+        if cursor is None:
             query = query.offset(page * per_page).limit(per_page)
             return StudySchema(many=True, only=fields).dump(query.all()).data
 
-        elif order_by == 'relevance':
-            query = query.join(Citation, Citation.id == Study.id)
-            if tsquery:
-                query = query.filter(Citation.text_content.match(tsquery))
-
-            # get results and corresponding relevance scores
-            results = query.order_by(db.func.random()).limit(1000).all()
-            scores = None
-
-            # best option: we have a trained citation ranking model
-            fname = CITATION_RANKING_MODEL_FNAME.format(review_id=review_id)
-            filepath = os.path.join(
-                current_app.config['RANKING_MODELS_DIR'], str(review_id), fname)
-            if os.path.isfile(filepath):
-                clf = joblib.load(filepath)
-                X = np.vstack(
-                    tuple(result.citation.text_content_vector_rep
-                          for result in results
-                          if result.citation.text_content_vector_rep)
-                    )
-                scores = clf.decision_function(X).tolist()
-
-            # next best option: both positive and negative keyterms
-            if not scores:
-                review_plan = review.review_plan
-                suggested_keyterms = review_plan.suggested_keyterms
-                if suggested_keyterms:
-                    incl_regex, excl_regex = reviewer_terms.get_incl_excl_terms_regex(
-                        review_plan.suggested_keyterms)
-                    scores = [
-                        reviewer_terms.get_incl_excl_terms_score(
-                            incl_regex, excl_regex, result.citation.text_content)
-                        for result in results]
-
-            # last option: just reviewer terms
-            if not scores:
-                keyterms = review_plan.keyterms
-                if keyterms:
-                    keyterms_regex = reviewer_terms.get_keyterms_regex(keyterms)
-                    scores = [
-                        reviewer_terms.get_keyterms_score(
-                            keyterms_regex, result.citation.text_content)
-                        for result in results]
-
-            # well fuck, we're out of options! let's order results randomly...
-            if not scores:
-                scores = list(range(len(results)))
-                random.shuffle(scores)
-
-            # zip the results and scores together, sort and offset accordingly
-            sorted_results = [
-                result for result, _
-                in sorted(zip(results, scores),
-                          key=itemgetter(1),
-                          reverse=False if order_dir == 'ASC' else True)]
-            offset = page * per_page
-            return StudySchema(many=True, only=fields).dump(
-                sorted_results[offset: offset + per_page]).data
+        # keyset pagination: seek past the previous page's last study
+        if cursor:
+            key = _load_cursor(order_by, order_dir, cursor)
+            if key is None:
+                return bad_request_error(
+                    'cursor "{}" is invalid for this ordering'.format(cursor))
+            query = query.filter(_seek_after(order_by, order_dir, key))
+        studies = query.limit(per_page).all()
+        if len(studies) == per_page:
+            next_cursor = _dump_cursor(order_by, order_dir, studies[-1])
+        else:
+            next_cursor = None
+        return {'studies': StudySchema(many=True, only=fields).dump(studies).data,
+                'next_cursor': next_cursor}
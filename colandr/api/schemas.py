@@ -166,6 +166,8 @@ class ImportSchema(Schema):
         dump_only=True)
     created_at = fields.DateTime(
         dump_only=True, format='iso')
+    last_updated = fields.DateTime(
+        dump_only=True, format='iso')
     review_id = fields.Int(
         required=True, validate=Range(min=1, max=constants.MAX_INT))
     user_id = fields.Int(
@@ -178,6 +180,12 @@ class ImportSchema(Schema):
         required=True, validate=Range(min=1, max=constants.MAX_INT))
     status = fields.Str(
         validate=OneOf(constants.IMPORT_STATUSES))
+    import_status = fields.Str(
+        dump_only=True, validate=OneOf(constants.IMPORT_JOB_STATUSES))
+    num_records_failed = fields.Int(
+        dump_only=True)
+    original_filename = fields.Str(
+        dump_only=True)
     data_source = fields.Nested(
         DataSourceSchema)
     user = fields.Nested(
@@ -300,6 +308,8 @@ class FulltextSchema(Schema):
         validate=Length(max=30))
     original_filename = fields.Str(
         dump_only=True)
+    content_hash = fields.Str(
+        dump_only=True)
     screenings = fields.Nested(
         ScreeningSchema, many=True, dump_only=True)
 
@@ -367,6 +377,8 @@ class StudySchema(Schema):
         DataExtractionSchema, dump_only=True)
     data_extraction_status = fields.Str(
         validate=OneOf(constants.EXTRACTION_STATUSES))
+    relevance_score = fields.Float(
+        dump_only=True)
 
     class Meta:
         strict = True
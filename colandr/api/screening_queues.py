@@ -0,0 +1,84 @@
+"""
+Query expressions for a user's view of a review's citation and fulltext
+screening queues: which studies are still "pending" for the user, and which
+are "awaiting_coscreener" after the user screened them.
+
+Whether a user has screened a given study is checked with a correlated
+(NOT) EXISTS on the screenings table, constrained by review, user, and study,
+which is exactly covered by the screenings' unique constraint index, rather
+than by aggregating user ids over every screening in every review.
+"""
+from sqlalchemy import and_, case, exists, not_, or_
+
+from ..models import CitationScreening, FulltextScreening, Study
+
+
+FINAL_STATUSES = ('included', 'excluded', 'conflict')
+
+
+def citation_screened_by_user(user_id):
+    return exists()\
+        .where(CitationScreening.review_id == Study.review_id)\
+        .where(CitationScreening.user_id == user_id)\
+        .where(CitationScreening.citation_id == Study.id)
+
+
+def fulltext_screened_by_user(user_id):
+    return exists()\
+        .where(FulltextScreening.review_id == Study.review_id)\
+        .where(FulltextScreening.user_id == user_id)\
+        .where(FulltextScreening.fulltext_id == Study.id)
+
+
+def citation_pending_for_user(user_id):
+    return and_(
+        Study.dedupe_status == 'not_duplicate',  # this is necessary!
+        Study.citation_status.notin_(FINAL_STATUSES),
+        or_(Study.citation_status == 'not_screened',
+            not_(citation_screened_by_user(user_id))))
+
+
+def citation_awaiting_coscreener_for_user(user_id):
+    return and_(
+        Study.citation_status == 'screened_once',
+        citation_screened_by_user(user_id))
+
+
+def fulltext_pending_for_user(user_id):
+    return and_(
+        Study.citation_status == 'included',  # this is necessary!
+        Study.fulltext_status.notin_(FINAL_STATUSES),
+        or_(Study.fulltext_status == 'not_screened',
+            not_(fulltext_screened_by_user(user_id))))
+
+
+def fulltext_awaiting_coscreener_for_user(user_id):
+    return and_(
+        Study.fulltext_status == 'screened_once',
+        fulltext_screened_by_user(user_id))
+
+
+def get_citation_user_status(user_id):
+    """
+    Get an expression for a study's citation status from the perspective of
+    user ``user_id``: one of :obj:`constants.USER_SCREENING_STATUSES` or NULL.
+    """
+    screened = citation_screened_by_user(user_id)
+    return case([
+        (Study.citation_status.in_(FINAL_STATUSES), Study.citation_status),
+        (and_(Study.citation_status == 'screened_once', screened), 'awaiting_coscreener'),
+        (or_(Study.citation_status == 'not_screened', not_(screened)), 'pending'),
+        ])
+
+
+def get_fulltext_user_status(user_id):
+    """
+    Get an expression for a study's fulltext status from the perspective of
+    user ``user_id``: one of :obj:`constants.USER_SCREENING_STATUSES` or NULL.
+    """
+    screened = fulltext_screened_by_user(user_id)
+    return case([
+        (Study.fulltext_status.in_(FINAL_STATUSES), Study.fulltext_status),
+        (or_(Study.fulltext_status == 'not_screened', not_(screened)), 'pending'),
+        (and_(Study.fulltext_status == 'screened_once', screened), 'awaiting_coscreener'),
+        ])
@@ -0,0 +1,67 @@
+"""
+Set-based writes of many users' screening decisions at once, for the bulk
+citation and fulltext screening endpoints.
+"""
+import json
+
+from sqlalchemy import text
+
+
+# insert screenings given as a json array, or update them if the user
+# has already screened the corresponding studies
+UPSERT_SCREENINGS_SQL = """
+    INSERT INTO {screenings_table} (review_id, user_id, {study_id_column}, status, exclude_reasons)
+    SELECT
+        :review_id,
+        :user_id,
+        (screening ->> 'study_id')::BIGINT,
+        screening ->> 'status',
+        (CASE
+             WHEN jsonb_typeof(screening -> 'exclude_reasons') = 'array'
+             THEN ARRAY(SELECT jsonb_array_elements_text(screening -> 'exclude_reasons'))
+         END)::VARCHAR[]
+    FROM jsonb_array_elements(CAST(:screenings AS JSONB)) AS screening
+    ON CONFLICT ON CONSTRAINT {unique_constraint}
+    DO UPDATE SET
+        status = EXCLUDED.status,
+        exclude_reasons = EXCLUDED.exclude_reasons,
+        last_updated = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+    """
+
+UPSERT_SCREENINGS = {
+    'citation': text(UPSERT_SCREENINGS_SQL.format(
+        screenings_table='citation_screenings',
+        study_id_column='citation_id',
+        unique_constraint='review_user_citation_uc')),
+    'fulltext': text(UPSERT_SCREENINGS_SQL.format(
+        screenings_table='fulltext_screenings',
+        study_id_column='fulltext_id',
+        unique_constraint='review_user_fulltext_uc')),
+    }
+
+
+def upsert_screenings(connection, stage, review_id, user_id, screenings):
+    """
+    Insert or update user ``user_id``'s ``stage`` screenings of studies in
+    review ``review_id``, in a single round trip.
+
+    Args:
+        connection (:class:`sqlalchemy.engine.Connection`)
+        stage (str): either 'citation' or 'fulltext'
+        review_id (int)
+        user_id (int)
+        screenings (List[dict]): each with 'study_id', 'status',
+            and (optionally) 'exclude_reasons' keys
+
+    Returns:
+        int: number of screenings inserted or updated
+    """
+    screenings = json.dumps([
+        {'study_id': screening['study_id'],
+         'status': screening['status'],
+         'exclude_reasons': screening.get('exclude_reasons')}
+        for screening in screenings])
+    result = connection.execute(
+        UPSERT_SCREENINGS[stage],
+        review_id=review_id, user_id=user_id, screenings=screenings)
+    return result.rowcount
@@ -0,0 +1,231 @@
+"""
+Match many uploaded fulltext content files -- loose or in a zip archive -- to
+a review's fulltexts, track the per-file status of their text extraction in
+redis, so that clients can poll a bulk upload's progress, and clean up stored
+files once no fulltext refers to them anymore.
+"""
+import os
+import re
+import uuid
+import zipfile
+
+import redis
+from sqlalchemy import select, text
+
+from ..lib.blobs import get_fulltext_relpath, remove_blob
+from ..lib.utils import get_console_logger
+from ..models import Citation, Fulltext
+
+
+REDIS_CONN = redis.StrictRedis()
+UPLOAD_STATUSES_KEY = 'colandr:fulltext_uploads:{review_id}:{upload_id}'
+
+RE_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+logger = get_console_logger(__name__)
+
+
+def normalize_doi(doi):
+    """
+    Normalize ``doi`` so it can be compared against a filename, in which
+    characters such as '/' can't appear; for example, '10.1000/XYZ-123'
+    and '10.1000_xyz_123' both become '10_1000_xyz_123'.
+    """
+    return RE_NON_ALNUM.sub('_', doi.lower()).strip('_')
+
+
+def get_fulltext_ids_by_doi(connection, review_id):
+    """
+    Returns:
+        Tuple[Set[int], Dict[str, int]]: ids of all fulltexts in review
+            ``review_id``, and a mapping of their citations' normalized DOIs
+            to fulltext id
+    """
+    stmt = select([Fulltext.id, Citation.doi])\
+        .select_from(Fulltext.__table__.join(Citation, Citation.id == Fulltext.id))\
+        .where(Fulltext.review_id == review_id)
+    fulltext_ids = set()
+    doi_fulltext_ids = {}
+    for fulltext_id, doi in connection.execute(stmt):
+        fulltext_ids.add(fulltext_id)
+        if doi:
+            doi_fulltext_ids[normalize_doi(doi)] = fulltext_id
+    return fulltext_ids, doi_fulltext_ids
+
+
+def match_fulltext_id(filename, fulltext_ids, doi_fulltext_ids):
+    """
+    Match uploaded file ``filename`` to a fulltext id, either by convention
+    -- the file is named for its fulltext id, e.g. '123.pdf' -- or by its
+    citation's DOI, e.g. '10.1000_xyz123.pdf'.
+
+    Returns:
+        int: matched fulltext id, or None if no match was found
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if stem.isdigit() and int(stem) in fulltext_ids:
+        return int(stem)
+    return doi_fulltext_ids.get(normalize_doi(stem))
+
+
+def iter_uploaded_files(uploaded_files):
+    """
+    Flatten uploaded files, expanding any zip archives among them into their
+    member files, without reading whole files into memory.
+
+    Args:
+        uploaded_files (List[:class:`werkzeug.datastructures.FileStorage`])
+
+    Yields:
+        Tuple[str, file]: next file's name and a readable file object
+    """
+    for uploaded_file in uploaded_files:
+        if os.path.splitext(uploaded_file.filename)[1].lower() != '.zip':
+            yield uploaded_file.filename, uploaded_file.stream
+            continue
+        with zipfile.ZipFile(uploaded_file.stream) as archive:
+            for member in _iter_archive_members(archive):
+                # reading stops at a member's declared size -- and raises if that
+                # size was a lie -- so sizes checked by check_archive_sizes hold
+                with archive.open(member) as f:
+                    yield os.path.basename(member.filename), f
+
+
+def _iter_archive_members(archive):
+    for member in archive.infolist():
+        if member.filename.endswith('/') or member.filename.startswith('__MACOSX'):
+            continue
+        yield member
+
+
+def check_archive_sizes(uploaded_file, max_file_size, max_archive_size):
+    """
+    Check that no file in uploaded zip archive ``uploaded_file`` is larger than
+    ``max_file_size`` bytes, and that all of them together aren't larger than
+    ``max_archive_size`` bytes, once uncompressed -- before any are extracted.
+
+    Returns:
+        str: description of the first limit exceeded, or None if none were
+    """
+    total_size = 0
+    with zipfile.ZipFile(uploaded_file.stream) as archive:
+        for member in _iter_archive_members(archive):
+            if member.file_size > max_file_size:
+                return 'file "{}" in zip archive "{}" is larger than {} bytes uncompressed'.format(
+                    member.filename, uploaded_file.filename, max_file_size)
+            total_size += member.file_size
+            if total_size > max_archive_size:
+                return 'zip archive "{}" is larger than {} bytes uncompressed'.format(
+                    uploaded_file.filename, max_archive_size)
+    return None
+
+
+def lock_blob(connection, content_hash):
+    """
+    Keep the blob with ``content_hash`` from being removed by
+    :func:`remove_fulltext_uploads` until the current transaction of
+    ``connection`` -- which may also be a session -- ends; call this before
+    checking that the blob exists, and commit once a fulltext refers to it.
+    Any number of uploads may hold this lock on the same blob at once.
+    """
+    connection.execute(
+        text('SELECT pg_advisory_xact_lock_shared(hashtext(:content_hash))'),
+        {'content_hash': content_hash})
+
+
+def remove_fulltext_uploads(connection, uploads_dir, uploads):
+    """
+    Remove files previously uploaded for fulltexts from disk: blobs only if no
+    fulltext refers to them anymore, since they may be shared among fulltexts;
+    files uploaded before content-addressed storage, unconditionally.
+
+    A blob that's being uploaded again concurrently, i.e. is locked via
+    :func:`lock_blob`, is left in place; an upload that ends up not referring
+    to it only leaves behind an unreferenced file, whereas removing it could
+    leave a fulltext referring to a missing one.
+
+    Args:
+        connection (:class:`sqlalchemy.engine.Connection`)
+        uploads_dir (str)
+        uploads (Iterable[Tuple[int, str, str]]): review id, filename,
+            and content hash (or None) of each previous upload
+
+    Returns:
+        int: number of files removed
+    """
+    n_removed = 0
+    blobs = {}
+    for review_id, filename, content_hash in uploads:
+        if content_hash is not None:
+            blobs[content_hash] = filename
+            continue
+        try:
+            os.remove(os.path.join(uploads_dir, get_fulltext_relpath(review_id, filename)))
+            n_removed += 1
+        except FileNotFoundError:
+            pass
+    if blobs:
+        with connection.begin():
+            # never wait on a lock, so removals can't deadlock with uploads
+            stmt = text('SELECT pg_try_advisory_xact_lock(hashtext(:content_hash))')
+            unlocked = [
+                content_hash for content_hash in sorted(blobs.keys())
+                if connection.execute(stmt, {'content_hash': content_hash}).scalar()]
+            if unlocked:
+                stmt = select([Fulltext.content_hash])\
+                    .where(Fulltext.content_hash.in_(unlocked))\
+                    .distinct()
+                referenced = {row[0] for row in connection.execute(stmt)}
+                for content_hash in unlocked:
+                    if content_hash not in referenced:
+                        remove_blob(uploads_dir, blobs[content_hash], content_hash)
+                        n_removed += 1
+    return n_removed
+
+
+def init_upload_statuses(review_id, fulltext_ids, expire=86400):
+    """
+    Start tracking the text extraction statuses of a bulk upload of files for
+    ``fulltext_ids``, all initially 'extracting'.
+
+    Returns:
+        str: unique identifier of the bulk upload
+    """
+    upload_id = uuid.uuid4().hex
+    if fulltext_ids:
+        key = UPLOAD_STATUSES_KEY.format(review_id=review_id, upload_id=upload_id)
+        try:
+            with REDIS_CONN.pipeline() as pipe:
+                pipe.hmset(key, {fulltext_id: 'extracting' for fulltext_id in fulltext_ids})
+                pipe.expire(key, expire)
+                pipe.execute()
+        except redis.RedisError:
+            logger.exception(
+                'unable to track statuses of fulltext upload for <Review(id=%s)>', review_id)
+    return upload_id
+
+
+def set_upload_status(review_id, upload_id, fulltext_id, status):
+    """Set the text extraction status of ``fulltext_id``'s file in bulk upload ``upload_id``."""
+    key = UPLOAD_STATUSES_KEY.format(review_id=review_id, upload_id=upload_id)
+    try:
+        # don't resurrect statuses of an upload that has since expired
+        if REDIS_CONN.hexists(key, fulltext_id):
+            REDIS_CONN.hset(key, fulltext_id, status)
+    except redis.RedisError:
+        logger.exception(
+            'unable to set status of <Fulltext(study_id=%s)> upload', fulltext_id)
+
+
+def get_upload_statuses(review_id, upload_id):
+    """
+    Returns:
+        Dict[int, str]: text extraction status by fulltext id of all files in
+            bulk upload ``upload_id``, or None if no such upload was found
+    """
+    statuses = REDIS_CONN.hgetall(
+        UPLOAD_STATUSES_KEY.format(review_id=review_id, upload_id=upload_id))
+    if not statuses:
+        return None
+    return {int(fulltext_id): status.decode('utf-8')
+            for fulltext_id, status in statuses.items()}
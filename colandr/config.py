@@ -10,6 +10,7 @@
 # - COLANDR_APP_DIR
 #     - path on disk of colandr, i.e. the permanent-colandr-back repo
 
+from datetime import timedelta
 import os
 
 
@@ -30,12 +31,35 @@ class Config(object):
     CELERY_TASK_SERIALIZER = 'json'
     CELERY_RESULT_SERIALIZER = 'json'
     CELERYD_LOG_COLOR = False
+    CELERYBEAT_SCHEDULE = {
+        'enqueue-dirty-review-tasks': {
+            'task': 'colandr.tasks.enqueue_dirty_review_tasks',
+            'schedule': timedelta(seconds=10),
+            },
+        'reconcile-review-status-counts': {
+            'task': 'colandr.tasks.reconcile_review_status_counts',
+            'schedule': timedelta(hours=24),
+            },
+        'fail-stale-citation-imports': {
+            'task': 'colandr.tasks.fail_stale_citation_imports',
+            'schedule': timedelta(minutes=15),
+            },
+        }
+    # seconds without new citation imports before a review is deduped/vectorized
+    DIRTY_REVIEW_QUIET_PERIOD = 60
+
+    # seconds before cached review prisma counts expire, even if not invalidated
+    PRISMA_COUNTS_CACHE_TTL = 3600
 
     # sql db config
     SQLALCHEMY_COMMIT_ON_TEARDOWN = True
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_RECORD_QUERIES = True
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    # connection pools shared by all tasks run in a celery worker process
+    TASKS_DB_POOL_SIZE = 5
+    TASKS_DB_MAX_OVERFLOW = 10
+    TASKS_DB_POOL_RECYCLE = 3600
 
     RESTPLUS_VALIDATE = False
 
@@ -51,8 +75,35 @@ class Config(object):
         COLANDR_APP_DIR, 'colandr_data', 'citations')
     FULLTEXT_UPLOADS_DIR = os.path.join(
         COLANDR_APP_DIR, 'colandr_data', 'fulltexts')
+    EXPORTS_DIR = os.path.join(
+        COLANDR_APP_DIR, 'colandr_data', 'exports')
+    EXPORT_BATCH_SIZE = 5000  # rows per record batch in columnar exports
+    IMPORT_CHUNK_SIZE = 2000  # citations copied into the db at a time on import
+    STALE_IMPORT_TIMEOUT = 3600  # seconds without progress before an import is failed
     ALLOWED_FULLTEXT_UPLOAD_EXTENSIONS = {'.txt', '.pdf'}
     MAX_CONTENT_LENGTH = 40 * 1024 * 1024  # 40MB file upload limit
+    # limits on the uncompressed sizes of zip archives' files in bulk fulltext uploads
+    MAX_FULLTEXT_UPLOAD_FILE_SIZE = 40 * 1024 * 1024
+    MAX_FULLTEXT_UPLOAD_ARCHIVE_SIZE = 400 * 1024 * 1024
+    # to have the web server send uploaded fulltext files' bytes rather than
+    # a python worker, either set USE_X_SENDFILE = True (apache, lighttpd) or
+    # set this to an nginx internal location aliased to FULLTEXT_UPLOADS_DIR
+    USE_X_SENDFILE = False
+    FULLTEXT_ACCEL_REDIRECT_LOCATION = None  # e.g. '/fulltext_uploads'
+    RANKING_MODEL_CACHE_SIZE = 32  # max number of ranking models held in memory
+
+    # fulltext pdf text extraction config; backend is one of 'server', 'pdfminer',
+    # or 'subprocess' -- see colandr.lib.pdf_extraction
+    PDF_EXTRACTION_BACKEND = 'server'
+    PDF_EXTRACTION_SERVER_ADDRESS = ('localhost', 8081)
+    PDF_EXTRACTION_TIMEOUT = 120  # seconds
+
+    # text content vectorization config
+    VECTORIZATION_BATCH_SIZE = 500  # docs per batch passed through spacy's pipe
+    VECTORIZATION_N_THREADS = 2  # threads used by spacy's pipe
+    VECTORIZATION_CHUNK_SIZE = 2000  # vectors written back to the db at a time
+    FULLTEXT_PASSAGE_MAX_CHARS = 2000  # fulltexts are vectorized passage by passage
+    FULLTEXT_PASSAGE_VECTORS = False  # if True, also store passages' vectors, for search
 
     # email server config
     MAIL_SERVER = 'smtp.gmail.com'
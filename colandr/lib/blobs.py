@@ -0,0 +1,114 @@
+"""
+Content-addressed storage of uploaded fulltext files: each file is stored once,
+under ``<FULLTEXT_UPLOADS_DIR>/blobs/``, keyed by the SHA-256 hash of its
+contents, no matter how many fulltexts -- in how many reviews -- it's uploaded for.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+BLOBS_DIRNAME = 'blobs'
+
+
+def get_fulltext_relpath(review_id, filename, content_hash=None):
+    """
+    Get the path of a fulltext's uploaded file, relative to ``FULLTEXT_UPLOADS_DIR``:
+    its blob, if ``content_hash`` is known, otherwise where uploads were stored
+    before content-addressing, i.e. ``<review_id>/<filename>``.
+    """
+    if content_hash is None:
+        return os.path.join(str(review_id), filename)
+    return os.path.join(
+        BLOBS_DIRNAME, content_hash[:2],
+        content_hash + os.path.splitext(filename)[1].lower())
+
+
+def hash_file(f, chunk_size=1024 * 1024):
+    """Get the hex SHA-256 digest of file object ``f``'s contents."""
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _is_seekable(f):
+    try:
+        return f.seekable()
+    except AttributeError:
+        return False
+
+
+def save_blob(f, uploads_dir, filename, lock=None, chunk_size=1024 * 1024):
+    """
+    Store the contents of file object ``f``, uploaded as ``filename``, as a
+    blob -- unless an identical blob is already stored, in which case nothing
+    is written. Blobs are written to a temporary file, then atomically moved
+    into place, so a partially-written blob is never visible.
+
+    If given, ``lock`` is called with the blob's content hash just before
+    checking whether it's already stored, so that the caller can keep the blob
+    from being removed until a fulltext refers to it.
+
+    Returns:
+        Tuple[str, bool]: blob's content hash, and whether it was newly stored
+    """
+    if _is_seekable(f):
+        # hash first, so a duplicate needn't be written at all
+        content_hash = hash_file(f, chunk_size=chunk_size)
+        if lock is not None:
+            lock(content_hash)
+        filepath = os.path.join(
+            uploads_dir, get_fulltext_relpath(None, filename, content_hash))
+        if os.path.isfile(filepath):
+            return content_hash, False
+        f.seek(0)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=os.path.dirname(filepath), suffix='.tmp', delete=False) as tmp:
+            shutil.copyfileobj(f, tmp, chunk_size)
+    else:
+        # hash while writing, then discard the copy if it's a duplicate
+        sha256 = hashlib.sha256()
+        blobs_dir = os.path.join(uploads_dir, BLOBS_DIRNAME)
+        os.makedirs(blobs_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=blobs_dir, suffix='.tmp', delete=False) as tmp:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(chunk)
+                tmp.write(chunk)
+        content_hash = sha256.hexdigest()
+        if lock is not None:
+            lock(content_hash)
+        filepath = os.path.join(
+            uploads_dir, get_fulltext_relpath(None, filename, content_hash))
+        if os.path.isfile(filepath):
+            os.remove(tmp.name)
+            return content_hash, False
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    # temporary files are only readable by their owner, unlike regular uploads
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, filepath)
+    return content_hash, True
+
+
+def save_blob_from_path(filepath, uploads_dir, lock=None):
+    """
+    Store the file at ``filepath`` as a blob, as with :func:`save_blob`;
+    the original file is left in place.
+
+    Returns:
+        Tuple[str, bool]
+    """
+    with open(filepath, mode='rb') as f:
+        return save_blob(f, uploads_dir, filepath, lock=lock)
+
+
+def remove_blob(uploads_dir, filename, content_hash):
+    """Remove a stored blob from disk, if it exists; callers must ensure it's unreferenced."""
+    try:
+        os.remove(os.path.join(
+            uploads_dir, get_fulltext_relpath(None, filename, content_hash)))
+    except FileNotFoundError:
+        pass
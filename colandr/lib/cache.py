@@ -0,0 +1,77 @@
+"""
+Redis-backed cache of reviews' PRISMA counts, so that dashboards polling them
+cost a single key lookup. Cached counts are invalidated by every write that
+can change them -- screenings, imports, dedupes, study deletions -- and also
+expire after ``PRISMA_COUNTS_CACHE_TTL`` seconds, which bounds the staleness
+of any counts computed concurrently with an as-yet uncommitted write.
+"""
+import json
+
+from flask import current_app
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .utils import get_console_logger
+
+
+REDIS_CONN = redis.StrictRedis()
+PRISMA_COUNTS_KEY = 'colandr:prisma_counts:{review_id}'
+PENDING_INVALIDATIONS_KEY = 'prisma_counts_review_ids'
+
+logger = get_console_logger(__name__)
+
+
+def get_cached_prisma_counts(review_id):
+    """
+    Returns:
+        dict: PRISMA counts for review ``review_id``, or None if not cached
+    """
+    try:
+        value = REDIS_CONN.get(PRISMA_COUNTS_KEY.format(review_id=review_id))
+    except redis.RedisError:
+        logger.exception('unable to get cached prisma counts for <Review(id=%s)>', review_id)
+        return None
+    if value is None:
+        return None
+    return json.loads(value.decode('utf-8'))
+
+
+def cache_prisma_counts(review_id, counts):
+    try:
+        REDIS_CONN.set(
+            PRISMA_COUNTS_KEY.format(review_id=review_id), json.dumps(counts),
+            ex=current_app.config['PRISMA_COUNTS_CACHE_TTL'])
+    except redis.RedisError:
+        logger.exception('unable to cache prisma counts for <Review(id=%s)>', review_id)
+
+
+def invalidate_prisma_counts(review_id):
+    try:
+        REDIS_CONN.delete(PRISMA_COUNTS_KEY.format(review_id=review_id))
+    except redis.RedisError:
+        logger.exception('unable to invalidate prisma counts for <Review(id=%s)>', review_id)
+
+
+def invalidate_prisma_counts_on_commit(session, review_id):
+    """
+    Invalidate review ``review_id``'s cached PRISMA counts once ``session``'s
+    transaction commits, e.g. from within a flush; invalidating any earlier
+    would let a concurrent request re-cache counts that don't include the
+    write. If the transaction is rolled back, nothing is invalidated.
+    """
+    if session is None:
+        invalidate_prisma_counts(review_id)
+        return
+    session.info.setdefault(PENDING_INVALIDATIONS_KEY, set()).add(review_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_pending_prisma_counts(session):
+    for review_id in session.info.pop(PENDING_INVALIDATIONS_KEY, ()):
+        invalidate_prisma_counts(review_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_prisma_counts(session):
+    session.info.pop(PENDING_INVALIDATIONS_KEY, None)
@@ -0,0 +1,162 @@
+"""
+Write typed, columnar exports of a review's data -- as Parquet or Arrow IPC
+files -- in record batches, so arbitrarily large exports never have to be
+held in memory all at once.
+"""
+import os
+import tempfile
+
+import arrow
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+EXPORT_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+EXPORT_TABLES = ('studies', 'screenings')
+
+STRING_LIST = pa.list_(pa.string())
+
+STUDIES_SCHEMA_FIELDS = [
+    ('study_id', pa.int64()),
+    ('deduplication_status', pa.string()),
+    ('citation_screening_status', pa.string()),
+    ('fulltext_screening_status', pa.string()),
+    ('data_extraction_screening_status', pa.string()),
+    ('data_source_type', pa.string()),
+    ('data_source_name', pa.string()),
+    ('data_source_url', pa.string()),
+    ('citation_title', pa.string()),
+    ('citation_abstract', pa.string()),
+    ('citation_authors', STRING_LIST),
+    ('citation_journal_name', pa.string()),
+    ('citation_journal_volume', pa.string()),
+    ('citation_pub_year', pa.int16()),
+    ('citation_keywords', STRING_LIST),
+    ('fulltext_filename', pa.string()),
+    ('fulltext_exclude_reasons', STRING_LIST),
+    ]
+
+SCREENINGS_SCHEMA_FIELDS = [
+    ('stage', pa.string()),
+    ('study_id', pa.int64()),
+    ('user_id', pa.int32()),
+    ('status', pa.string()),
+    ('exclude_reasons', STRING_LIST),
+    ('created_at', pa.timestamp('us')),
+    ]
+
+# arrow types and value converters for data extraction form field types
+EXTRACTION_FIELD_TYPES = {
+    'bool': (pa.bool_(), bool),
+    'date': (pa.timestamp('us'), lambda value: arrow.get(value).naive),
+    'int': (pa.int64(), int),
+    'float': (pa.float64(), float),
+    'str': (pa.string(), str),
+    'select_one': (pa.string(), str),
+    'select_many': (STRING_LIST, lambda value: [str(val) for val in value]),
+    'country': (pa.string(), str),
+    }
+
+
+def get_export_filepath(exports_dir, review_id, table, fmt):
+    return os.path.join(
+        exports_dir, str(review_id), '{}{}'.format(table, EXPORT_FORMATS[fmt]))
+
+
+def get_studies_schema(extraction_fields):
+    """
+    Args:
+        extraction_fields (List[Tuple[str, str]]): (label, field_type) pairs
+            of the review's data extraction form
+
+    Returns:
+        :class:`pyarrow.Schema`
+    """
+    fields = [pa.field(name, type_) for name, type_ in STUDIES_SCHEMA_FIELDS]
+    fields.extend(
+        pa.field(label, EXTRACTION_FIELD_TYPES.get(field_type, (pa.string(), str))[0])
+        for label, field_type in extraction_fields)
+    return pa.schema(fields)
+
+
+def get_screenings_schema():
+    return pa.schema([pa.field(name, type_) for name, type_ in SCREENINGS_SCHEMA_FIELDS])
+
+
+def get_extracted_values(extracted_items, extraction_fields):
+    """
+    Convert a study's extracted items into values typed according to their
+    field types, in the same order as ``extraction_fields``; missing or
+    un-convertible values are null.
+    """
+    extracted_data = {item['label']: item['value'] for item in extracted_items or []}
+    values = []
+    for label, field_type in extraction_fields:
+        value = extracted_data.get(label)
+        if value is not None:
+            convert = EXTRACTION_FIELD_TYPES.get(field_type, (None, str))[1]
+            try:
+                value = convert(value)
+            except (TypeError, ValueError, arrow.parser.ParserError):
+                value = None
+        values.append(value)
+    return values
+
+
+class ColumnarWriter(object):
+    """
+    Write record batches with a fixed schema to a Parquet or Arrow IPC file,
+    via a temp file that's atomically moved into place on :meth:`close`,
+    so a previous export stays downloadable until the new one is finished.
+
+    Args:
+        filepath (str)
+        schema (:class:`pyarrow.Schema`)
+        fmt (str): one of :obj:`EXPORT_FORMATS`
+    """
+
+    def __init__(self, filepath, schema, fmt):
+        self.filepath = filepath
+        self.schema = schema
+        self.fmt = fmt
+        dirname = os.path.dirname(filepath)
+        os.makedirs(dirname, exist_ok=True)
+        fd, self.tmp_filepath = tempfile.mkstemp(dir=dirname, suffix=EXPORT_FORMATS[fmt])
+        os.close(fd)
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(self.tmp_filepath, schema)
+            self._sink = None
+        else:
+            self._sink = pa.OSFile(self.tmp_filepath, 'wb')
+            self._writer = pa.RecordBatchFileWriter(self._sink, schema)
+        self.n_rows = 0
+
+    def write_rows(self, rows):
+        """
+        Args:
+            rows (List[Sequence]): values for each row, in schema column order
+        """
+        if not rows:
+            return
+        arrays = [pa.array([row[i] for row in rows], type=field.type)
+                  for i, field in enumerate(self.schema)]
+        batch = pa.RecordBatch.from_arrays(arrays, self.schema.names)
+        if self.fmt == 'parquet':
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+        self.n_rows += len(rows)
+
+    def close(self):
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+        os.replace(self.tmp_filepath, self.filepath)
+
+    def discard(self):
+        try:
+            self._writer.close()
+            if self._sink is not None:
+                self._sink.close()
+        finally:
+            os.remove(self.tmp_filepath)
@@ -11,10 +11,16 @@ DEDUPE_FIELDS = [
     {'field': 'doi', 'type': 'String', 'has missing': True}]
 
 CITATION_RANKING_MODEL_FNAME = 'citation_ranking_model_review_{review_id}.pkl'
+CITATION_FEATURE_MATRIX_FNAME = 'citation_feature_matrix.npy'
+CITATION_FEATURE_IDS_FNAME = 'citation_feature_ids.npy'
 
 IMPORT_STATUSES = ('not_screened', 'included', 'excluded')
+IMPORT_JOB_STATUSES = ('pending', 'processing', 'finished', 'failed')
 REVIEW_STATUSES = ('active', 'frozen')
 DEDUPE_STATUSES = ('not_duplicate', 'duplicate')
 SCREENING_STATUSES = ('not_screened', 'screened_once', 'conflict', 'included', 'excluded')
 USER_SCREENING_STATUSES = ('pending', 'awaiting_coscreener', 'conflict', 'included', 'excluded')
 EXTRACTION_STATUSES = ('not_started', 'started', 'finished')
+
+# maximum number of screenings that may be submitted in a single bulk request
+MAX_BULK_SCREENINGS = 1000
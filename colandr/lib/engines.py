@@ -0,0 +1,115 @@
+"""
+Per-process registry of pooled SQLAlchemy engines, for code that runs outside
+of flask's request handling -- i.e. celery tasks -- and so can't rely on the
+``db.engine`` managed by flask-sqlalchemy.
+
+Engines are created once per (forked) worker process in celery's
+``worker_process_init`` hook, then re-used by every task run in that process,
+so tasks no longer pay for a fresh connection pool (and leak it) per invocation.
+"""
+import collections
+import os
+import threading
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+
+
+_ENGINES = {}
+_CHECKOUT_COUNTS = collections.Counter()
+_LOCK = threading.Lock()
+
+
+def _create_engine(server_side_cursors):
+    config = current_app.config
+    kwargs = {
+        'server_side_cursors': server_side_cursors,
+        'echo': False,
+        'pool_size': config['TASKS_DB_POOL_SIZE'],
+        'max_overflow': config['TASKS_DB_MAX_OVERFLOW'],
+        'pool_recycle': config['TASKS_DB_POOL_RECYCLE'],
+        }
+    try:
+        engine = create_engine(
+            config['SQLALCHEMY_DATABASE_URI'],
+            use_batch_mode=True, pool_pre_ping=True, **kwargs)
+    except TypeError:  # these kwargs only available in sqlalchemy>=1.2.0
+        engine = create_engine(config['SQLALCHEMY_DATABASE_URI'], **kwargs)
+
+    @event.listens_for(engine, 'checkout')
+    def count_checkout(dbapi_conn, conn_record, conn_proxy):
+        _CHECKOUT_COUNTS[server_side_cursors] += 1
+
+    return engine
+
+
+def init_engines():
+    """
+    Create this process's engines from scratch. Should be called in each newly
+    forked worker process, since pooled connections can't be shared across
+    processes; engines inherited from the parent are dropped, *not* disposed,
+    so the parent's connections aren't closed out from under it.
+    """
+    with _LOCK:
+        _ENGINES.clear()
+        _CHECKOUT_COUNTS.clear()
+        for server_side_cursors in (False, True):
+            _ENGINES[(os.getpid(), server_side_cursors)] = _create_engine(
+                server_side_cursors)
+
+
+def get_engine(server_side_cursors=False):
+    """
+    Get this process's shared, pooled engine, optionally one whose connections
+    use server-side cursors to stream large results.
+
+    Args:
+        server_side_cursors (bool)
+
+    Returns:
+        :class:`sqlalchemy.engine.Engine`
+    """
+    key = (os.getpid(), server_side_cursors)
+    engine = _ENGINES.get(key)
+    if engine is None:
+        with _LOCK:
+            engine = _ENGINES.get(key)
+            if engine is None:
+                engine = _create_engine(server_side_cursors)
+                _ENGINES[key] = engine
+    return engine
+
+
+def dispose_engines():
+    """Close all pooled connections held by this process's engines."""
+    with _LOCK:
+        for (pid, _), engine in _ENGINES.items():
+            if pid == os.getpid():
+                engine.dispose()
+        _ENGINES.clear()
+
+
+def get_pool_stats():
+    """
+    Get connection pool metrics for this process's engines, for monitoring.
+
+    Returns:
+        List[dict]: one per engine, with its current pool size, numbers of
+            checked-in and checked-out connections, overflow, and total
+            number of checkouts since the engine was created
+    """
+    stats = []
+    for (pid, server_side_cursors), engine in sorted(_ENGINES.items()):
+        if pid != os.getpid():
+            continue
+        pool = engine.pool
+        stats.append({
+            'pid': pid,
+            'server_side_cursors': server_side_cursors,
+            'pool_size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'num_checkouts': _CHECKOUT_COUNTS[server_side_cursors],
+            })
+    return stats
@@ -0,0 +1,186 @@
+"""
+Per-review, on-disk cache of citation text content vectors, stored alongside
+a review's ranking model as a 2D float32 ``.npy`` matrix plus a sorted 1D ``.npy``
+index of the corresponding citation ids. Readers memory-map both files, so that
+e.g. scoring every citation in a review is a single matrix-vector product with
+no db round-trip for the vectors.
+
+The cache is only ever written in full (never partially), via temp files that
+are atomically moved into place; if it's missing or invalid, callers should
+fall back to the db and (re-)build it.
+"""
+import os
+import shutil
+import tempfile
+
+from flask import current_app
+import numpy as np
+
+from .constants import CITATION_FEATURE_IDS_FNAME, CITATION_FEATURE_MATRIX_FNAME
+from .vectors import VECTOR_DTYPE
+
+
+IDS_DTYPE = np.int64
+
+
+def _get_filepaths(review_id):
+    dirname = os.path.join(current_app.config['RANKING_MODELS_DIR'], str(review_id))
+    return (os.path.join(dirname, CITATION_FEATURE_IDS_FNAME),
+            os.path.join(dirname, CITATION_FEATURE_MATRIX_FNAME))
+
+
+def load_feature_matrix(review_id):
+    """
+    Args:
+        review_id (int)
+
+    Returns:
+        Tuple[:class:`np.ndarray`, :class:`np.ndarray`]: read-only, memory-mapped
+            (sorted) citation ids and the corresponding feature matrix, or
+            ``(None, None)`` if no valid cache exists for this review
+    """
+    ids_filepath, matrix_filepath = _get_filepaths(review_id)
+    try:
+        ids = np.load(ids_filepath, mmap_mode='r')
+        X = np.load(matrix_filepath, mmap_mode='r')
+    except (IOError, ValueError):
+        return None, None
+    if ids.ndim != 1 or X.ndim != 2 or ids.shape[0] != X.shape[0]:
+        return None, None
+    return ids, X
+
+
+def get_feature_matrix_rows(ids, citation_ids):
+    """
+    Get the row indexes in a cached feature matrix for ``citation_ids``,
+    skipping any that aren't in the cache.
+
+    Args:
+        ids (:class:`np.ndarray`): sorted citation ids, as loaded by
+            :func:`load_feature_matrix`
+        citation_ids (Sequence[int])
+
+    Returns:
+        Tuple[:class:`np.ndarray`, :class:`np.ndarray`]: the citation ids found
+            in the cache, and their corresponding row indexes
+    """
+    citation_ids = np.asarray(citation_ids, dtype=IDS_DTYPE)
+    if ids.shape[0] == 0 or citation_ids.shape[0] == 0:
+        return (np.empty(0, dtype=IDS_DTYPE), np.empty(0, dtype=np.intp))
+    rows = np.searchsorted(ids, citation_ids)
+    rows[rows == ids.shape[0]] = 0
+    found = ids[rows] == citation_ids
+    return citation_ids[found], rows[found]
+
+
+def invalidate_feature_matrix(review_id):
+    """Delete the cached feature matrix for a review, e.g. after citations are deleted."""
+    for filepath in _get_filepaths(review_id):
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+
+
+def _copy_npy_data(filepath, fileobj):
+    with open(filepath, mode='rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            np.lib.format.read_array_header_1_0(f)
+        else:
+            np.lib.format.read_array_header_2_0(f)
+        shutil.copyfileobj(f, fileobj)
+
+
+class FeatureMatrixWriter(object):
+    """
+    Stream (ids, vectors) chunks for a review into temp files on disk, then
+    :meth:`commit` them as the review's full feature matrix cache or, if
+    ``append`` is True, as new rows appended to the existing cache.
+    Ids must be written in strictly increasing order.
+
+    Args:
+        review_id (int)
+        append (bool)
+    """
+
+    def __init__(self, review_id, append=False):
+        self.review_id = review_id
+        self.append = append
+        self.ids_filepath, self.matrix_filepath = _get_filepaths(review_id)
+        self.dirname = os.path.dirname(self.matrix_filepath)
+        os.makedirs(self.dirname, exist_ok=True)
+        self._ids_tmp = tempfile.TemporaryFile(dir=self.dirname)
+        self._matrix_tmp = tempfile.TemporaryFile(dir=self.dirname)
+        self.n_rows = 0
+        self.n_cols = None
+        self.first_id = None
+        self.last_id = None
+
+    def write(self, ids, vectors):
+        """
+        Args:
+            ids (Sequence[int])
+            vectors (:class:`np.ndarray`): 2D, with one row per id
+        """
+        ids = np.asarray(ids, dtype=IDS_DTYPE)
+        vectors = np.asarray(vectors, dtype=VECTOR_DTYPE)
+        if ids.shape[0] == 0:
+            return
+        if self.n_cols is None:
+            self.n_cols = vectors.shape[1]
+            self.first_id = ids[0]
+        self.last_id = ids[-1]
+        self._ids_tmp.write(ids.tobytes())
+        self._matrix_tmp.write(vectors.tobytes())
+        self.n_rows += ids.shape[0]
+
+    def commit(self):
+        """
+        Move the written rows into place as this review's feature matrix cache.
+
+        Returns:
+            bool: False if the rows couldn't be appended to the existing cache
+                -- because it has since been invalidated, its vectors are
+                a different size, or the new ids don't come after the old ones --
+                in which case the cache is invalidated and must be rebuilt
+        """
+        if self.append is True:
+            old_ids, old_X = load_feature_matrix(self.review_id)
+            if old_ids is None:
+                self.discard()
+                return False
+            if self.n_rows == 0:
+                self.discard()
+                return True
+            if ((old_ids.shape[0] > 0 and old_ids[-1] >= self.first_id) or
+                    (old_X.shape[0] > 0 and old_X.shape[1] != self.n_cols)):
+                self.discard()
+                invalidate_feature_matrix(self.review_id)
+                return False
+            n_old_rows = old_ids.shape[0]
+            del old_ids, old_X
+        else:
+            n_old_rows = 0
+        n_cols = self.n_cols or 0
+        for tmp, filepath, dtype, shape in (
+                (self._matrix_tmp, self.matrix_filepath, VECTOR_DTYPE, (n_old_rows + self.n_rows, n_cols)),
+                (self._ids_tmp, self.ids_filepath, IDS_DTYPE, (n_old_rows + self.n_rows,))):
+            fd, tmp_filepath = tempfile.mkstemp(dir=self.dirname, suffix='.npy')
+            with os.fdopen(fd, mode='wb') as f:
+                np.lib.format.write_array_header_1_0(
+                    f, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                        'fortran_order': False,
+                        'shape': shape})
+                if n_old_rows > 0:
+                    _copy_npy_data(filepath, f)
+                tmp.seek(0)
+                shutil.copyfileobj(tmp, f)
+            os.replace(tmp_filepath, filepath)
+        self.discard()
+        return True
+
+    def discard(self):
+        """Throw away all written rows."""
+        self._ids_tmp.close()
+        self._matrix_tmp.close()
@@ -0,0 +1,83 @@
+"""
+Split long documents -- i.e. fulltexts, which may run to dozens of pages --
+into passages small enough to be tokenized and vectorized in batches, and
+pool the passages' vectors back into a single vector for the whole document.
+"""
+import re
+
+import numpy as np
+
+
+RE_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+RE_WHITESPACE = re.compile(r'\s+')
+
+
+def _iter_paragraphs(text):
+    start = 0
+    for match in RE_PARAGRAPH_BREAK.finditer(text):
+        yield start, text[start:match.start()]
+        start = match.end()
+    yield start, text[start:]
+
+
+def _split_long_paragraph(start, paragraph, max_chars):
+    # break at the last whitespace before the limit, if any, else mid-word
+    while len(paragraph) > max_chars:
+        matches = list(RE_WHITESPACE.finditer(paragraph, 0, max_chars + 1))
+        end = matches[-1].start() if matches and matches[-1].start() > 0 else max_chars
+        yield start, paragraph[:end]
+        rest = paragraph[end:]
+        stripped = rest.lstrip()
+        start += end + len(rest) - len(stripped)
+        paragraph = stripped
+    if paragraph:
+        yield start, paragraph
+
+
+def iter_passages(text, max_chars=2000):
+    """
+    Split ``text`` into passages of at most ``max_chars`` characters, keeping
+    consecutive paragraphs together where they fit and breaking overlong
+    paragraphs at whitespace.
+
+    Args:
+        text (str)
+        max_chars (int)
+
+    Yields:
+        Tuple[int, int, str]: next passage's start and end character offsets
+            in ``text``, and the passage itself, i.e. ``text[start:end]``
+    """
+    passage_start = passage_end = None
+    for start, paragraph in _iter_paragraphs(text):
+        if not paragraph.strip():
+            continue
+        for start, piece in _split_long_paragraph(start, paragraph, max_chars):
+            end = start + len(piece)
+            if passage_start is not None and end - passage_start <= max_chars:
+                passage_end = end
+                continue
+            if passage_start is not None:
+                yield passage_start, passage_end, text[passage_start:passage_end]
+            passage_start, passage_end = start, end
+    if passage_start is not None:
+        yield passage_start, passage_end, text[passage_start:passage_end]
+
+
+def pool_vectors(vectors, weights):
+    """
+    Pool passages' vectors into one document vector by their weighted average;
+    when weighted by passages' numbers of tokens, this equals the average of all
+    the document's token vectors, i.e. what spacy's ``Doc.vector`` would give.
+
+    Args:
+        vectors (Sequence[:class:`np.ndarray`])
+        weights (Sequence[int])
+
+    Returns:
+        :class:`np.ndarray`, or None if there are no vectors with positive weight
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(vectors) == 0 or weights.sum() <= 0:
+        return None
+    return np.average(np.vstack(vectors), axis=0, weights=weights).astype(np.float32)
@@ -0,0 +1,26 @@
+import textacy
+
+
+_SPACY_LANGS = {}
+
+
+def get_spacy_lang(lang, **kwargs):
+    """
+    Get a spacy pipeline for ``lang``, loading it only the first time it's
+    requested in this process and re-using it thereafter, since loading
+    a model (and its word vectors) takes several seconds and lots of memory.
+
+    Args:
+        lang (str): language code, e.g. 'en'
+        **kwargs: passed as-is into :func:`textacy.load_spacy`, e.g. ``parser=False``
+
+    Returns:
+        :class:`spacy.<lang>.<Language>`
+
+    Raises:
+        RuntimeError: if spacy data for ``lang`` can't be loaded
+    """
+    key = (lang, tuple(sorted(kwargs.items())))
+    if key not in _SPACY_LANGS:
+        _SPACY_LANGS[key] = textacy.load_spacy(lang, **kwargs)
+    return _SPACY_LANGS[key]
@@ -1,6 +1,8 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import io
+import itertools
+import multiprocessing
 import re
 
 import bibtexparser
@@ -14,6 +16,7 @@ from .. import utils
 logger = utils.get_console_logger(__name__)
 
 WHITESPACE_RE = re.compile(r'\s+')
+ENTRY_START_RE = re.compile(r'@\w+\s*[{(]')
 _MONTH_MAP = {'spr': 3, 'sum': 6, 'fal': 9, 'win': 12,
               'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
               'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
@@ -88,6 +91,15 @@ VALUE_SANITIZERS = {
     }
 
 
+def _get_bibtex_parser():
+    # parsers accumulate entries across calls, so a new one is needed per chunk
+    parser = BibTexParser()
+    parser.ignore_nonstandard_types = False
+    parser.homogenize_fields = False
+    parser.customization = _sanitize_record
+    return parser
+
+
 class BibTexFile(object):
     """
     Args:
@@ -98,52 +110,148 @@ class BibTexFile(object):
         value_sanitizers (dict or bool): mapping of default BibTex tags to functions
             that sanitize their associated values; if None (default), default sanitizers
             will be used; if False, no sanitization will be performed
+        chunk_size (int): max number of entries parsed at a time, which bounds
+            memory use when parsing very large files; if None, the whole file
+            is parsed at once
     """
 
-    def __init__(self, path_or_stream, key_map=None, value_sanitizers=None):
+    def __init__(self, path_or_stream, key_map=None, value_sanitizers=None,
+                 chunk_size=500):
         if isinstance(path_or_stream, io.TextIOBase):  # io.StringIO):
             self.path = None
             self.stream = path_or_stream
         elif isinstance(path_or_stream, io.IOBase):  # (io.BytesIO, io.BufferedRandom)):
             self.path = None
             self.stream = io.TextIOWrapper(path_or_stream)  # , encoding='utf8')
+        # this checks for a `tempfile.SpooledTemporaryFile` coming
+        # from a `werkzeug.datastructures.FileStorage` stream
+        elif hasattr(path_or_stream, '_file') and isinstance(path_or_stream._file, io.IOBase):
+            self.path = None
+            self.stream = io.TextIOWrapper(path_or_stream._file)
         elif isinstance(path_or_stream, (bytes, str)):
             self.path = path_or_stream
             self.stream = None
-        self.parser = BibTexParser()
-        self.parser.ignore_nonstandard_types = False
-        self.parser.homogenize_fields = False
-        self.parser.customization = _sanitize_record
         self.key_map = (key_map if key_map is not None
                         else KEY_MAP)
         self.value_sanitizers = (value_sanitizers if value_sanitizers is not None
                                  else VALUE_SANITIZERS)
+        self.chunk_size = chunk_size
 
-    def parse(self):
+    def parse(self, n_jobs=1):
         """
+        Args:
+            n_jobs (int): number of processes among which to split parsing and
+                sanitization of chunks of entries; note that daemonic processes,
+                e.g. celery workers, can't do this!
+
         Yields:
             dict: next parsed citation record
         """
         if not self.stream:
             self.stream = io.open(self.path, mode='rt')
         with self.stream as f:
-            parsed_data = bibtexparser.load(f, parser=self.parser)
-        for record in parsed_data.entries:
-            if self.value_sanitizers:
-                for key, value in record.items():
-                    try:
-                        record[key] = self.value_sanitizers[key](value)
-                    except KeyError:
-                        pass
-                    except TypeError:
-                        logger.exception(
-                            'value sanitization error: key=%s, value=%s',
-                            key, value)
-            if self.key_map:
-                for key, rekey in self.key_map.items():
-                    try:
-                        record[rekey] = record.pop(key)
-                    except KeyError:
-                        pass
-
-            yield record
+            chunks = self._iter_entry_chunks(f)
+            if n_jobs > 1:
+                records = self._parse_chunks_parallel(chunks, n_jobs)
+            else:
+                records = itertools.chain.from_iterable(
+                    self._parse_chunk(chunk) for chunk in chunks)
+            for record in records:
+                yield record
+
+    def _parse_chunk(self, chunk):
+        """
+        Returns:
+            List[dict]: parsed and sanitized records in ``chunk`` of bibtex text
+        """
+        parsed_data = bibtexparser.loads(chunk, parser=_get_bibtex_parser())
+        return [self._sanitize_values(record) for record in parsed_data.entries]
+
+    def _parse_chunks_parallel(self, chunks, n_jobs):
+        """
+        Yields:
+            dict: next parsed citation record, in file order
+        """
+        # functions can't be pickled and sent to other processes,
+        # so only the default value sanitizers (or none) are supported
+        if self.value_sanitizers is VALUE_SANITIZERS:
+            value_sanitizers = None
+        elif not self.value_sanitizers:
+            value_sanitizers = False
+        else:
+            raise ValueError(
+                'custom value sanitizers are not supported for n_jobs > 1')
+        chunks = ((chunk, self.key_map, value_sanitizers) for chunk in chunks)
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            # only hand out a few chunks per process at a time, so that
+            # the whole file never has to be held in memory at once
+            for batch in utils.iter_chunks(chunks, 2 * n_jobs):
+                for records in pool.map(_parse_entries_chunk, batch):
+                    for record in records:
+                        yield record
+        finally:
+            pool.terminate()
+
+    def _iter_entry_chunks(self, f):
+        """
+        Split a bibtex file into chunks of text, each one containing (at most)
+        ``chunk_size`` whole entries, so only one chunk is held in memory at once.
+        Since chunks are parsed independently, all ``@string`` macros defined
+        in previous chunks are prepended to each chunk.
+
+        An entry starts on a line beginning with e.g. "@article{" -- at column 0,
+        and only outside of any braces, so that an "@" at the start of a line
+        within a field's value (say, an email address in an abstract) can't
+        split an entry in two.
+        """
+        if self.chunk_size is None:
+            yield f.read()
+            return
+        macros = []
+        lines = []
+        n_entries = 0
+        in_macro = False
+        brace_depth = 0
+        for line in f:
+            if brace_depth == 0 and ENTRY_START_RE.match(line):
+                if n_entries == self.chunk_size:
+                    yield ''.join(lines)
+                    lines = list(macros)
+                    n_entries = 0
+                n_entries += 1
+                in_macro = line[1:7].lower() == 'string'
+            # don't let an unbalanced closing brace swallow all later entries
+            brace_depth = max(brace_depth + line.count('{') - line.count('}'), 0)
+            if in_macro is True:
+                macros.append(line)
+            lines.append(line)
+        if lines:
+            yield ''.join(lines)
+
+    def _sanitize_values(self, record):
+        if self.value_sanitizers:
+            for key, value in record.items():
+                try:
+                    record[key] = self.value_sanitizers[key](value)
+                except KeyError:
+                    pass
+                except TypeError:
+                    logger.exception(
+                        'value sanitization error: key=%s, value=%s',
+                        key, value)
+        if self.key_map:
+            for key, rekey in self.key_map.items():
+                try:
+                    record[rekey] = record.pop(key)
+                except KeyError:
+                    pass
+        return record
+
+
+def _parse_entries_chunk(args):
+    """Parse a chunk of bibtex text in a separate process; see :meth:`BibTexFile.parse`."""
+    chunk, key_map, value_sanitizers = args
+    bibtex_file = BibTexFile(
+        io.StringIO(), key_map=key_map, value_sanitizers=value_sanitizers)
+    return bibtex_file._parse_chunk(chunk)
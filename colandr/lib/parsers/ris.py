@@ -1,7 +1,12 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import datetime
+import functools
 import io
+import itertools
+import multiprocessing
 import re
+import string
 
 from dateutil.parser import parse as parse_date
 
@@ -200,6 +205,8 @@ TITLE_TAGS = ('T1', 'T2', 'T3', 'ST', 'TT')
 
 TAGv1_RE = re.compile(r'^(?P<tag>[A-Z][A-Z0-9])(  - )')
 TAGv2_RE = re.compile(r'^(?P<tag>[A-Z][A-Z0-9])( )|^(?P<endtag>E[FR])(\s?$)')
+ENDTAGv2_RE = re.compile(r'\s?$')
+YMD_DATE_RE = re.compile(r'^([0-9]{4})([/-])([0-9]{1,2})\2([0-9]{1,2})/?$')
 ISSN_RE = re.compile(r'^[\w-]+$|(?<=\b)([\w-]+)(?=\s\(ISSN\))', flags=re.IGNORECASE)
 
 _MONTH_MAP = {'spr': 3, 'sum': 6, 'fal': 9, 'win': 12,
@@ -207,6 +214,35 @@ _MONTH_MAP = {'spr': 3, 'sum': 6, 'fal': 9, 'win': 12,
               'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
 
 
+# map every possible tag-plus-separator line prefix to its tag, so that lines
+# can be split with a slice and a dict lookup rather than a regex match;
+# these are exact equivalents of the ``tag`` groups in TAGv1_RE and TAGv2_RE
+_TAGS = [first + second
+         for first in string.ascii_uppercase
+         for second in string.ascii_uppercase + string.digits]
+TAGv1_PREFIXES = {tag + '  - ': tag for tag in _TAGS}
+TAGv2_PREFIXES = {tag + ' ': tag for tag in _TAGS}
+TAG_PREFIXES = {TAGv1_RE: (TAGv1_PREFIXES, 6), TAGv2_RE: (TAGv2_PREFIXES, 3)}
+ENDTAGSv2 = ('EF', 'ER')
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date(value):
+    """
+    Parse a date string just like :func:`dateutil.parser.parse`, but skip its
+    (slow) general-purpose parsing for the common YYYY/MM/DD or YYYY-MM-DD formats,
+    and for dates already seen, which tend to repeat a lot within a file.
+    """
+    match = YMD_DATE_RE.match(value)
+    if match:
+        try:
+            return datetime.datetime(
+                int(match.group(1)), int(match.group(3)), int(match.group(4)))
+        except ValueError:
+            pass
+    return parse_date(value)
+
+
 def _sanitize_pd_tag(value):
     try:
         return int(value)
@@ -239,7 +275,7 @@ def _check_isbn_value(value):
 
 
 VALUE_SANITIZERS = {
-    'DA': lambda x: parse_date(x).strftime('%Y-%m-%d'),
+    'DA': lambda x: _parse_date(x).strftime('%Y-%m-%d'),
     'PD': _sanitize_pd_tag,
     'M3': lambda x: x.lower(),
     'PM': int,
@@ -247,8 +283,8 @@ VALUE_SANITIZERS = {
     'SN': _sanitize_sn_tag,
     'TC': int,
     'TY': lambda x: REFERENCE_TYPES_MAPPING.get(x, x),
-    'Y1': lambda x: parse_date('-'.join(item if item else '01' for item in x[:-1].split('/'))),
-    'Y2': lambda x: min(parse_date(val) for val in x.split(' through ')),
+    'Y1': lambda x: _parse_date('-'.join(item if item else '01' for item in x[:-1].split('/'))),
+    'Y2': lambda x: min(_parse_date(val) for val in x.split(' through ')),
     }
 
 
@@ -303,9 +339,17 @@ class RisFile(object):
         self.prev_line_len = None
         self.prev_tag = None
         self.record = {}
+        self._tag_infos = {}
 
-    def parse(self):
+    def parse(self, n_jobs=1, chunk_size=1000):
         """
+        Args:
+            n_jobs (int): number of processes among which to split parsing; if
+                greater than 1, the file is split into chunks of ``chunk_size``
+                records on ``ER`` tag boundaries, which are parsed in parallel.
+                Note that daemonic processes, e.g. celery workers, can't do this!
+            chunk_size (int)
+
         Yields:
             dict: next complete citation record
 
@@ -315,191 +359,321 @@ class RisFile(object):
         if not self.stream:
             self.stream = io.open(self.path, mode='rt')
         with self.stream as f:
-            for i, line in enumerate(f):
+            if n_jobs > 1:
+                records = self._parse_chunks_parallel(f, n_jobs, chunk_size)
+            else:
+                records = self._parse_lines(f)
+            for record in records:
+                yield record
+
+    def _parse_lines(self, lines):
+        """
+        Yields:
+            dict: next complete citation record
+        """
+        lines = enumerate(lines)
+
+        for i, line in lines:
+
+            # get rid of byte order mark (BOM)
+            if i == 0 and line.startswith('\ufeff'):
+                line = line[1:]
+
+            # skip empty lines
+            if not line or line.isspace():
+                continue
+
+            # automatically detect regex needed for this RIS file
+            if TAGv1_RE.match(line):
+                self.tag_re = TAGv1_RE
+            elif TAGv2_RE.match(line):
+                self.tag_re = TAGv2_RE
+            else:
+                msg = 'tags in file {}, lineno {}, line {} not formatted as expected!'.format(self.path, i, line)
+                logger.error(msg)
+                raise IOError(msg)
+            lines = itertools.chain([(i, line)], lines)
+            break
+
+        # NOTE: this is the hot loop when importing citations, so lines are
+        # split via lookups of their prefixes rather than regex matches, and
+        # state is kept in local variables rather than on the instance
+        tag_prefixes, prefix_len = TAG_PREFIXES.get(self.tag_re, ({}, 0))
+        check_endtags = self.tag_re is TAGv2_RE
+        key_map = self.key_map
+        value_sanitizers = self.value_sanitizers or {}
+        add_tag_value = self._add_tag_value
+        # (key, is multi-value?, sanitizer) for all tags that need no special handling
+        regular_tags = {
+            tag: (key, tag in MULTI_TAGS, value_sanitizers.get(tag))
+            for tag, key in (key_map or {}).items()
+            if tag not in IGNORE_TAGS and tag not in START_TAGS and tag != END_TAG}
+        record = self.record
+        in_record = self.in_record
+        prev_tag = self.prev_tag
+        prev_line_len = self.prev_line_len or 0
+
+        for i, line in lines:
+
+            tag = tag_prefixes.get(line[:prefix_len])
+
+            # fast path for the vast majority of lines: known tag, in a record
+            if in_record is True and tag in regular_tags:
+                key, is_multi, sanitizer = regular_tags[tag]
+                value = line[prefix_len:].strip()
+                if sanitizer is not None:
+                    try:
+                        value = sanitizer(value)
+                    except Exception:
+                        logger.exception(
+                            'value sanitization error: key=%s, value=%s',
+                            key, value)
+                if is_multi:
+                    values = record.get(key)
+                    if values is None:
+                        record[key] = [value]
+                    else:
+                        values.append(value)
+                else:
+                    if key in record:
+                        logger.error('duplicate key error: key=%s, value=%s', key, value)
+                    record[key] = value
+                prev_tag, prev_line_len = tag, len(line)
+                continue
 
-                # get rid of byte order mark (BOM)
-                if i == 0 and line.startswith('\ufeff'):
-                    line = line[1:]
+            start_idx = prefix_len
+            if tag is None:
 
                 # skip empty lines
-                if not line.strip():
+                if not line or line.isspace():
                     continue
 
-                # automatically detect regex needed for this RIS file
-                if self.tag_re is None:
-                    if TAGv1_RE.match(line):
-                        self.tag_re = TAGv1_RE
-                    elif TAGv2_RE.match(line):
-                        self.tag_re = TAGv2_RE
-                    else:
-                        msg = 'tags in file {}, lineno {}, line {} not formatted as expected!'.format(self.path, i, line)
-                        logger.error(msg)
-                        raise IOError(msg)
+                if check_endtags and line[:2] in ENDTAGSv2:
+                    match = ENDTAGv2_RE.match(line, 2)
+                    if match:
+                        tag = line[:2]
+                        start_idx = match.end()
+
+            # lines starts with a tag
+            if tag is not None:
 
-                tag_match = self.tag_re.match(line)
-                # lines starts with a tag
-                if tag_match:
-
-                    tag = tag_match.group('tag') or tag_match.group('endtag')
-
-                    if tag in IGNORE_TAGS:
-                        self._stash_prev_info(tag, len(line))
-                        continue
-
-                    elif tag == END_TAG:
-                        if self.in_record is False:
-                            msg = 'found end tag, but not in a record!\nline: {} {}'.format(i, line.strip())
-                            logger.error(msg)
-                            raise IOError(msg)
-
-                        self._sort_multi_values()
-                        self._sanitize_record()
-                        yield self.record  # record is complete! spit it out here
-
-                        self.in_record = False
-                        self.record = {}
-                        self._stash_prev_info(tag, len(line))
-                        continue
-
-                    elif tag in START_TAGS:
-                        if self.in_record is True:
-                            msg = 'found start tag, but already in a record!\nline: {} {}'.format(i, line.strip())
-                            logger.error(msg)
-                            raise IOError(msg)
-                        self.in_record = True
-                        self._add_tag_line(tag, line, tag_match.end())
-                        self._stash_prev_info(tag, len(line))
-                        continue
-
-                    if self.in_record is False:
-                        msg = 'start/end tag mismatch!\nline: {} {}'.format(i, line.strip())
+                if tag in IGNORE_TAGS:
+                    prev_tag, prev_line_len = tag, len(line)
+                    continue
+
+                elif tag == END_TAG:
+                    if in_record is False:
+                        msg = 'found end tag, but not in a record!\nline: {} {}'.format(i, line.strip())
                         logger.error(msg)
                         raise IOError(msg)
 
-                    if self.key_map and tag in self.key_map:
-                        self._add_tag_line(tag, line, tag_match.end())
-                        self._stash_prev_info(tag, len(line))
-                        continue
+                    self.record = record
+                    self._sort_multi_values()
+                    self._sanitize_record()
+                    yield record  # record is complete! spit it out here
 
-                    # multi-value tag line happens to start with a tag-compliant string
-                    if self.prev_tag in MULTI_TAGS:
-                        self._add_tag_line(self.prev_tag, line, 0)
-                        continue
-
-                    # no idea what this is, but might as well save it
-                    logger.debug('unknown tag: tag=%s, line=%s "%s"', tag, i, line.strip())
-                    self.record[tag] = line[tag_match.end():].strip()
-                    self._stash_prev_info(tag, len(line))
+                    in_record = False
+                    record = self.record = {}
+                    prev_tag, prev_line_len = tag, len(line)
                     continue
 
-                # subsequent line belonging to a multi-value tag
-                elif self.prev_tag in MULTI_TAGS:
-                    self._add_tag_line(self.prev_tag, line, 0)
+                elif tag in START_TAGS:
+                    if in_record is True:
+                        msg = 'found start tag, but already in a record!\nline: {} {}'.format(i, line.strip())
+                        logger.error(msg)
+                        raise IOError(msg)
+                    in_record = True
+                    add_tag_value(record, tag, line[start_idx:].strip())
+                    prev_tag, prev_line_len = tag, len(line)
                     continue
 
-                # single-value tag split across multiple lines, ugh
-                elif line.startswith('   ') or self.prev_line_len > 70:
-                    key = (self.key_map.get(self.prev_tag, self.prev_tag) if self.key_map
-                           else self.prev_tag)
-                    self.record[key] += ' ' + line.strip()
+                if in_record is False:
+                    msg = 'start/end tag mismatch!\nline: {} {}'.format(i, line.strip())
+                    logger.error(msg)
+                    raise IOError(msg)
 
-                # HACK: badly formed SN tags that also contain an isbn
-                elif self.prev_tag == 'SN'and _check_isbn_value(line.strip()) is True:
-                    self.record['BN'] = line.strip()
+                if key_map and tag in key_map:
+                    add_tag_value(record, tag, line[start_idx:].strip())
+                    prev_tag, prev_line_len = tag, len(line)
+                    continue
 
-                else:
-                    logger.error(
-                        'bad line: prev_tag=%s, line=%s "%s"',
-                        self.prev_tag, i, line.strip())
+                # multi-value tag line happens to start with a tag-compliant string
+                if prev_tag in MULTI_TAGS:
+                    add_tag_value(record, prev_tag, line.strip())
+                    continue
 
-    def _add_tag_line(self, tag, line, start_idx):
+                # no idea what this is, but might as well save it
+                logger.debug('unknown tag: tag=%s, line=%s "%s"', tag, i, line.strip())
+                record[tag] = line[start_idx:].strip()
+                prev_tag, prev_line_len = tag, len(line)
+                continue
+
+            # subsequent line belonging to a multi-value tag
+            elif prev_tag in MULTI_TAGS:
+                add_tag_value(record, prev_tag, line.strip())
+                continue
+
+            # single-value tag split across multiple lines, ugh
+            elif line.startswith('   ') or prev_line_len > 70:
+                key = (key_map.get(prev_tag, prev_tag) if key_map
+                       else prev_tag)
+                record[key] += ' ' + line.strip()
+
+            # HACK: badly formed SN tags that also contain an isbn
+            elif prev_tag == 'SN' and _check_isbn_value(line.strip()) is True:
+                record['BN'] = line.strip()
+
+            else:
+                logger.error(
+                    'bad line: prev_tag=%s, line=%s "%s"',
+                    prev_tag, i, line.strip())
+
+        self.record = record
+        self.in_record = in_record
+        self.prev_tag = prev_tag
+        self.prev_line_len = prev_line_len
+
+    def _parse_chunks_parallel(self, f, n_jobs, chunk_size):
+        """
+        Yields:
+            dict: next complete citation record, in file order
+        """
+        # functions can't be pickled and sent to other processes,
+        # so only the default value sanitizers (or none) are supported
+        if self.value_sanitizers is VALUE_SANITIZERS:
+            value_sanitizers = None
+        elif not self.value_sanitizers:
+            value_sanitizers = False
+        else:
+            raise ValueError(
+                'custom value sanitizers are not supported for n_jobs > 1')
+        chunks = (
+            (chunk, self.key_map, value_sanitizers)
+            for chunk in self._iter_record_chunks(f, chunk_size))
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            # only hand out a few chunks per process at a time, so that
+            # the whole file never has to be held in memory at once
+            for batch in utils.iter_chunks(chunks, 2 * n_jobs):
+                for records in pool.map(_parse_records_chunk, batch):
+                    for record in records:
+                        yield record
+        finally:
+            pool.terminate()
+
+    def _iter_record_chunks(self, f, chunk_size):
+        """
+        Yields:
+            str: next chunk of the file's text, containing (up to)
+                ``chunk_size`` complete records
+        """
+        tag_re = None
+        lines = []
+        n_records = 0
+        for line in f:
+            lines.append(line)
+            if tag_re is None:
+                line = line.lstrip('\ufeff')
+                if not line or line.isspace():
+                    continue
+                tag_re = TAGv1_RE if TAGv1_RE.match(line) else TAGv2_RE
+            if line.startswith('ER') and tag_re.match(line):
+                n_records += 1
+                if n_records == chunk_size:
+                    yield ''.join(lines)
+                    lines = []
+                    n_records = 0
+        if lines:
+            yield ''.join(lines)
+
+    def _add_tag_value(self, record, tag, value):
         """
         Args:
+            record (dict)
             tag (str)
-            line (str)
-            start_idx (int)
+            value (str)
         """
-        key = (self.key_map[tag] if self.key_map
-               else tag)
-        value = line[start_idx:].strip()
-        # try to sanitize value, but don't sweat failure
         try:
-            value = self.value_sanitizers[tag](value)
+            key, is_multi, sanitizer = self._tag_infos[tag]
         except KeyError:
-            pass
-        except Exception:
-            logger.exception(
-                'value sanitization error: key=%s, value=%s',
-                key, value)
-        # for multi-value tags, append to a list
-        if tag in MULTI_TAGS:
+            key = (self.key_map[tag] if self.key_map
+                   else tag)
+            is_multi = tag in MULTI_TAGS
+            sanitizer = (self.value_sanitizers or {}).get(tag)
+            self._tag_infos[tag] = (key, is_multi, sanitizer)
+        # try to sanitize value, but don't sweat failure
+        if sanitizer is not None:
             try:
-                self.record[key].append(value)
-            except KeyError:
-                self.record[key] = [value]
+                value = sanitizer(value)
+            except Exception:
+                logger.exception(
+                    'value sanitization error: key=%s, value=%s',
+                    key, value)
+        # for multi-value tags, append to a list
+        if is_multi:
+            values = record.get(key)
+            if values is None:
+                record[key] = [value]
+            else:
+                values.append(value)
         # otherwise, add key:value to record
         else:
-            if key in self.record:
+            if key in record:
                 logger.error('duplicate key error: key=%s, value=%s', key, value)
-            self.record[key] = value
-
-    def _stash_prev_info(self, tag, line_len):
-        """
-        Args:
-            tag (str)
-            line_len (int)
-        """
-        self.prev_tag = tag
-        self.prev_line_len = line_len
+            record[key] = value
 
     def _sort_multi_values(self):
+        record = self.record
         for key in self.multi_keys:
+            if key not in record:
+                continue
             try:
-                self.record[key] = tuple(sorted(self.record[key]))
-            except KeyError:
-                pass
+                record[key] = tuple(sorted(record[key]))
             except Exception:
                 logger.exception(
                     'multi-value sort error: key=%s, value=%s',
-                    key, self.record[key])
+                    key, record[key])
 
     def _sanitize_record(self):
+        record = self.record
         for key in self.split_keys:
+            if key not in record:
+                continue
             try:
-                self.record[key] = tuple(sorted(self.record[key].split('; ')))
-            except KeyError:
-                pass
+                record[key] = tuple(sorted(record[key].split('; ')))
             except Exception:
                 logger.exception(
                     'record sanitization error: key=%s, value=%s',
-                    key, self.record[key])
-        if not self.record.get('journal_name'):
+                    key, record[key])
+        if not record.get('journal_name'):
             for key in self.journal_keys:
-                try:
-                    self.record['journal_name'] = self.record[key]
+                if key in record:
+                    record['journal_name'] = record[key]
                     break
-                except KeyError:
-                    continue
-        if not self.record.get('authors'):
+        if not record.get('authors'):
             for key in self.author_keys:
-                try:
-                    self.record['authors'] = self.record[key]
+                if key in record:
+                    record['authors'] = record[key]
                     break
-                except KeyError:
-                    continue
-        if not self.record.get('title'):
+        if not record.get('title'):
             for key in self.title_keys:
-                try:
-                    self.record['title'] = self.record[key]
+                if key in record:
+                    record['title'] = record[key]
                     break
-                except KeyError:
-                    continue
-        if not self.record.get('pub_year'):
+        if not record.get('pub_year'):
             y1_key = self.key_map.get('Y1', 'Y1')
             try:
-                if self.record.get(y1_key):
-                    self.record['pub_year'] = self.record[y1_key].year
+                if record.get(y1_key):
+                    record['pub_year'] = record[y1_key].year
             except Exception:
                 logger.exception(
                     'record sanitization error: key=%s, value=%s',
-                    y1_key, self.record[y1_key])
+                    y1_key, record[y1_key])
+
+
+def _parse_records_chunk(args):
+    """Parse a chunk of RIS text in a separate process; see :meth:`RisFile.parse`."""
+    text, key_map, value_sanitizers = args
+    ris_file = RisFile(
+        io.StringIO(text), key_map=key_map, value_sanitizers=value_sanitizers)
+    return list(ris_file.parse())
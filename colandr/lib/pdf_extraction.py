@@ -0,0 +1,90 @@
+"""
+Extract the text content of uploaded fulltext files, with a choice of backends
+for PDFs: a long-running pdfestrian extraction server (see
+``pdfestrian/bin/extractTextServer.sh``), reached over a local socket;
+the pure-python ``pdfminer.six`` package, if installed; or -- as before --
+a fresh pdfestrian JVM launched per file, which is slow, but needs no setup.
+"""
+import io
+import os
+import socket
+import subprocess
+
+from textacy.preprocess import fix_bad_unicode
+
+
+def extract_pdf_text_server(filepath, address=('localhost', 8081), timeout=120, **kwargs):
+    """
+    Get the text of PDF ``filepath`` from a running pdfestrian extraction
+    server listening on ``address``.
+    """
+    with socket.create_connection(address, timeout=timeout) as sock:
+        sock.sendall((os.path.abspath(filepath) + '\n').encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def extract_pdf_text_pdfminer(filepath, **kwargs):
+    """Get the text of PDF ``filepath`` using ``pdfminer.six``."""
+    try:
+        from pdfminer.high_level import extract_text
+    except ImportError:
+        raise ImportError(
+            'the "pdfminer" pdf extraction backend requires pdfminer.six; '
+            'install it via `pip install pdfminer.six`')
+    return extract_text(filepath).encode('utf-8')
+
+
+def extract_pdf_text_subprocess(filepath, app_dir='', timeout=120, **kwargs):
+    """
+    Get the text of PDF ``filepath`` by running pdfestrian's ``extractText.sh``
+    script, which starts a new JVM for every file.
+    """
+    extract_text_script = os.path.join(app_dir, 'pdfestrian/bin/extractText.sh')
+    return subprocess.check_output(
+        [extract_text_script, '--filename', filepath],
+        stderr=subprocess.STDOUT, timeout=timeout)
+
+
+PDF_EXTRACTION_BACKENDS = {
+    'server': extract_pdf_text_server,
+    'pdfminer': extract_pdf_text_pdfminer,
+    'subprocess': extract_pdf_text_subprocess,
+    }
+
+
+def extract_text_content(filepath, backend='server', **kwargs):
+    """
+    Extract the text content of fulltext file ``filepath``, either .txt or .pdf.
+
+    Args:
+        filepath (str)
+        backend (str): key in :obj:`PDF_EXTRACTION_BACKENDS` of the function
+            used to extract text from PDFs
+        **kwargs: passed on to the PDF extraction function; see
+            :func:`extract_pdf_text_server` and :func:`extract_pdf_text_subprocess`
+
+    Returns:
+        str
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == '.txt':
+        with io.open(filepath, mode='rb') as f:
+            text_content = f.read()
+    elif ext == '.pdf':
+        try:
+            extract_pdf_text = PDF_EXTRACTION_BACKENDS[backend]
+        except KeyError:
+            raise ValueError(
+                'pdf extraction backend "{}" invalid; valid options: {}'.format(
+                    backend, sorted(PDF_EXTRACTION_BACKENDS.keys())))
+        text_content = extract_pdf_text(filepath, **kwargs)
+    else:
+        raise ValueError('fulltext file type "{}" invalid'.format(ext))
+    return fix_bad_unicode(text_content.decode(errors='ignore'))
@@ -0,0 +1,122 @@
+"""
+In-process LRU cache of reviews' trained citation ranking models, so that they
+aren't unpickled from disk every time they're used. Cached models are validated
+against their file's modification time and size on every lookup, so a newly
+(re-)trained model is picked up as soon as it's been saved.
+"""
+import collections
+import os
+import threading
+import time
+
+from flask import current_app
+from sklearn.externals import joblib
+
+from .constants import CITATION_RANKING_MODEL_FNAME
+
+
+def get_ranking_model_filepath(review_id):
+    fname = CITATION_RANKING_MODEL_FNAME.format(review_id=review_id)
+    return os.path.join(
+        current_app.config['RANKING_MODELS_DIR'], str(review_id), fname)
+
+
+def save_ranking_model(review_id, clf):
+    """
+    Save a trained citation ranking model to disk, atomically, so that
+    readers never load a partially-written file.
+    """
+    filepath = get_ranking_model_filepath(review_id)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    tmp_filepath = '{}.{}.tmp'.format(filepath, os.getpid())
+    joblib.dump(clf, tmp_filepath)
+    os.replace(tmp_filepath, filepath)
+    return filepath
+
+
+class RankingModelCache(object):
+    """
+    Args:
+        maxsize (int): maximum number of models to hold in memory at once;
+            the least-recently used model is evicted to make room for new ones
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._models = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+
+    def get(self, review_id):
+        """
+        Get the trained citation ranking model for ``review_id``, loading it
+        from disk only if it's not already cached or has since changed.
+
+        Returns:
+            :class:`sklearn.linear_model.SGDClassifier` or None: if no model
+                has been trained for this review
+        """
+        filepath = get_ranking_model_filepath(review_id)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            self.invalidate(review_id)
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._models.get(review_id)
+            if cached is not None and cached[0] == stamp:
+                self._models.move_to_end(review_id)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        start_time = time.time()
+        clf = joblib.load(filepath)
+        with self._lock:
+            self.load_time += time.time() - start_time
+            self._models[review_id] = (stamp, clf)
+            self._models.move_to_end(review_id)
+            while len(self._models) > self.maxsize:
+                self._models.popitem(last=False)
+        return clf
+
+    def invalidate(self, review_id):
+        with self._lock:
+            self._models.pop(review_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: numbers of cache hits and misses (i.e. loads from disk),
+                total time spent loading models, and current/max cache size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'load_time': self.load_time,
+                'size': len(self._models),
+                'maxsize': self.maxsize,
+                }
+
+
+_RANKING_MODEL_CACHE = RankingModelCache()
+
+
+def get_ranking_model(review_id):
+    """
+    Get the trained citation ranking model for ``review_id`` from this process's
+    shared cache of models; see :class:`RankingModelCache`.
+    """
+    _RANKING_MODEL_CACHE.maxsize = current_app.config['RANKING_MODEL_CACHE_SIZE']
+    return _RANKING_MODEL_CACHE.get(review_id)
+
+
+def get_ranking_model_cache_stats():
+    return _RANKING_MODEL_CACHE.get_stats()
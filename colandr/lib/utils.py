@@ -1,4 +1,5 @@
 import io
+import itertools
 import logging
 import logging.handlers
 import os
@@ -123,3 +124,16 @@ def make_record_immutable(record):
         elif isinstance(val, set):
             record[key] = frozenset(val)
     return record
+
+
+def iter_chunks(iterable, chunk_size):
+    """
+    Yield successive lists of (up to) ``chunk_size`` items from ``iterable``,
+    without ever holding more than one chunk's worth of items in memory.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,69 @@
+"""
+Compact storage for dense text content vectors: each vector is stored in the db
+as the raw bytes of a float32 array, rather than as a postgres array of float8s,
+which halves storage and lets us skip the round-trip through lists of floats.
+"""
+import numpy as np
+from sqlalchemy import types
+
+
+VECTOR_DTYPE = np.float32
+
+
+def encode_vector(vector):
+    """
+    Args:
+        vector (:class:`np.ndarray` or List[float])
+
+    Returns:
+        bytes
+    """
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def decode_vector(blob):
+    """
+    Args:
+        blob (bytes): as returned by :func:`encode_vector`
+
+    Returns:
+        :class:`np.ndarray`: 1D, read-only view onto ``blob``
+    """
+    return np.frombuffer(blob, dtype=VECTOR_DTYPE)
+
+
+def decode_vectors(blobs):
+    """
+    Stack many encoded vectors into a single 2D feature matrix, with just one
+    copy of the underlying data.
+
+    Args:
+        blobs (Sequence[bytes]): as returned by :func:`encode_vector`, all of
+            which encode vectors of the same length
+
+    Returns:
+        :class:`np.ndarray`: 2D, with shape (len(blobs), vector length)
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return np.empty((0, 0), dtype=VECTOR_DTYPE)
+    return np.frombuffer(b''.join(blobs), dtype=VECTOR_DTYPE).reshape(len(blobs), -1)
+
+
+class Float32Vector(types.TypeDecorator):
+    """
+    A ``bytea`` column holding a float32 vector, which is bound from and
+    returned as a 1D :class:`np.ndarray`. NULL means "not yet vectorized".
+    """
+
+    impl = types.LargeBinary
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_vector(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode_vector(value)
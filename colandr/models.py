@@ -7,10 +7,13 @@ from itsdangerous import (TimedJSONWebSignatureSerializer as Serializer,
 from sqlalchemy import event, false, text, ForeignKey
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import object_session
 
 from . import db
-from .api.utils import assign_status, get_boolean_search_query
+from .api.utils import get_boolean_search_query
+from .lib.cache import invalidate_prisma_counts_on_commit
 from .lib.utils import get_console_logger
+from .lib.vectors import Float32Vector
 
 
 logger = get_console_logger(__name__)
@@ -302,6 +305,10 @@ class Import(db.Model):
     created_at = db.Column(
         db.TIMESTAMP(timezone=False), nullable=False,
         server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
+    last_updated = db.Column(
+        db.TIMESTAMP(timezone=False), nullable=False,
+        server_default=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"),
+        server_onupdate=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))
     review_id = db.Column(
         db.Integer, ForeignKey('reviews.id', ondelete='CASCADE'),
         nullable=False, index=True)
@@ -317,6 +324,12 @@ class Import(db.Model):
         db.Integer, nullable=False)
     status = db.Column(
         db.Unicode(length=20), server_default='not_screened')
+    import_status = db.Column(
+        db.Unicode(length=20), nullable=False, server_default='finished')
+    num_records_failed = db.Column(
+        db.Integer, nullable=False, server_default='0')
+    original_filename = db.Column(
+        db.Unicode, nullable=True)
 
     # relationships
     review = db.relationship(
@@ -330,13 +343,15 @@ class Import(db.Model):
         lazy='subquery')  # TODO: change to 'selectin' when sqlalchemy>=1.2.0 ?
 
     def __init__(self, review_id, user_id, data_source_id, record_type, num_records,
-                 status=None):
+                 status=None, import_status='finished', original_filename=None):
         self.review_id = review_id
         self.user_id = user_id
         self.data_source_id = data_source_id
         self.record_type = record_type
         self.num_records = num_records
         self.status = status
+        self.import_status = import_status
+        self.original_filename = original_filename
 
     def __repr__(self):
         return "<Import(id={})>".format(self.id)
@@ -345,6 +360,12 @@ class Import(db.Model):
 class Study(db.Model):
 
     __tablename__ = 'studies'
+    __table_args__ = (
+        db.Index('studies_review_id_citation_status_idx',
+                 'review_id', 'citation_status'),
+        db.Index('studies_review_id_fulltext_status_idx',
+                 'review_id', 'fulltext_status'),
+        )
 
     # columns
     id = db.Column(
@@ -380,6 +401,8 @@ class Study(db.Model):
     data_extraction_status = db.Column(
         db.Unicode(length=20), server_default='not_started',
         nullable=False, index=True)
+    relevance_score = db.Column(
+        db.Float, nullable=True)
 
     # relationships
     user = db.relationship(
@@ -413,6 +436,56 @@ class Study(db.Model):
         return "<Study(id={})>".format(self.id)
 
 
+# match the orders by which studies are listed by relevance, so that
+# each page of results is read straight off an index, without a sort
+db.Index('studies_review_id_relevance_score_desc_idx',
+         Study.review_id, Study.relevance_score.desc().nullslast(), Study.id.desc())
+db.Index('studies_review_id_relevance_score_asc_idx',
+         Study.review_id, Study.relevance_score.asc().nullslast(), Study.id.desc())
+
+
+class ReviewStatusCount(db.Model):
+    """
+    Change in the number of a review's studies with a given status at a given
+    stage, i.e. ``citation_screening`` (all studies), ``fulltext_screening``
+    (studies whose citations were included), or ``data_extraction`` (studies
+    whose fulltexts were included); the sum of all of a review's changes for a
+    stage and status is its count. Changes are appended transactionally by a
+    trigger on ``studies``, so they stay correct for bulk and core writes that
+    bypass the ORM (see :data:`REVIEW_STATUS_COUNTS_DDL`), and are compacted
+    into one row per count by :func:`tasks.reconcile_review_status_counts`.
+    """
+
+    __tablename__ = 'review_status_counts'
+    __table_args__ = (
+        db.Index('review_status_counts_review_id_stage_status_idx',
+                 'review_id', 'stage', 'status'),
+        )
+
+    # columns
+    id = db.Column(
+        db.BigInteger, primary_key=True, autoincrement=True)
+    review_id = db.Column(
+        db.Integer, ForeignKey('reviews.id', ondelete='CASCADE'),
+        nullable=False)
+    stage = db.Column(
+        db.Unicode(length=20), nullable=False)
+    status = db.Column(
+        db.Unicode(length=20), nullable=False)
+    count = db.Column(
+        db.Integer, server_default='0', nullable=False)
+
+    def __init__(self, review_id, stage, status, count=0):
+        self.review_id = review_id
+        self.stage = stage
+        self.status = status
+        self.count = count
+
+    def __repr__(self):
+        return "<ReviewStatusCount(review_id={}, stage={}, status={})>".format(
+            self.review_id, self.stage, self.status)
+
+
 class Dedupe(db.Model):
 
     __tablename__ = 'dedupes'
@@ -501,7 +574,7 @@ class Citation(db.Model):
     other_fields = db.Column(
         postgresql.JSONB(none_as_null=True), server_default='{}')
     text_content_vector_rep = db.Column(
-        postgresql.ARRAY(db.Float), server_default='{}')
+        Float32Vector, nullable=True)
 
     @hybrid_property
     def text_content(self):
@@ -585,10 +658,12 @@ class Fulltext(db.Model):
         db.Unicode(length=30), unique=True, nullable=True)
     original_filename = db.Column(
         db.Unicode, unique=False, nullable=True)
+    content_hash = db.Column(
+        db.Unicode(length=64), nullable=True, index=True)
     text_content = db.Column(
         db.UnicodeText, nullable=True)
     text_content_vector_rep = db.Column(
-        postgresql.ARRAY(db.Float), server_default='{}')
+        Float32Vector, nullable=True)
 
     @hybrid_property
     def exclude_reasons(self):
@@ -617,6 +692,46 @@ class Fulltext(db.Model):
         return "<Fulltext(study_id={})>".format(self.id)
 
 
+class FulltextPassage(db.Model):
+
+    __tablename__ = 'fulltext_passages'
+    __table_args__ = (
+        db.UniqueConstraint('fulltext_id', 'passage_index',
+                            name='fulltext_passage_index_uc'),
+        )
+
+    # columns
+    id = db.Column(
+        db.BigInteger, primary_key=True, autoincrement=True)
+    fulltext_id = db.Column(
+        db.BigInteger, ForeignKey('fulltexts.id', ondelete='CASCADE'),
+        nullable=False, index=True)
+    review_id = db.Column(
+        db.Integer, ForeignKey('reviews.id', ondelete='CASCADE'),
+        nullable=False, index=True)
+    passage_index = db.Column(
+        db.Integer, nullable=False)
+    start_offset = db.Column(
+        db.Integer, nullable=False)
+    end_offset = db.Column(
+        db.Integer, nullable=False)
+    text_content_vector_rep = db.Column(
+        Float32Vector, nullable=False)
+
+    def __init__(self, fulltext_id, review_id, passage_index,
+                 start_offset, end_offset, text_content_vector_rep):
+        self.fulltext_id = fulltext_id
+        self.review_id = review_id
+        self.passage_index = passage_index
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.text_content_vector_rep = text_content_vector_rep
+
+    def __repr__(self):
+        return "<FulltextPassage(fulltext_id={}, passage_index={})>".format(
+            self.fulltext_id, self.passage_index)
+
+
 class CitationScreening(db.Model):
 
     __tablename__ = 'citation_screenings'
@@ -892,88 +1007,259 @@ class DedupeSmallerCoverage(db.Model):
 
 # EVENTS
 
+REVIEW_STATUS_COUNTS_DDL = [
+    # triggers fire once per statement, not per row: all of a statement's changed
+    # studies -- old versions at -1, new versions at +1 -- are expanded into their
+    # (stage, status) pairs and net deltas summed, then appended as new rows; no
+    # existing row is ever updated, so concurrent writers -- e.g. a long-running
+    # import and screeners of the same review -- never wait on each other
+    """
+    CREATE OR REPLACE FUNCTION update_review_status_counts()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        _changes TEXT;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            _changes := 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, 1 AS delta FROM new_studies';
+        ELSIF TG_OP = 'DELETE' THEN
+            _changes := 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, -1 AS delta FROM old_studies';
+        ELSE
+            _changes := 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, -1 AS delta FROM old_studies'
+                        || ' UNION ALL '
+                        || 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, 1 AS delta FROM new_studies';
+        END IF;
+        EXECUTE format($sql$
+            INSERT INTO review_status_counts (review_id, stage, status, count)
+            SELECT changes.review_id, stages.stage, stages.status, SUM(changes.delta)
+            FROM (%s) AS changes,
+                LATERAL (VALUES
+                    ('citation_screening', changes.citation_status),
+                    ('fulltext_screening', CASE WHEN changes.citation_status = 'included' THEN changes.fulltext_status END),
+                    ('data_extraction', CASE WHEN changes.citation_status = 'included' AND changes.fulltext_status = 'included' THEN changes.data_extraction_status END)
+                    ) AS stages (stage, status)
+            WHERE stages.status IS NOT NULL
+                -- a review being deleted takes all of its counts with it
+                AND EXISTS (SELECT 1 FROM reviews WHERE reviews.id = changes.review_id)
+            GROUP BY changes.review_id, stages.stage, stages.status
+            HAVING SUM(changes.delta) <> 0
+            $sql$, _changes);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    # statement-level triggers with transition tables can't share events or
+    # list columns, so there's one per event; updates that change none of the
+    # counted columns net out to no deltas
+    """
+    DROP TRIGGER IF EXISTS studies_review_status_counts_insert_trigger ON studies;
+    CREATE TRIGGER studies_review_status_counts_insert_trigger
+    AFTER INSERT ON studies
+    REFERENCING NEW TABLE AS new_studies
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE update_review_status_counts();
+    """,
+    """
+    DROP TRIGGER IF EXISTS studies_review_status_counts_update_trigger ON studies;
+    CREATE TRIGGER studies_review_status_counts_update_trigger
+    AFTER UPDATE ON studies
+    REFERENCING OLD TABLE AS old_studies NEW TABLE AS new_studies
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE update_review_status_counts();
+    """,
+    """
+    DROP TRIGGER IF EXISTS studies_review_status_counts_delete_trigger ON studies;
+    CREATE TRIGGER studies_review_status_counts_delete_trigger
+    AFTER DELETE ON studies
+    REFERENCING OLD TABLE AS old_studies
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE update_review_status_counts();
+    """,
+    ]
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_review_status_counts_trigger(target, connection, **kwargs):
+    for ddl in REVIEW_STATUS_COUNTS_DDL:
+        connection.execute(text(ddl))
+
+
+# compute studies' new screening statuses from all of their screenings -- with the
+# same semantics as :func:`api.utils.assign_status` -- then update the studies,
+# insert or delete their dependent fulltext / data extraction records, and adjust
+# the review's included/excluded counters, all in a single statement
+UPDATE_SCREENING_STATUSES_SQL = """
+    WITH screenings AS (
+        SELECT
+            studies.id AS study_id,
+            COUNT(screenings.id) AS num_screenings,
+            COALESCE(BOOL_AND(screenings.status = 'excluded'), FALSE) AS all_excluded,
+            COALESCE(BOOL_AND(screenings.status = 'included'), FALSE) AS all_included
+        FROM studies
+        LEFT JOIN {screenings_table} AS screenings
+            ON screenings.{study_id_column} = studies.id
+        WHERE studies.id = ANY(:study_ids) AND studies.review_id = :review_id
+        GROUP BY studies.id
+    ),
+    statuses AS (
+        SELECT
+            screenings.study_id,
+            studies.{status_column} AS old_status,
+            (CASE
+                 WHEN num_screenings = 0 THEN 'not_screened'
+                 WHEN num_screenings < reviews.{num_screeners_column} THEN
+                     (CASE WHEN num_screenings = 1 THEN 'screened_once' ELSE 'screened_twice' END)
+                 WHEN all_excluded THEN 'excluded'
+                 WHEN all_included THEN 'included'
+                 ELSE 'conflict'
+             END)::VARCHAR AS status
+        FROM screenings
+        JOIN studies ON studies.id = screenings.study_id
+        JOIN reviews ON reviews.id = :review_id
+    ),
+    updated_studies AS (
+        UPDATE studies
+        SET {status_column} = statuses.status
+        FROM statuses
+        WHERE studies.id = statuses.study_id AND statuses.old_status != statuses.status
+        RETURNING studies.id
+    ),
+    inserted_dependents AS (
+        INSERT INTO {dependent_table} (id, review_id)
+        SELECT study_id, :review_id
+        FROM statuses
+        WHERE status = 'included'
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    ),
+    deleted_dependents AS (
+        DELETE FROM {dependent_table}
+        USING statuses
+        WHERE {dependent_table}.id = statuses.study_id AND statuses.status != 'included'
+        RETURNING {dependent_table}.id
+    ),
+    deltas AS (
+        SELECT
+            COALESCE(SUM((status = 'included')::INT - (old_status = 'included')::INT), 0) AS num_included,
+            COALESCE(SUM((status = 'excluded')::INT - (old_status = 'excluded')::INT), 0) AS num_excluded
+        FROM statuses
+    ),
+    updated_review AS (
+        UPDATE reviews
+        SET
+            {num_included_column} = {num_included_column} + deltas.num_included,
+            {num_excluded_column} = {num_excluded_column} + deltas.num_excluded
+        FROM deltas
+        WHERE reviews.id = :review_id AND (deltas.num_included != 0 OR deltas.num_excluded != 0)
+        RETURNING reviews.{num_included_column} AS num_included,
+                  reviews.{num_excluded_column} AS num_excluded,
+                  deltas.num_included AS num_included_delta
+    )
+    SELECT
+        statuses.study_id,
+        statuses.old_status,
+        statuses.status,
+        statuses.study_id IN (SELECT id FROM inserted_dependents) AS dependent_inserted,
+        statuses.study_id IN (SELECT id FROM deleted_dependents) AS dependent_deleted,
+        updated_review.num_included,
+        updated_review.num_excluded,
+        updated_review.num_included_delta
+    FROM statuses
+    LEFT JOIN updated_review ON TRUE
+    ORDER BY statuses.study_id
+    """
+
+UPDATE_SCREENING_STATUSES = {
+    'citation': text(UPDATE_SCREENING_STATUSES_SQL.format(
+        screenings_table='citation_screenings',
+        study_id_column='citation_id',
+        num_screeners_column='num_citation_screening_reviewers',
+        status_column='citation_status',
+        dependent_table='fulltexts',
+        num_included_column='num_citations_included',
+        num_excluded_column='num_citations_excluded')),
+    'fulltext': text(UPDATE_SCREENING_STATUSES_SQL.format(
+        screenings_table='fulltext_screenings',
+        study_id_column='fulltext_id',
+        num_screeners_column='num_fulltext_screening_reviewers',
+        status_column='fulltext_status',
+        dependent_table='data_extractions',
+        num_included_column='num_fulltexts_included',
+        num_excluded_column='num_fulltexts_excluded')),
+    }
+
+
+def update_screening_statuses(connection, stage, review_id, study_ids):
+    """
+    Recompute the ``stage`` screening statuses of studies ``study_ids`` in
+    review ``review_id`` from their screenings, and update everything that
+    depends on them; ids not in the review are ignored.
+
+    Args:
+        connection (:class:`sqlalchemy.engine.Connection`)
+        stage (str): either 'citation' or 'fulltext'
+        review_id (int)
+        study_ids (List[int])
+
+    Returns:
+        List[:class:`sqlalchemy.engine.RowProxy`]: one per study, with its old
+            and new status, whether its dependent record was inserted or deleted,
+            and -- if they changed -- the review's new included/excluded counts
+            and the change in its included count
+    """
+    return connection.execute(
+        UPDATE_SCREENING_STATUSES[stage],
+        review_id=review_id, study_ids=list(study_ids)).fetchall()
+
+
+def enqueue_citation_screening_tasks(review_id, n_included, n_excluded, n_included_delta):
+    """
+    (Re-)compute a review's suggested keyterms and (re-)train its citation
+    ranking model as its number of included citations crosses the relevant
+    thresholds, given enough included AND excluded citations.
+    """
+    n_included_before = n_included - n_included_delta
+    # if at least 25 citations have been included AND excluded
+    # and only once every 25 included citations
+    # (re-)compute the suggested keyterms
+    if (n_included >= 25 and n_excluded >= 25 and
+            n_included // 25 != n_included_before // 25):
+        from .tasks import suggest_keyterms
+        sample_size = min(n_included, n_excluded)
+        suggest_keyterms.apply_async(args=[review_id, sample_size])
+    # if at least 100 citations have been included AND excluded
+    # and only once ever 50 included citations
+    # (re-)train a citation ranking model
+    if (n_included >= 100 and n_excluded >= 100 and
+            n_included // 50 != n_included_before // 50):
+        from .tasks import train_citation_ranking_model
+        train_citation_ranking_model.apply_async(args=[review_id])
+
+
 @event.listens_for(CitationScreening, 'after_insert')
 @event.listens_for(CitationScreening, 'after_delete')
 @event.listens_for(CitationScreening, 'after_update')
 def update_citation_status(mapper, connection, target):
     citation_id = target.citation_id
     review_id = target.review_id
-    citation = target.citation
-    # get the current (soon to be *old*) citation_status of the study
-    with connection.begin():
-        old_status = connection.execute(
-            db.select([Study.citation_status]).where(Study.id == citation_id)
-            ).fetchone()[0]
-    # now compute the new status, and update the study accordingly
-    status = assign_status(
-        [cs.status for cs in db.session.query(CitationScreening).filter_by(citation_id=citation_id)],
-        citation.review.num_citation_screening_reviewers)
-    with connection.begin():
-        connection.execute(
-            db.update(Study).where(Study.id == citation_id).values(citation_status=status))
-    logger.info('%s => %s with status = %s', target, citation, status)
-    # we may have to insert or delete a corresponding fulltext record
-    with connection.begin():
-        fulltext = connection.execute(
-            db.select([Fulltext]).where(Fulltext.id == citation_id)).first()
-    fulltext_inserted_or_deleted = False
-    if status == 'included' and fulltext is None:
-        with connection.begin():
-            connection.execute(
-                db.insert(Fulltext).values(id=citation_id, review_id=review_id))
+    invalidate_prisma_counts_on_commit(object_session(target), review_id)
+    results = update_screening_statuses(connection, 'citation', review_id, [citation_id])
+    if not results:  # study has already been deleted
+        return
+    result = results[0]
+    logger.info('%s => <Citation(id=%s)> with status = %s', target, citation_id, result.status)
+    # we may have inserted or deleted a corresponding fulltext record
+    if result.dependent_inserted is True:
         logger.info('inserted <Fulltext(study_id=%s)>', citation_id)
-        fulltext_inserted_or_deleted = True
-    elif status != 'included' and fulltext is not None:
-        with connection.begin():
-            connection.execute(
-                db.delete(Fulltext).where(Fulltext.id == citation_id))
+    elif result.dependent_deleted is True:
         logger.info('deleted <Fulltext(study_id=%s)>', citation_id)
-        fulltext_inserted_or_deleted = True
     # we may have to update our counts for review num_citations_included / excluded
-    if old_status != status:
-        if old_status == 'included':  # decrement num_citations_included
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_citations_included=Review.num_citations_included - 1))
-        elif status == 'included':  # increment num_citations_included
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_citations_included=Review.num_citations_included + 1))
-        elif old_status == 'excluded':  # decrement num_citations_excluded
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_citations_included=Review.num_citations_excluded - 1))
-        elif status == 'excluded':  # increment num_citations_excluded
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_citations_included=Review.num_citations_excluded + 1))
-    if fulltext_inserted_or_deleted is True:
-        with connection.begin():
-            status_counts = connection.execute(
-                db.select([Review.num_citations_included, Review.num_citations_excluded])\
-                .where(Review.id == review_id)
-                ).fetchone()
-            logger.info(
-                '<Review(id=%s)> citation_status counts = %s',
-                review_id, status_counts)
-            n_included, n_excluded = status_counts
-            # if at least 25 citations have been included AND excluded
-            # and only once every 25 included citations
-            # (re-)compute the suggested keyterms
-            if n_included >= 25 and n_excluded >= 25 and n_included % 25 == 0:
-                from .tasks import suggest_keyterms
-                sample_size = min(n_included, n_excluded)
-                suggest_keyterms.apply_async(args=[review_id, sample_size])
-            # if at least 100 citations have been included AND excluded
-            # and only once ever 50 included citations
-            # (re-)train a citation ranking model
-            if n_included >= 100 and n_excluded >= 100 and n_included % 50 == 0:
-                from .tasks import train_citation_ranking_model
-                train_citation_ranking_model.apply_async(args=[review_id])
+    if result.num_included is not None:
+        logger.info(
+            '<Review(id=%s)> citation_status counts = %s',
+            review_id, (result.num_included, result.num_excluded))
+        enqueue_citation_screening_tasks(
+            review_id, result.num_included, result.num_excluded,
+            result.num_included_delta)
 
 
 @event.listens_for(FulltextScreening, 'after_insert')
@@ -982,72 +1268,18 @@ def update_citation_status(mapper, connection, target):
 def update_fulltext_status(mapper, connection, target):
     fulltext_id = target.fulltext_id
     review_id = target.review_id
-    fulltext = target.fulltext
-    # get the current (soon to be *old*) citation_status of the study
-    with connection.begin():
-        old_status = connection.execute(
-            db.select([Study.fulltext_status]).where(Study.id == fulltext_id)
-            ).fetchone()[0]
-    # now compute the new status, and update the study accordingly
-    status = assign_status(
-        [fs.status for fs in db.session.query(FulltextScreening).filter_by(fulltext_id=fulltext_id)],
-        fulltext.review.num_fulltext_screening_reviewers)
-    with connection.begin():
-        connection.execute(
-            db.update(Study).where(Study.id == fulltext_id).values(fulltext_status=status))
-    logger.info('%s => %s with status = %s', target, fulltext, status)
-    # we may have to insert or delete a corresponding data extraction record
-    with connection.begin():
-        data_extraction = connection.execute(
-            db.select([DataExtraction]).where(DataExtraction.id == fulltext_id)).first()
-    data_extraction_inserted_or_deleted = False
-    if status == 'included' and data_extraction is None:
-        with connection.begin():
-            connection.execute(
-                db.insert(DataExtraction).values(
-                    id=fulltext_id, review_id=review_id))
+    invalidate_prisma_counts_on_commit(object_session(target), review_id)
+    results = update_screening_statuses(connection, 'fulltext', review_id, [fulltext_id])
+    if not results:  # study has already been deleted
+        return
+    result = results[0]
+    logger.info(
+        '%s => <Fulltext(id=%s)> with status = %s', target, fulltext_id, result.status)
+    # we may have inserted or deleted a corresponding data extraction record
+    if result.dependent_inserted is True:
         logger.info('inserted <DataExtraction(study_id=%s)>', fulltext_id)
-        data_extraction_inserted_or_deleted = True
-    elif status != 'included' and data_extraction is None:
-        with connection.begin():
-            connection.execute(
-                db.delete(DataExtraction).where(
-                    DataExtraction.id == fulltext_id))
+    elif result.dependent_deleted is True:
         logger.info('deleted <DataExtraction(study_id=%s)>', fulltext_id)
-        data_extraction_inserted_or_deleted = True
-    # we may have to update our counts for review num_fulltexts_included / excluded
-    if old_status != status:
-        if old_status == 'included':  # decrement num_fulltexts_included
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_fulltexts_included=Review.num_fulltexts_included - 1))
-        elif status == 'included':  # increment num_fulltexts_included
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_fulltexts_included=Review.num_fulltexts_included + 1))
-        elif old_status == 'excluded':  # decrement num_fulltexts_excluded
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_fulltexts_included=Review.num_fulltexts_included - 1))
-        elif status == 'excluded':  # increment num_fulltexts_excluded
-            with connection.begin():
-                connection.execute(
-                    db.update(Review).where(Review.id == review_id)\
-                        .values(num_fulltexts_included=Review.num_fulltexts_included + 1))
-    # TODO: should we do something now?
-    # if data_extraction_inserted_or_deleted is True:
-    #     with connection.begin():
-    #         status_counts = connection.execute(
-    #             db.select([Review.num_fulltexts_included, Review.num_fulltexts_excluded])\
-    #             .where(Review.id == review_id)
-    #             ).fetchone()
-    #         logger.info(
-    #             '<Review(id=%s)> fulltext_status counts = %s',
-    #             review_id, status_counts)
-    #         n_included, n_excluded = status_counts
 
 
 @event.listens_for(Review, 'after_insert')
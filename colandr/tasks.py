@@ -1,38 +1,84 @@
+import collections
+import functools
 import itertools
 import os
-from time import sleep
+from time import sleep, time
 
-import arrow
+from celery.signals import worker_process_init, worker_process_shutdown
 from celery.utils.log import get_task_logger
 from flask import current_app
 from flask_mail import Message
 import redis
 import redis_lock
-from sqlalchemy import create_engine, func, types as sqltypes
+from sqlalchemy import func, type_coerce, types as sqltypes, LargeBinary
 from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql import case, delete, exists, select, text, update
+from sqlalchemy.sql import case, column, delete, exists, select, table, text, update
 
 import numpy as np
-from sklearn.externals import joblib
 from sklearn.linear_model import SGDClassifier
 import textacy
 
 from . import celery, mail
+from .api.exports import (get_data_extraction_fields, get_screenings_export_query,
+                          get_studies_export_query)
+from .api.imports import (get_citations_file_parser, get_import_filepath, import_citations,
+                          remove_import_file)
 from .api.schemas import ReviewPlanSuggestedKeyterms
-from .lib.constants import CITATION_RANKING_MODEL_FNAME
-from .lib.utils import get_console_logger, load_dedupe_model, make_record_immutable
+from .api.uploads import set_upload_status
+from .lib.blobs import get_fulltext_relpath
+from .lib.cache import invalidate_prisma_counts
+from .lib.columnar import (ColumnarWriter, get_export_filepath, get_extracted_values,
+                           get_screenings_schema, get_studies_schema)
+from .lib.engines import dispose_engines, get_engine, get_pool_stats, init_engines
+from .lib.feature_matrix import (FeatureMatrixWriter, get_feature_matrix_rows,
+                                 load_feature_matrix)
+from .lib.nlp import reviewer_terms
+from .lib.nlp.passages import iter_passages, pool_vectors
+from .lib.nlp.utils import get_spacy_lang
+from .lib.pdf_extraction import extract_text_content
+from .lib.ranking_models import (get_ranking_model, get_ranking_model_cache_stats,
+                                  save_ranking_model)
+from .lib.utils import (get_console_logger, iter_chunks, load_dedupe_model,
+                        make_record_immutable)
+from .lib.vectors import decode_vectors
 from .models import (db, Citation, Dedupe, DedupeBlockingMap, DedupeCoveredBlocks,
                      DedupePluralBlock, DedupePluralKey, DedupeSmallerCoverage,
-                     Fulltext, ReviewPlan, Study, User)
+                     Fulltext, FulltextPassage, Import, Review, ReviewPlan,
+                     ReviewStatusCount, Study, User)
 
 
 REDIS_CONN = redis.StrictRedis()
+DIRTY_REVIEWS_KEY = 'colandr:dirty_reviews'
+PENDING_RANKING_MODELS_KEY = 'colandr:pending_ranking_models'
+
+UPDATE_RELEVANCE_SCORES = text("""
+    UPDATE studies
+    SET relevance_score = scores.relevance_score
+    FROM UNNEST(CAST(:ids AS BIGINT[]), CAST(:scores AS FLOAT8[])) AS scores(id, relevance_score)
+    WHERE studies.id = scores.id AND studies.review_id = :review_id
+    """)
 
 logger = get_task_logger(__name__)
 console_logger = get_console_logger(__name__)
 
 
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    init_engines()
+    console_logger.info('initialized db engines for worker process %s', os.getpid())
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    for stats in get_pool_stats():
+        console_logger.info('db engine pool stats: %s', stats)
+    console_logger.info(
+        'ranking model cache stats: %s', get_ranking_model_cache_stats())
+    dispose_engines()
+
+
 def wait_for_lock(name, expire=60):
     lock = redis_lock.Lock(REDIS_CONN, name, expire=expire, auto_renewal=True)
     while True:
@@ -46,6 +92,131 @@ def wait_for_lock(name, expire=60):
     return lock
 
 
+def mark_review_dirty(review_id):
+    """
+    Record that citations were just imported into review ``review_id``, which
+    (re-)starts its quiet period; once no more citations have been imported
+    for ``DIRTY_REVIEW_QUIET_PERIOD`` seconds, :func:`enqueue_dirty_review_tasks`
+    enqueues the downstream dedupe and vectorization tasks exactly once.
+    """
+    REDIS_CONN.zadd(DIRTY_REVIEWS_KEY, time(), review_id)
+
+
+@celery.task
+def enqueue_dirty_review_tasks():
+    cutoff = time() - current_app.config['DIRTY_REVIEW_QUIET_PERIOD']
+    # atomically pop all reviews that have gone quiet; reviews marked dirty again
+    # in the meantime have a newer score, so they stay put until *they* go quiet
+    pipe = REDIS_CONN.pipeline(transaction=True)
+    pipe.zrangebyscore(DIRTY_REVIEWS_KEY, '-inf', cutoff)
+    pipe.zremrangebyscore(DIRTY_REVIEWS_KEY, '-inf', cutoff)
+    review_ids, _ = pipe.execute()
+    for review_id in review_ids:
+        review_id = int(review_id)
+        logger.info('<Review(id=%s)>: citation imports quiet, enqueuing tasks', review_id)
+        deduplicate_citations.apply_async(args=[review_id])
+        get_citations_text_content_vectors.apply_async(args=[review_id])
+
+
+@celery.task
+def import_citations_file(import_id):
+    """
+    Parse, validate, and insert the citations in the file uploaded for import
+    ``import_id``, updating the import's status and record counts as it goes
+    so that clients can poll its progress. Once finished, the review is marked
+    dirty, so that its dedupe and vectorization tasks follow on.
+    """
+    engine = get_engine()
+    # claim the import, unless it's gone or was already failed as stale
+    with engine.connect() as conn:
+        stmt = update(Import)\
+            .where(Import.id == import_id)\
+            .where(Import.import_status == 'pending')\
+            .values(import_status='processing',
+                    last_updated=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))\
+            .returning(Import.review_id, Import.user_id, Import.data_source_id,
+                       Import.status, Import.original_filename)
+        citations_import = conn.execute(stmt).fetchone()
+    if citations_import is None:
+        logger.warning('<Import(id=%s)> not found or not pending, so nothing to import', import_id)
+        return
+    review_id = citations_import.review_id
+    filepath = get_import_filepath(
+        current_app.config['CITATIONS_DIR'], review_id, import_id,
+        citations_import.original_filename)
+
+    def update_import(**values):
+        # use a separate connection, so progress is visible before the import commits
+        with engine.connect() as conn:
+            conn.execute(
+                update(Import)
+                .where(Import.id == import_id)
+                .values(last_updated=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"), **values))
+
+    def update_progress(n_imported, n_failed):
+        update_import(num_records=n_imported, num_records_failed=n_failed)
+
+    try:
+        citations_file = get_citations_file_parser(
+            citations_import.original_filename)(filepath)
+        # the whole file is imported in one transaction, so a failed import leaves
+        # nothing behind; this doesn't hold up screening in the meantime, since
+        # status count changes are appended rather than locking counter rows
+        with engine.begin() as conn:
+            n_imported, n_failed = import_citations(
+                conn, citations_file.parse(), review_id, citations_import.user_id,
+                citations_import.data_source_id, status=citations_import.status,
+                chunk_size=current_app.config['IMPORT_CHUNK_SIZE'],
+                on_progress=update_progress)
+    except Exception:
+        logger.exception(
+            '<Review(id=%s)>: <Import(id=%s)> failed, so no citations were imported',
+            review_id, import_id)
+        update_import(import_status='failed', num_records=0, num_records_failed=0)
+        remove_import_file(filepath)
+        return
+    update_import(
+        import_status='finished', num_records=n_imported, num_records_failed=n_failed)
+    remove_import_file(filepath)
+    logger.info(
+        '<Review(id=%s)>: imported %s citations (%s failed) from file "%s"',
+        review_id, n_imported, n_failed, citations_import.original_filename)
+
+    # lastly, don't forget to deduplicate the citations and get their word2vecs
+    # once this review's imports have gone quiet
+    mark_review_dirty(review_id)
+    invalidate_prisma_counts(review_id)
+
+
+@celery.task
+def fail_stale_citation_imports():
+    """
+    Mark citation imports that have been 'pending' or 'processing' without any
+    progress for ``STALE_IMPORT_TIMEOUT`` seconds as 'failed' -- e.g. because
+    their task was lost, or the worker running them died -- so clients polling
+    them don't wait forever, and remove their uploaded files. Since imports are
+    committed all at once, none of their citations were imported.
+    """
+    cutoff = text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC') - make_interval(secs => :timeout)")\
+        .bindparams(timeout=current_app.config['STALE_IMPORT_TIMEOUT'])
+    stmt = update(Import)\
+        .where(Import.record_type == 'citation')\
+        .where(Import.import_status.in_(['pending', 'processing']))\
+        .where(Import.last_updated < cutoff)\
+        .values(import_status='failed', num_records=0, num_records_failed=0,
+                last_updated=text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"))\
+        .returning(Import.id, Import.review_id, Import.original_filename)
+    with get_engine().begin() as conn:
+        stale_imports = conn.execute(stmt).fetchall()
+    for import_id, review_id, original_filename in stale_imports:
+        logger.warning(
+            '<Review(id=%s)>: <Import(id=%s)> stalled, so marked failed',
+            review_id, import_id)
+        if original_filename:
+            remove_import_file(get_import_filepath(
+                current_app.config['CITATIONS_DIR'], review_id, import_id, original_filename))
+
+
 @celery.task
 def send_email(recipients, subject, text_body, html_body):
     msg = Message(current_app.config['MAIL_SUBJECT_PREFIX'] + ' ' + subject,
@@ -81,43 +252,90 @@ def _get_candidate_dupes(results):
         yield records
 
 
-@celery.task
-def deduplicate_citations(review_id):
+def _get_dedupe_record_columns():
+    return [Citation.id, Citation.title, Citation.authors,
+            Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
+            Citation.abstract, Citation.doi]
 
+
+def _index_dedupe_fields(conn, deduper, review_id):
+    # if deduper learned an Index Predicate
+    # we have to take a pass through the data and create indices
+    for field in deduper.blocker.index_fields:
+        col_type = getattr(Citation, field).property.columns[0].type
+        logger.debug(
+            '<Review(id=%s)>: index predicate: %s %s', review_id, field, col_type)
+        stmt = select([getattr(Citation, field)])\
+            .where(Citation.review_id == review_id)\
+            .distinct()
+        results = conn.execute(stmt)
+        if isinstance(col_type, sqltypes.ARRAY):
+            field_data = (tuple(row[0]) for row in results)
+        else:
+            field_data = (row[0] for row in results)
+        deduper.blocker.index(field_data, field)
+
+
+def _get_canonical_citation_id(conn, review_id, cids, incl_excl_cids):
+    """
+    Get the id of the citation in a cluster of duplicates that should be kept
+    as the canonical record: the first already-screened citation, if any,
+    otherwise the citation with the fewest missing values.
+    """
+    if any(cid in incl_excl_cids for cid in cids):
+        return sorted(set(cids).intersection(incl_excl_cids))[0]
+    stmt = select([Citation.id,
+                   (case([(Citation.title == None, 1)]) +
+                    case([(Citation.abstract == None, 1)]) +
+                    case([(Citation.pub_year == None, 1)]) +
+                    case([(Citation.pub_month == None, 1)]) +
+                    case([(Citation.authors == {}, 1)]) +
+                    case([(Citation.keywords == {}, 1)]) +
+                    case([(Citation.type_of_reference == None, 1)]) +
+                    case([(Citation.journal_name == None, 1)]) +
+                    case([(Citation.issue_number == None, 1)]) +
+                    case([(Citation.doi == None, 1)]) +
+                    case([(Citation.issn == None, 1)]) +
+                    case([(Citation.publisher == None, 1)]) +
+                    case([(Citation.language == None, 1)])
+                    ).label('n_null_cols')])\
+        .where(Citation.review_id == review_id)\
+        .where(Citation.id.in_(cids))\
+        .order_by(text('n_null_cols ASC'))\
+        .limit(1)
+    return conn.execute(stmt).fetchone().id
+
+
+@celery.task
+def deduplicate_citations(review_id, incremental=True):
+    """
+    Find duplicate citations in a review and assign each study a dedupe status.
+
+    By default, only citations that haven't yet been blocked are blocked and
+    compared against existing citations with which they share a block key,
+    so that the cost of deduping an import scales with the size of the import
+    rather than the size of the review. If ``incremental`` is False or this
+    review has never been deduped, all of its citations are (re-)deduped.
+    """
     lock = wait_for_lock('deduplicate_citations_review_id={}'.format(review_id), expire=60)
 
     deduper = load_dedupe_model(
         os.path.join(current_app.config['DEDUPE_MODELS_DIR'],
                      'dedupe_citations_settings'))
-    try:
-        engine = create_engine(
-            current_app.config['SQLALCHEMY_DATABASE_URI'],
-            server_side_cursors=True, echo=False,
-            use_batch_mode=True)
-    except TypeError:  # use_batch_mode kwarg only available in sqlalchemy>=1.2.0
-        engine = create_engine(
-            current_app.config['SQLALCHEMY_DATABASE_URI'],
-            server_side_cursors=True, echo=False)
+    engine = get_engine(server_side_cursors=True)
 
     with engine.connect() as conn:
 
-        # wait until no more review citations have been created in 60+ seconds
-        while True:
-            stmt = select([func.max(Citation.created_at)])\
-                .where(Citation.review_id == review_id)
-            max_created_at = conn.execute(stmt).fetchone()[0]
-            if max_created_at is None:
-                logger.error(
-                    '<Review(id=%s)>: No citations found, so nothing to dedupe...', review_id)
-                lock.release()
-                return
-            elapsed_time = (arrow.utcnow().naive - max_created_at).total_seconds()
-            if elapsed_time < 60:
-                logger.debug(
-                    'citation last created %s seconds ago, sleeping...', elapsed_time)
-                sleep(10)
-            else:
-                break
+        # NOTE: this task is enqueued by enqueue_dirty_review_tasks only after
+        # a review's citation imports have gone quiet, so no need to wait here
+        stmt = select([func.max(Citation.created_at)])\
+            .where(Citation.review_id == review_id)
+        max_created_at = conn.execute(stmt).fetchone()[0]
+        if max_created_at is None:
+            logger.error(
+                '<Review(id=%s)>: No citations found, so nothing to dedupe...', review_id)
+            lock.release()
+            return
 
         # if studies have been deduped since most recent import, cancel
         # stmt = select(
@@ -130,133 +348,313 @@ def deduplicate_citations(review_id):
             lock.release()
             return
 
-        # remove rows for this review
-        # which we'll add back with the latest citations included
-        for table in [Dedupe, DedupeBlockingMap, DedupePluralKey, DedupePluralBlock,
-                      DedupeCoveredBlocks, DedupeSmallerCoverage]:
-            stmt = delete(table).where(getattr(table, 'review_id') == review_id)
-            result = conn.execute(stmt)
-            rows_deleted = result.rowcount
-            logger.debug(
-                '<Review(id=%s)>: deleted %s rows from %s',
-                review_id, rows_deleted, table.__tablename__)
-
-        # if deduper learned an Index Predicate
-        # we have to take a pass through the data and create indices
-        for field in deduper.blocker.index_fields:
-            col_type = getattr(Citation, field).property.columns[0].type
-            # print('index predicate: {} {}'.format(field, col_type))
-            logger.debug(
-                '<Review(id=%s)>: index predicate: %s %s', review_id, field, col_type)
-            stmt = select([getattr(Citation, field)])\
-                .where(Citation.review_id == review_id)\
-                .distinct()
-            results = conn.execute(stmt)
-            if isinstance(col_type, sqltypes.ARRAY):
-                field_data = (tuple(row[0]) for row in results)
-            else:
-                field_data = (row[0] for row in results)
-            deduper.blocker.index(field_data, field)
-
-        # now we're ready to write our blocking map table by creating a generator
-        # that yields unique (block_key, citation_id, review_id) tuples
-        stmt = select([Citation.id, Citation.title, Citation.authors,
-                       Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
-                       Citation.abstract, Citation.doi])\
-            .where(Citation.review_id == review_id)
-        results = conn.execute(stmt)
-        data = ((row[0], make_record_immutable(dict(row)))
-                for row in results)
-        b_data = ((citation_id, review_id, block_key)
-                  for block_key, citation_id in deduper.blocker(data))
+        # we can only dedupe incrementally if there's an existing blocking map
+        if incremental is True:
+            stmt = select([exists().where(DedupeBlockingMap.review_id == review_id)])
+            incremental = conn.execute(stmt).fetchone()[0]
+
+        if incremental is True:
+            _deduplicate_new_citations(conn, deduper, review_id)
+        else:
+            _deduplicate_all_citations(conn, deduper, review_id)
+
+    invalidate_prisma_counts(review_id)
+
+    lock.release()
+
+
+def _deduplicate_all_citations(conn, deduper, review_id):
+
+    # remove rows for this review
+    # which we'll add back with the latest citations included
+    for model in [Dedupe, DedupeBlockingMap, DedupePluralKey, DedupePluralBlock,
+                  DedupeCoveredBlocks, DedupeSmallerCoverage]:
+        stmt = delete(model).where(getattr(model, 'review_id') == review_id)
+        result = conn.execute(stmt)
+        rows_deleted = result.rowcount
+        logger.debug(
+            '<Review(id=%s)>: deleted %s rows from %s',
+            review_id, rows_deleted, model.__tablename__)
+
+    _index_dedupe_fields(conn, deduper, review_id)
+
+    # now we're ready to write our blocking map table by creating a generator
+    # that yields unique (block_key, citation_id, review_id) tuples
+    stmt = select(_get_dedupe_record_columns())\
+        .where(Citation.review_id == review_id)
+    results = conn.execute(stmt)
+    data = ((row[0], make_record_immutable(dict(row)))
+            for row in results)
+    b_data = ((citation_id, review_id, block_key)
+              for block_key, citation_id in deduper.blocker(data))
+    conn.execute(
+        DedupeBlockingMap.__table__.insert(),
+        [{'citation_id': row[0], 'review_id': row[1], 'block_key': row[2]}
+         for row in b_data])
+
+    # now fill review rows back in
+    stmt = select([DedupeBlockingMap.review_id, DedupeBlockingMap.block_key])\
+        .where(DedupeBlockingMap.review_id == review_id)\
+        .group_by(DedupeBlockingMap.review_id, DedupeBlockingMap.block_key)\
+        .having(func.count(1) > 1)
+    conn.execute(
+        DedupePluralKey.__table__.insert()\
+            .from_select(['review_id', 'block_key'], stmt))
+
+    stmt = select([DedupePluralKey.block_id,
+                   DedupeBlockingMap.citation_id,
+                   DedupeBlockingMap.review_id])\
+        .where(DedupePluralKey.block_key == DedupeBlockingMap.block_key)\
+        .where(DedupeBlockingMap.review_id == review_id)
+    conn.execute(
+        DedupePluralBlock.__table__.insert()\
+            .from_select(['block_id', 'citation_id', 'review_id'], stmt))
+
+    # To use Kolb, et. al's Redundant Free Comparison scheme, we need to
+    # keep track of all the block_ids that are associated with particular
+    # citation records
+    stmt = select([DedupePluralBlock.citation_id,
+                   DedupePluralBlock.review_id,
+                   func.array_agg(aggregate_order_by(DedupePluralBlock.block_id,
+                                                     DedupePluralBlock.block_id.desc()),
+                                  type_=sqltypes.ARRAY(sqltypes.BigInteger)).label('sorted_ids')])\
+        .where(DedupePluralBlock.review_id == review_id)\
+        .group_by(DedupePluralBlock.citation_id, DedupePluralBlock.review_id)
+    conn.execute(
+        DedupeCoveredBlocks.__table__.insert()\
+            .from_select(['citation_id', 'review_id', 'sorted_ids'], stmt))
+
+    # for every block of records, we need to keep track of a citation records's
+    # associated block_ids that are SMALLER than the current block's id
+    ugh = 'dedupe_covered_blocks.sorted_ids[0: array_position(dedupe_covered_blocks.sorted_ids, dedupe_plural_block.block_id) - 1] AS smaller_ids'
+    stmt = select([DedupePluralBlock.citation_id,
+                   DedupePluralBlock.review_id,
+                   DedupePluralBlock.block_id,
+                   text(ugh)])\
+        .where(DedupePluralBlock.citation_id == DedupeCoveredBlocks.citation_id)\
+        .where(DedupePluralBlock.review_id == review_id)
+    conn.execute(
+        DedupeSmallerCoverage.__table__.insert()\
+            .from_select(['citation_id', 'review_id', 'block_id', 'smaller_ids'], stmt))
+
+    # set dedupe model similarity threshold from the data
+    stmt = select(_get_dedupe_record_columns())\
+        .where(Citation.review_id == review_id)\
+        .order_by(func.random())\
+        .limit(20000)
+    results = conn.execute(stmt)
+    dupe_threshold = deduper.threshold(
+        {row.id: make_record_immutable(dict(row)) for row in results},
+        recall_weight=0.5)
+
+    # apply dedupe model to get clusters of duplicate records
+    stmt = select([Citation.id.label('citation_id'), Citation.title, Citation.authors,
+                   Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
+                   Citation.abstract, Citation.doi,
+                   DedupeSmallerCoverage.block_id, DedupeSmallerCoverage.smaller_ids])\
+        .where(Citation.id == DedupeSmallerCoverage.citation_id)\
+        .where(Citation.review_id == review_id)\
+        .order_by(DedupeSmallerCoverage.block_id)
+    results = conn.execute(stmt)
+
+    clustered_dupes = deduper.matchBlocks(
+        _get_candidate_dupes(results),
+        threshold=dupe_threshold)
+    try:
+        logger.info(
+            '<Review(id=%s)>: found %s duplicate clusters',
+            review_id, len(clustered_dupes))
+    # newer versions of dedupe made this into a generator, which has no len
+    except TypeError:
+        logger.info('<Review(id=%s)>: found duplicate clusters', review_id)
+
+    # get *all* citation ids for this review, as well as included/excluded
+    stmt = select([Citation.id]).where(Citation.review_id == review_id)
+    all_cids = {result[0] for result in conn.execute(stmt).fetchall()}
+    stmt = select([Study.id])\
+        .where(Study.review_id == review_id)\
+        .where(Study.citation_status.in_(['included', 'excluded']))
+    incl_excl_cids = {result[0] for result in conn.execute(stmt).fetchall()}
+
+    duplicate_cids = set()
+
+    studies_to_update = []
+    dedupes_to_insert = []
+    for cids, scores in clustered_dupes:
+        int_cids = [int(cid) for cid in cids]
+        cid_scores = {cid: float(score) for cid, score in zip(int_cids, scores)}
+        canonical_citation_id = _get_canonical_citation_id(
+            conn, review_id, int_cids, incl_excl_cids)
+        for cid, score in cid_scores.items():
+            if cid != canonical_citation_id:
+                duplicate_cids.add(cid)
+                studies_to_update.append(
+                    {'id': cid,
+                     'dedupe_status': 'duplicate'})
+                dedupes_to_insert.append(
+                    {'id': cid,
+                     'review_id': review_id,
+                     'duplicate_of': canonical_citation_id,
+                     'duplicate_score': score})
+    non_duplicate_cids = all_cids - duplicate_cids
+    studies_to_update.extend(
+        {'id': cid, 'dedupe_status': 'not_duplicate'}
+        for cid in non_duplicate_cids)
+    session = Session(bind=conn)
+    session.bulk_update_mappings(Study, studies_to_update)
+    session.bulk_insert_mappings(Dedupe, dedupes_to_insert)
+    session.commit()
+    logger.info(
+        '<Review(id=%s)>: found %s duplicate and %s non-duplicate citations',
+        review_id, len(duplicate_cids), len(non_duplicate_cids))
+
+
+def _deduplicate_new_citations(conn, deduper, review_id):
+
+    # citations that haven't been blocked yet are (almost always) newly imported;
+    # those few old citations that produced no block keys are cheap to re-block
+    stmt = select(_get_dedupe_record_columns())\
+        .where(Citation.review_id == review_id)\
+        .where(~exists().where(DedupeBlockingMap.citation_id == Citation.id))
+    new_records = [(row[0], make_record_immutable(dict(row)))
+                   for row in conn.execute(stmt)]
+    if not new_records:
+        logger.warning('<Review(id=%s)>: no new citations to dedupe', review_id)
+        return
+    new_cids = {cid for cid, _ in new_records}
+    logger.info(
+        '<Review(id=%s)>: incrementally deduping %s new citations',
+        review_id, len(new_cids))
+
+    with conn.begin():
+
+        # keep track of new citations in a temp table, so we can join on it
+        new_citations = table('dedupe_new_citations', column('citation_id'))
+        conn.execute(text(
+            'CREATE TEMPORARY TABLE dedupe_new_citations '
+            '(citation_id BIGINT PRIMARY KEY) ON COMMIT DROP'))
+        conn.execute(
+            new_citations.insert(),
+            [{'citation_id': cid} for cid in new_cids])
+
+        # remove any stale dedupe rows left over from a previous attempt
         conn.execute(
-            DedupeBlockingMap.__table__.insert(),
-            [{'citation_id': row[0], 'review_id': row[1], 'block_key': row[2]}
-             for row in b_data])
+            delete(Dedupe)\
+                .where(Dedupe.review_id == review_id)\
+                .where(Dedupe.id.in_(select([new_citations.c.citation_id]))))
+
+        # block the new citations *only*, using the same indices as the old ones
+        _index_dedupe_fields(conn, deduper, review_id)
+        b_data = [{'citation_id': citation_id, 'review_id': review_id, 'block_key': block_key}
+                  for block_key, citation_id in deduper.blocker(new_records)]
+        if b_data:
+            conn.execute(DedupeBlockingMap.__table__.insert(), b_data)
+
+        # only blocks that include a new citation must be updated and compared
+        new_block_keys = select([DedupeBlockingMap.block_key])\
+            .where(DedupeBlockingMap.review_id == review_id)\
+            .where(DedupeBlockingMap.citation_id == new_citations.c.citation_id)\
+            .distinct()
 
-        # now fill review rows back in
         stmt = select([DedupeBlockingMap.review_id, DedupeBlockingMap.block_key])\
             .where(DedupeBlockingMap.review_id == review_id)\
+            .where(DedupeBlockingMap.block_key.in_(new_block_keys))\
+            .where(~exists()\
+                .where(DedupePluralKey.review_id == review_id)\
+                .where(DedupePluralKey.block_key == DedupeBlockingMap.block_key))\
             .group_by(DedupeBlockingMap.review_id, DedupeBlockingMap.block_key)\
             .having(func.count(1) > 1)
         conn.execute(
             DedupePluralKey.__table__.insert()\
                 .from_select(['review_id', 'block_key'], stmt))
 
+        affected_block_ids = select([DedupePluralKey.block_id])\
+            .where(DedupePluralKey.review_id == review_id)\
+            .where(DedupePluralKey.block_key.in_(new_block_keys))
+
         stmt = select([DedupePluralKey.block_id,
                        DedupeBlockingMap.citation_id,
                        DedupeBlockingMap.review_id])\
             .where(DedupePluralKey.block_key == DedupeBlockingMap.block_key)\
-            .where(DedupeBlockingMap.review_id == review_id)
+            .where(DedupePluralKey.review_id == review_id)\
+            .where(DedupeBlockingMap.review_id == review_id)\
+            .where(DedupePluralKey.block_id.in_(affected_block_ids))\
+            .where(~exists()\
+                .where(DedupePluralBlock.block_id == DedupePluralKey.block_id)\
+                .where(DedupePluralBlock.citation_id == DedupeBlockingMap.citation_id))
         conn.execute(
             DedupePluralBlock.__table__.insert()\
                 .from_select(['block_id', 'citation_id', 'review_id'], stmt))
 
-        # To use Kolb, et. al's Redundant Free Comparison scheme, we need to
-        # keep track of all the block_ids that are associated with particular
-        # citation records
+        # recompute block coverage for every citation in an affected block,
+        # since their sets of (smaller) block ids may have changed
+        affected_cids = select([DedupePluralBlock.citation_id])\
+            .where(DedupePluralBlock.review_id == review_id)\
+            .where(DedupePluralBlock.block_id.in_(affected_block_ids))
+        for tbl in [DedupeCoveredBlocks, DedupeSmallerCoverage]:
+            conn.execute(
+                delete(tbl)\
+                    .where(tbl.review_id == review_id)\
+                    .where(tbl.citation_id.in_(affected_cids)))
+
         stmt = select([DedupePluralBlock.citation_id,
                        DedupePluralBlock.review_id,
                        func.array_agg(aggregate_order_by(DedupePluralBlock.block_id,
                                                          DedupePluralBlock.block_id.desc()),
                                       type_=sqltypes.ARRAY(sqltypes.BigInteger)).label('sorted_ids')])\
             .where(DedupePluralBlock.review_id == review_id)\
+            .where(DedupePluralBlock.citation_id.in_(affected_cids))\
             .group_by(DedupePluralBlock.citation_id, DedupePluralBlock.review_id)
         conn.execute(
             DedupeCoveredBlocks.__table__.insert()\
                 .from_select(['citation_id', 'review_id', 'sorted_ids'], stmt))
 
-        # for every block of records, we need to keep track of a citation records's
-        # associated block_ids that are SMALLER than the current block's id
         ugh = 'dedupe_covered_blocks.sorted_ids[0: array_position(dedupe_covered_blocks.sorted_ids, dedupe_plural_block.block_id) - 1] AS smaller_ids'
         stmt = select([DedupePluralBlock.citation_id,
                        DedupePluralBlock.review_id,
                        DedupePluralBlock.block_id,
                        text(ugh)])\
             .where(DedupePluralBlock.citation_id == DedupeCoveredBlocks.citation_id)\
-            .where(DedupePluralBlock.review_id == review_id)
+            .where(DedupePluralBlock.review_id == review_id)\
+            .where(DedupePluralBlock.citation_id.in_(affected_cids))
         conn.execute(
             DedupeSmallerCoverage.__table__.insert()\
                 .from_select(['citation_id', 'review_id', 'block_id', 'smaller_ids'], stmt))
 
-        # set dedupe model similarity threshold from the data
-        stmt = select([Citation.id, Citation.title, Citation.authors,
-                       Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
-                       Citation.abstract, Citation.doi])\
+        # set dedupe model similarity threshold from the affected citations
+        stmt = select(_get_dedupe_record_columns())\
             .where(Citation.review_id == review_id)\
+            .where(Citation.id.in_(affected_cids))\
             .order_by(func.random())\
             .limit(20000)
-        results = conn.execute(stmt)
-        dupe_threshold = deduper.threshold(
-            {row.id: make_record_immutable(dict(row)) for row in results},
-            recall_weight=0.5)
-
-        # apply dedupe model to get clusters of duplicate records
-        stmt = select([Citation.id.label('citation_id'), Citation.title, Citation.authors,
-                       Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
-                       Citation.abstract, Citation.doi,
-                       DedupeSmallerCoverage.block_id, DedupeSmallerCoverage.smaller_ids])\
-            .where(Citation.id == DedupeSmallerCoverage.citation_id)\
-            .where(Citation.review_id == review_id)\
-            .order_by(DedupeSmallerCoverage.block_id)
-        results = conn.execute(stmt)
-
-        clustered_dupes = deduper.matchBlocks(
-            _get_candidate_dupes(results),
-            threshold=dupe_threshold)
-        try:
-            logger.info(
-                '<Review(id=%s)>: found %s duplicate clusters',
-                review_id, len(clustered_dupes))
-        # newer versions of dedupe made this into a generator, which has no len
-        except TypeError:
-            logger.info('<Review(id=%s)>: found duplicate clusters', review_id)
-
-        # get *all* citation ids for this review, as well as included/excluded
-        stmt = select([Citation.id]).where(Citation.review_id == review_id)
-        all_cids = {result[0] for result in conn.execute(stmt).fetchall()}
+        sample = {row.id: make_record_immutable(dict(row))
+                  for row in conn.execute(stmt)}
+        if len(sample) > 1:
+            dupe_threshold = deduper.threshold(sample, recall_weight=0.5)
+            stmt = select([Citation.id.label('citation_id'), Citation.title, Citation.authors,
+                           Citation.pub_year.label('publication_year'),  # HACK: trained model expects this field
+                           Citation.abstract, Citation.doi,
+                           DedupeSmallerCoverage.block_id, DedupeSmallerCoverage.smaller_ids])\
+                .where(Citation.id == DedupeSmallerCoverage.citation_id)\
+                .where(Citation.review_id == review_id)\
+                .where(DedupeSmallerCoverage.block_id.in_(affected_block_ids))\
+                .order_by(DedupeSmallerCoverage.block_id)
+            clustered_dupes = list(deduper.matchBlocks(
+                _get_candidate_dupes(conn.execute(stmt)),
+                threshold=dupe_threshold))
+        else:
+            clustered_dupes = []
+
+        # old citations keep their current assignments; new citations are merged
+        # into the cluster of the canonical citation of their old duplicates
+        cluster_cids = {int(cid) for cids, _ in clustered_dupes for cid in cids}
+        stmt = select([Dedupe.id, Dedupe.duplicate_of])\
+            .where(Dedupe.review_id == review_id)\
+            .where(Dedupe.id.in_(cluster_cids - new_cids))
+        canonical_ids = dict(conn.execute(stmt).fetchall())
         stmt = select([Study.id])\
             .where(Study.review_id == review_id)\
+            .where(Study.id.in_(cluster_cids))\
             .where(Study.citation_status.in_(['included', 'excluded']))
         incl_excl_cids = {result[0] for result in conn.execute(stmt).fetchall()}
 
@@ -266,31 +664,18 @@ def deduplicate_citations(review_id):
         dedupes_to_insert = []
         for cids, scores in clustered_dupes:
             int_cids = [int(cid) for cid in cids]
-            cid_scores = {cid: float(score) for cid, score in zip(int_cids, scores)}
-            if any(cid in incl_excl_cids for cid in int_cids):
-                canonical_citation_id = sorted(set(int_cids).intersection(incl_excl_cids))[0]
+            cid_scores = {cid: float(score) for cid, score in zip(int_cids, scores)
+                          if cid in new_cids}
+            if not cid_scores:
+                continue
+            root_cids = sorted({canonical_ids.get(cid, cid)
+                                for cid in int_cids if cid not in new_cids})
+            if root_cids:
+                canonical_citation_id = _get_canonical_citation_id(
+                    conn, review_id, root_cids, incl_excl_cids)
             else:
-                stmt = select([Citation.id,
-                               (case([(Citation.title == None, 1)]) +
-                                case([(Citation.abstract == None, 1)]) +
-                                case([(Citation.pub_year == None, 1)]) +
-                                case([(Citation.pub_month == None, 1)]) +
-                                case([(Citation.authors == {}, 1)]) +
-                                case([(Citation.keywords == {}, 1)]) +
-                                case([(Citation.type_of_reference == None, 1)]) +
-                                case([(Citation.journal_name == None, 1)]) +
-                                case([(Citation.issue_number == None, 1)]) +
-                                case([(Citation.doi == None, 1)]) +
-                                case([(Citation.issn == None, 1)]) +
-                                case([(Citation.publisher == None, 1)]) +
-                                case([(Citation.language == None, 1)])
-                                ).label('n_null_cols')])\
-                    .where(Citation.review_id == review_id)\
-                    .where(Citation.id.in_(int_cids))\
-                    .order_by(text('n_null_cols ASC'))\
-                    .limit(1)
-                result = conn.execute(stmt).fetchone()
-                canonical_citation_id = result.id
+                canonical_citation_id = _get_canonical_citation_id(
+                    conn, review_id, int_cids, incl_excl_cids)
             for cid, score in cid_scores.items():
                 if cid != canonical_citation_id:
                     duplicate_cids.add(cid)
@@ -302,7 +687,7 @@ def deduplicate_citations(review_id):
                          'review_id': review_id,
                          'duplicate_of': canonical_citation_id,
                          'duplicate_score': score})
-        non_duplicate_cids = all_cids - duplicate_cids
+        non_duplicate_cids = new_cids - duplicate_cids
         studies_to_update.extend(
             {'id': cid, 'dedupe_status': 'not_duplicate'}
             for cid in non_duplicate_cids)
@@ -310,11 +695,69 @@ def deduplicate_citations(review_id):
         session.bulk_update_mappings(Study, studies_to_update)
         session.bulk_insert_mappings(Dedupe, dedupes_to_insert)
         session.commit()
-        logger.info(
-            '<Review(id=%s)>: found %s duplicate and %s non-duplicate citations',
-            review_id, len(duplicate_cids), len(non_duplicate_cids))
 
-    lock.release()
+    logger.info(
+        '<Review(id=%s)>: found %s duplicate and %s non-duplicate new citations',
+        review_id, len(duplicate_cids), len(non_duplicate_cids))
+
+
+def _iter_english_citation_texts(results):
+    for id_, text_content in results:
+        try:
+            lang = textacy.text_utils.detect_language(text_content)
+        except ValueError:
+            logger.exception(
+                'unable to detect language of text content for <Citation(study_id=%s)>', id_)
+            continue
+        if lang == 'en':
+            yield id_, text_content
+        else:
+            logger.warning(
+                'lang "%s" detected for <Citation(study_id=%s)>', lang, id_)
+
+
+def _iter_spacy_docs(nlp, ids, texts):
+    try:
+        docs = list(nlp.pipe(
+            texts,
+            batch_size=current_app.config['VECTORIZATION_BATCH_SIZE'],
+            n_threads=current_app.config['VECTORIZATION_N_THREADS']))
+    except Exception:
+        # fall back to one-at-a-time, so one bad text doesn't sink the whole batch
+        docs = []
+        for id_, text_content in zip(ids, texts):
+            try:
+                docs.append(nlp(text_content))
+            except Exception:
+                logger.exception(
+                    'unable to tokenize text content for <Citation(study_id=%s)>', id_)
+                docs.append(None)
+    for id_, doc in zip(ids, docs):
+        if doc is not None:
+            yield id_, doc
+
+
+def _build_citation_feature_matrix(review_id):
+    """
+    (Re-)build a review's on-disk feature matrix cache from all of its
+    vectorized citations in the db, and return it memory-mapped.
+    """
+    feature_matrix_writer = FeatureMatrixWriter(review_id)
+    with get_engine(server_side_cursors=True).connect() as conn:
+        stmt = select([Citation.id,
+                       type_coerce(Citation.text_content_vector_rep, LargeBinary)])\
+            .where(Citation.review_id == review_id)\
+            .where(Citation.text_content_vector_rep != None)\
+            .order_by(Citation.id)
+        for chunk in iter_chunks(conn.execute(stmt),
+                                 current_app.config['VECTORIZATION_CHUNK_SIZE']):
+            ids, blobs = zip(*chunk)
+            feature_matrix_writer.write(ids, decode_vectors(blobs))
+    feature_matrix_writer.commit()
+    logger.info(
+        '<Review(id=%s)>: built feature matrix for %s citations',
+        review_id, feature_matrix_writer.n_rows)
+    return load_feature_matrix(review_id)
 
 
 @celery.task
@@ -323,132 +766,259 @@ def get_citations_text_content_vectors(review_id):
     lock = wait_for_lock(
         'get_citations_text_content_vectors_review_id={}'.format(review_id), expire=60)
 
-    en_nlp = textacy.load_spacy(
+    en_nlp = get_spacy_lang(
         'en', tagger=False, parser=False, entity=False, matcher=False)
-    engine = create_engine(
-        current_app.config['SQLALCHEMY_DATABASE_URI'],
-        server_side_cursors=True, echo=False)
 
-    with engine.connect() as conn:
+    # if this review has a cached feature matrix, append the new vectors to it
+    cached_ids, _ = load_feature_matrix(review_id)
+    if cached_ids is not None:
+        feature_matrix_writer = FeatureMatrixWriter(review_id, append=True)
+    else:
+        feature_matrix_writer = None
+    del cached_ids
 
-        # wait until no more review citations have been created in 60+ seconds
-        stmt = select([func.max(Citation.created_at)])\
-            .where(Citation.review_id == review_id)
-        while True:
-            max_created_at = conn.execute(stmt).fetchone()[0]
-            if not max_created_at:
-                logger.warning('<Review(id=%s)>: no citations found', review_id)
-                lock.release()
-                return
-            elapsed_time = (arrow.utcnow().naive - max_created_at).total_seconds()
-            if elapsed_time < 60:
-                logger.debug(
-                    '<Review(id=%s)>: citation last created %s seconds ago, sleeping...',
-                    review_id, elapsed_time)
-                sleep(10)
-            else:
-                break
+    # stream citations in from one connection, and write their vectors out
+    # in fixed-size chunks via another, since committing would close the cursor
+    n_updated = 0
+    with get_engine(server_side_cursors=True).connect() as conn, \
+            get_engine().connect() as write_conn:
 
         stmt = select([Citation.id, Citation.text_content])\
             .where(Citation.review_id == review_id)\
-            .where(Citation.text_content_vector_rep == [])\
+            .where(Citation.text_content_vector_rep == None)\
             .order_by(Citation.id)
         results = conn.execute(stmt)
-        citations_to_update = []
-        for id_, text_content in results:
-            try:
-                lang = textacy.text_utils.detect_language(text_content)
-            except ValueError:
-                logger.exception(
-                    'unable to detect language of text content for <Citation(study_id=%s)>', id_)
-                continue
-            if lang == 'en':
-                try:
-                    spacy_doc = en_nlp(text_content)
-                except Exception as e:
-                    logger.exception(
-                        'unable to tokenize text content for <Citation(study_id=%s)>', id_)
-                    continue
-                citations_to_update.append(
-                    {'id': id_, 'text_content_vector_rep': spacy_doc.vector.tolist()})
-            else:
-                logger.warning(
-                    'lang "%s" detected for <Citation(study_id=%s)>', lang, id_)
+        session = Session(bind=write_conn)
+        for chunk in iter_chunks(_iter_english_citation_texts(results),
+                                 current_app.config['VECTORIZATION_CHUNK_SIZE']):
+            ids, texts = zip(*chunk)
+            citations_to_update = [
+                {'id': id_, 'text_content_vector_rep': spacy_doc.vector}
+                for id_, spacy_doc in _iter_spacy_docs(en_nlp, ids, texts)]
+            session.bulk_update_mappings(Citation, citations_to_update)
+            session.commit()
+            if feature_matrix_writer is not None and citations_to_update:
+                feature_matrix_writer.write(
+                    [citation['id'] for citation in citations_to_update],
+                    np.vstack([citation['text_content_vector_rep']
+                               for citation in citations_to_update]))
+            n_updated += len(citations_to_update)
+            logger.debug(
+                '<Review(id=%s)>: %s citation text_content_vector_reps updated so far',
+                review_id, n_updated)
 
         # TODO: collect (id, lang) pairs for those that aren't lang == 'en'
         # filter to those that can be tokenized and word2vec-torized
         # group by lang, then load the necessary models to do this for groups
 
-        if not citations_to_update:
-            logger.warning(
-                '<Review(id=%s)>: no citation text_content_vector_reps to update',
-                review_id)
-            lock.release()
-            return
-
-        session = Session(bind=conn)
-        session.bulk_update_mappings(Citation, citations_to_update)
-        session.commit()
-        logger.info(
-            '<Review(id=%s)>: %s citation text_content_vector_reps updated',
-            review_id, len(citations_to_update))
-
-    lock.release()
+    if feature_matrix_writer is not None:
+        if feature_matrix_writer.commit() is False:
+            _build_citation_feature_matrix(review_id)
+    elif n_updated > 0:
+        _build_citation_feature_matrix(review_id)
 
+    if n_updated == 0:
+        logger.warning(
+            '<Review(id=%s)>: no citation text_content_vector_reps to update',
+            review_id)
+        lock.release()
+        # training may have been deferred just as another run's vectors were committed
+        if REDIS_CONN.srem(PENDING_RANKING_MODELS_KEY, review_id):
+            train_citation_ranking_model.apply_async(args=[review_id])
+        return
 
-@celery.task
-def get_fulltext_text_content_vector(review_id, fulltext_id):
+    logger.info(
+        '<Review(id=%s)>: %s citation text_content_vector_reps updated',
+        review_id, n_updated)
 
-    # HACK: let's skip this for now, actually
-    return
+    lock.release()
 
-    lock = wait_for_lock(
-        'get_fulltext_text_content_vector_review_id={}'.format(review_id), expire=60)
+    # kick off any ranking model training that was waiting on these vectors,
+    # otherwise just score the new citations with the existing model (if any)
+    if REDIS_CONN.srem(PENDING_RANKING_MODELS_KEY, review_id):
+        train_citation_ranking_model.apply_async(args=[review_id])
+    else:
+        compute_citation_relevance_scores.apply_async(args=[review_id])
 
-    engine = create_engine(
-        current_app.config['SQLALCHEMY_DATABASE_URI'],
-        server_side_cursors=True, echo=False)
 
+@celery.task
+def extract_fulltext_text_content(review_id, fulltext_id, upload_id=None):
+    """
+    Extract the text content of the file uploaded for fulltext ``fulltext_id``
+    -- off the web request, with the configured pdf extraction backend --
+    then get its word2vec vector. Both are reused from any other fulltext whose
+    uploaded file has identical content, i.e. the same content hash, if available.
+    If the file was part of bulk upload ``upload_id``, its status in that upload
+    is updated once finished.
+    """
+    engine = get_engine()
     with engine.connect() as conn:
-
-        # wait until no more review citations have been created in 60+ seconds
-        stmt = select([Fulltext.text_content]).where(Fulltext.id == fulltext_id)
-        text_content = conn.execute(stmt).fetchone()
-        if not text_content:
-            logger.warning(
-                'no fulltext text content found for <Fulltext(study_id=%s)>',
-                fulltext_id)
-            lock.release()
-            return
-        else:
-            text_content = text_content[0]
-
-        lang = textacy.text_utils.detect_language(text_content)
-        try:
-            nlp = textacy.load_spacy(
-                lang, tagger=False, parser=False, entity=False, matcher=False)
-        except RuntimeError:
-            logger.warning(
-                'unable to load spacy lang "%s" for <Fulltext(study_id=%s)>',
-                lang, fulltext_id)
-            lock.release()
-            return
-        spacy_doc = nlp(text_content)
+        stmt = select([Fulltext.filename, Fulltext.content_hash])\
+            .where(Fulltext.id == fulltext_id)
+        result = conn.execute(stmt).fetchone()
+    if not result or not result.filename:
+        logger.warning(
+            'no uploaded file found for <Fulltext(study_id=%s)>, so no text extracted',
+            fulltext_id)
+        if upload_id is not None:
+            set_upload_status(review_id, upload_id, fulltext_id, 'failed')
+        return
+    filename, content_hash = result
+
+    # identical content may already have been extracted (and vectorized)
+    # for another fulltext, in which case there's no need to do it again
+    text_content_vector_rep = None
+    if content_hash is not None:
+        with engine.connect() as conn:
+            stmt = select([Fulltext.text_content, Fulltext.text_content_vector_rep])\
+                .where(Fulltext.content_hash == content_hash)\
+                .where(Fulltext.text_content != None)\
+                .order_by(Fulltext.text_content_vector_rep == None)\
+                .limit(1)
+            cached = conn.execute(stmt).fetchone()
+    else:
+        cached = None
+    if cached is not None:
+        text_content, text_content_vector_rep = cached
+        logger.info(
+            '<Review(id=%s)>: reused text content extracted from identical file for <Fulltext(study_id=%s)>',
+            review_id, fulltext_id)
+    else:
+        filepath = os.path.join(
+            current_app.config['FULLTEXT_UPLOADS_DIR'],
+            get_fulltext_relpath(review_id, filename, content_hash))
         try:
-            text_content_vector_rep = spacy_doc.vector.tolist()
-        except ValueError:
-            logger.warning(
-                'unable to get lang "%s" word vectors for <Fulltext(study_id=%s)>',
-                lang, fulltext_id)
-            lock.release()
+            text_content = extract_text_content(
+                filepath,
+                backend=current_app.config['PDF_EXTRACTION_BACKEND'],
+                address=current_app.config['PDF_EXTRACTION_SERVER_ADDRESS'],
+                timeout=current_app.config['PDF_EXTRACTION_TIMEOUT'],
+                app_dir=current_app.config['COLANDR_APP_DIR'])
+        except Exception:
+            logger.exception(
+                'unable to extract text content for <Fulltext(study_id=%s)>', fulltext_id)
+            if upload_id is not None:
+                set_upload_status(review_id, upload_id, fulltext_id, 'failed')
             return
+        logger.info(
+            '<Review(id=%s)>: extracted text content for <Fulltext(study_id=%s)>',
+            review_id, fulltext_id)
+    with engine.connect() as conn:
+        # only update if the same file is still uploaded, in case it was
+        # deleted or replaced during extraction
+        stmt = update(Fulltext)\
+            .where(Fulltext.id == fulltext_id)\
+            .where(Fulltext.filename == filename)\
+            .where(Fulltext.content_hash == content_hash)\
+            .values(text_content=text_content,
+                    text_content_vector_rep=text_content_vector_rep)
+        conn.execute(stmt)
+    if upload_id is not None:
+        set_upload_status(review_id, upload_id, fulltext_id, 'extracted')
+    # already vectorized, unless passage vectors are wanted too
+    if (text_content_vector_rep is not None and
+            current_app.config['FULLTEXT_PASSAGE_VECTORS'] is False):
+        return
 
+    # parse the fulltext text content and get its word2vec vector
+    get_fulltext_text_content_vector.apply_async(args=[review_id, fulltext_id])
+
+
+@celery.task
+def get_fulltext_text_content_vector(review_id, fulltext_id):
+    """
+    Vectorize a fulltext's text content passage by passage, in batches through
+    a spacy pipeline loaded once per worker process, then pool the passages'
+    vectors into one for the whole fulltext. The pooled vector is also given
+    to any other fulltext with identical content that's still missing one;
+    passages' vectors are stored too, if ``FULLTEXT_PASSAGE_VECTORS`` is True.
+    """
+    engine = get_engine()
+    with engine.connect() as conn:
+        stmt = select([Fulltext.text_content, Fulltext.content_hash])\
+            .where(Fulltext.id == fulltext_id)
+        result = conn.execute(stmt).fetchone()
+    if not result or not result.text_content:
+        logger.warning(
+            'no fulltext text content found for <Fulltext(study_id=%s)>',
+            fulltext_id)
+        return
+    text_content, content_hash = result
+
+    # a sample of the text is plenty to detect its language
+    try:
+        lang = textacy.text_utils.detect_language(text_content[:10000])
+    except ValueError:
+        logger.exception(
+            'unable to detect language of text content for <Fulltext(study_id=%s)>',
+            fulltext_id)
+        return
+    try:
+        nlp = get_spacy_lang(
+            lang, tagger=False, parser=False, entity=False, matcher=False)
+    except RuntimeError:
+        logger.warning(
+            'unable to load spacy lang "%s" for <Fulltext(study_id=%s)>',
+            lang, fulltext_id)
+        return
+
+    passages = list(iter_passages(
+        text_content, max_chars=current_app.config['FULLTEXT_PASSAGE_MAX_CHARS']))
+    passage_vectors = []
+    passage_lengths = []
+    try:
+        for spacy_doc in nlp.pipe(
+                (passage for _, _, passage in passages),
+                batch_size=current_app.config['VECTORIZATION_BATCH_SIZE'],
+                n_threads=current_app.config['VECTORIZATION_N_THREADS']):
+            passage_vectors.append(spacy_doc.vector)
+            passage_lengths.append(len(spacy_doc))
+    except ValueError:
+        logger.warning(
+            'unable to get lang "%s" word vectors for <Fulltext(study_id=%s)>',
+            lang, fulltext_id)
+        return
+    text_content_vector_rep = pool_vectors(passage_vectors, passage_lengths)
+    if text_content_vector_rep is None:
+        logger.warning(
+            'no tokens to vectorize in text content of <Fulltext(study_id=%s)>',
+            fulltext_id)
+        return
+
+    with engine.begin() as conn:
+        # only update if the text content hasn't changed since it was read
         stmt = update(Fulltext)\
             .where(Fulltext.id == fulltext_id)\
+            .where(Fulltext.content_hash == content_hash)\
             .values(text_content_vector_rep=text_content_vector_rep)
-        conn.execute(stmt)
+        if conn.execute(stmt).rowcount == 0:
+            logger.info(
+                'text content of <Fulltext(study_id=%s)> changed during vectorization',
+                fulltext_id)
+            return
+        if content_hash is not None:
+            stmt = update(Fulltext)\
+                .where(Fulltext.content_hash == content_hash)\
+                .where(Fulltext.text_content_vector_rep == None)\
+                .values(text_content_vector_rep=text_content_vector_rep)
+            conn.execute(stmt)
+        if current_app.config['FULLTEXT_PASSAGE_VECTORS'] is True:
+            conn.execute(
+                delete(FulltextPassage).where(FulltextPassage.fulltext_id == fulltext_id))
+            conn.execute(
+                FulltextPassage.__table__.insert(),
+                [{'fulltext_id': fulltext_id,
+                  'review_id': review_id,
+                  'passage_index': passage_index,
+                  'start_offset': start,
+                  'end_offset': end,
+                  'text_content_vector_rep': vector}
+                 for passage_index, ((start, end, _), vector)
+                 in enumerate(zip(passages, passage_vectors))])
 
-        lock.release()
+    logger.info(
+        '<Review(id=%s)>: vectorized <Fulltext(study_id=%s)> from %s passages',
+        review_id, fulltext_id, len(passages))
 
 
 @celery.task
@@ -460,9 +1030,7 @@ def suggest_keyterms(review_id, sample_size):
         '<Review(id=%s)>: computing keyterms with sample size = %s',
         review_id, sample_size)
 
-    engine = create_engine(
-        current_app.config['SQLALCHEMY_DATABASE_URI'],
-        server_side_cursors=True, echo=False)
+    engine = get_engine(server_side_cursors=True)
     with engine.connect() as conn:
         # get random sample of included citations
         stmt = select([Study.citation_status, Citation.text_content])\
@@ -513,6 +1081,8 @@ def suggest_keyterms(review_id, sample_size):
 
     lock.release()
 
+    compute_citation_relevance_scores.apply_async(args=[review_id])
+
 
 @celery.task
 def train_citation_ranking_model(review_id):
@@ -521,54 +1091,338 @@ def train_citation_ranking_model(review_id):
         'train_citation_ranking_model_review_id={}'.format(review_id), expire=60)
     logger.info('<Review(id=%s)>: training citation ranking model', review_id)
 
-    engine = create_engine(
-        current_app.config['SQLALCHEMY_DATABASE_URI'],
-        server_side_cursors=True, echo=False)
+    engine = get_engine(server_side_cursors=True)
     with engine.connect() as conn:
 
-        # make sure at least some citations have had their
-        n_iters = 1
-        while True:
-            stmt = select(
-                [exists().where(Citation.review_id == review_id).where(Citation.text_content_vector_rep != [])])
+        # make sure at least some citations have had their text content vectorized;
+        # if not, defer training until get_citations_text_content_vectors is done
+        stmt = select(
+            [exists().where(Citation.review_id == review_id).where(Citation.text_content_vector_rep != None)])
+        citations_ready = conn.execute(stmt).fetchone()[0]
+        if citations_ready is False:
+            REDIS_CONN.sadd(PENDING_RANKING_MODELS_KEY, review_id)
+            # vectors may have been committed -- and pending models checked for --
+            # in the meantime, in which case nothing else would kick off training;
+            # whoever removes the review from the pending set does the training
             citations_ready = conn.execute(stmt).fetchone()[0]
-            if citations_ready is True:
-                break
-            else:
-                logger.debug(
-                    '<Review(id=%s)>: waiting for vectorized text content for, %s',
-                    review_id, n_iters)
-                sleep(30)
-            if n_iters > 6:
-                logger.error(
-                    '<Review(id=%s)>: no citations with vectorized text content found',
+            if citations_ready is False:
+                logger.info(
+                    '<Review(id=%s)>: no vectorized text content yet, deferring training',
+                    review_id)
+                lock.release()
+                return
+            if not REDIS_CONN.srem(PENDING_RANKING_MODELS_KEY, review_id):
+                logger.info(
+                    '<Review(id=%s)>: training already kicked off by vectorization',
                     review_id)
                 lock.release()
                 return
-            n_iters += 1
 
-        # get random sample of included citations
-        stmt = select([Citation.text_content_vector_rep, Study.citation_status])\
-            .where(Study.id == Citation.id)\
+        # get labels for all screened citations; their vectors come from the cache
+        stmt = select([Study.id, Study.citation_status])\
             .where(Study.review_id == review_id)\
             .where(Study.dedupe_status == 'not_duplicate')\
-            .where(Study.citation_status.in_(['included', 'excluded']))\
-            .where(Citation.text_content_vector_rep != [])
-        results = conn.execute(stmt).fetchall()
+            .where(Study.citation_status.in_(['included', 'excluded']))
+        citation_statuses = dict(conn.execute(stmt).fetchall())
+
+    ids, X = load_feature_matrix(review_id)
+    if ids is None:
+        ids, X = _build_citation_feature_matrix(review_id)
 
     # build features matrix and labels vector
-    X = np.vstack(tuple(result[0] for result in results))
-    y = np.array(tuple(1 if result[1] == 'included' else 0 for result in results))
+    citation_ids, rows = get_feature_matrix_rows(ids, list(citation_statuses.keys()))
+    X = np.asarray(X[rows])
+    y = np.array(tuple(1 if citation_statuses[cid] == 'included' else 0
+                       for cid in citation_ids))
 
     # train the classifier
     clf = SGDClassifier(class_weight='balanced').fit(X, y)
 
     # save to disk!
-    fname = CITATION_RANKING_MODEL_FNAME.format(review_id=review_id)
-    filepath = os.path.join(
-        current_app.config['RANKING_MODELS_DIR'], str(review_id), fname)
-    joblib.dump(clf, filepath)
+    filepath = save_ranking_model(review_id, clf)
     logger.info(
         '<Review(id=%s)>: citation ranking model saved to %s', review_id, filepath)
 
     lock.release()
+
+    compute_citation_relevance_scores.apply_async(args=[review_id])
+
+
+@celery.task
+def compute_citation_relevance_scores(review_id):
+    """
+    Score every citation in a review by its expected relevance, and store
+    the results in ``Study.relevance_score`` so that relevance ordering is just
+    an indexed ``ORDER BY``. In order of preference, scores come from:
+    the review's trained citation ranking model, its suggested keyterms,
+    or its reviewer-specified keyterms; otherwise, scores are left NULL.
+    """
+    # NOTE: the lock is renewed in the background for as long as this runs
+    lock = wait_for_lock(
+        'compute_citation_relevance_scores_review_id={}'.format(review_id), expire=60)
+    try:
+        _compute_citation_relevance_scores(review_id)
+    finally:
+        lock.release()
+
+
+def _compute_citation_relevance_scores(review_id):
+    chunk_size = current_app.config['VECTORIZATION_CHUNK_SIZE']
+    scores = None
+    score_func = None
+
+    # best option: we have a trained citation ranking model
+    clf = get_ranking_model(review_id)
+    logger.debug('ranking model cache stats: %s', get_ranking_model_cache_stats())
+    if clf is not None:
+        ids, X = load_feature_matrix(review_id)
+        if ids is None:
+            ids, X = _build_citation_feature_matrix(review_id)
+        scores = (
+            (id_, score)
+            for start in range(0, ids.shape[0], chunk_size)
+            for id_, score in zip(ids[start: start + chunk_size].tolist(),
+                                  clf.decision_function(X[start: start + chunk_size]).tolist()))
+        method = 'ranking model'
+
+    # next best options: positive and negative keyterms, or just reviewer terms
+    if scores is None:
+        with get_engine().connect() as conn:
+            stmt = select([ReviewPlan.suggested_keyterms, ReviewPlan.keyterms])\
+                .where(ReviewPlan.id == review_id)
+            suggested_keyterms, keyterms = conn.execute(stmt).fetchone()
+        if suggested_keyterms:
+            incl_regex, excl_regex = reviewer_terms.get_incl_excl_terms_regex(
+                suggested_keyterms)
+            score_func = functools.partial(
+                reviewer_terms.get_incl_excl_terms_score, incl_regex, excl_regex)
+            method = 'suggested keyterms'
+        elif keyterms:
+            keyterms_regex = reviewer_terms.get_keyterms_regex(keyterms)
+            score_func = functools.partial(
+                reviewer_terms.get_keyterms_score, keyterms_regex)
+            method = 'keyterms'
+        else:
+            method = None
+
+    # compute all scores up front, so no study rows are locked while scoring
+    if scores is None and score_func is not None:
+        with get_engine(server_side_cursors=True).connect() as conn:
+            stmt = select([Citation.id, Citation.text_content])\
+                .where(Citation.review_id == review_id)
+            scores = [(id_, score_func(text_content))
+                      for id_, text_content in conn.execute(stmt)]
+    elif scores is not None:
+        scores = list(scores)
+    else:
+        scores = []
+
+    # then write them in short transactions, one chunk at a time, so screeners'
+    # concurrent updates to the review's studies only ever wait on a chunk
+    engine = get_engine()
+    for chunk in iter_chunks(scores, chunk_size):
+        ids, chunk_scores = zip(*chunk)
+        with engine.begin() as conn:
+            conn.execute(
+                UPDATE_RELEVANCE_SCORES,
+                review_id=review_id, ids=list(ids), scores=list(chunk_scores))
+    # and clear stale scores of any studies that weren't scored this time
+    scored_ids = {id_ for id_, _ in scores}
+    with engine.connect() as conn:
+        stmt = select([Study.id])\
+            .where(Study.review_id == review_id)\
+            .where(Study.relevance_score != None)
+        unscored_ids = [id_ for id_, in conn.execute(stmt) if id_ not in scored_ids]
+    for chunk in iter_chunks(unscored_ids, chunk_size):
+        with engine.begin() as conn:
+            conn.execute(
+                update(Study)
+                .where(Study.id.in_(chunk))
+                .values(relevance_score=None))
+    logger.info(
+        '<Review(id=%s)>: %s citation relevance scores computed via %s (%s cleared)',
+        review_id, len(scores), method, len(unscored_ids))
+
+
+def _get_studies_export_row(result, extraction_fields):
+    row = [
+        result.id,
+        result.dedupe_status,
+        result.citation_status,
+        result.fulltext_status,
+        result.data_extraction_status,
+        result.source_type,
+        result.source_name,
+        result.source_url,
+        result.title,
+        result.abstract,
+        result.authors,
+        result.journal_name,
+        result.volume,
+        result.pub_year,
+        result.keywords,
+        ]
+    if result.fulltext_id is not None:
+        row.extend(
+            [result.original_filename,
+             sorted(result.exclude_reasons) if result.exclude_reasons else None])
+    else:
+        row.extend([None, None])
+    if extraction_fields:
+        extracted_items = result.extracted_items \
+            if result.data_extraction_id is not None else None
+        row.extend(get_extracted_values(extracted_items, extraction_fields))
+    return row
+
+
+@celery.task
+def export_review_data(review_id, fmt):
+    """
+    Export a review's studies (including typed extracted data) and screenings
+    as columnar files in format ``fmt``, for download once finished.
+    """
+    lock = wait_for_lock(
+        'export_review_data_review_id={}_fmt={}'.format(review_id, fmt), expire=60)
+
+    exports_dir = current_app.config['EXPORTS_DIR']
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    extraction_fields = get_data_extraction_fields(review_id)
+
+    exports = (
+        ('studies', get_studies_schema(extraction_fields), get_studies_export_query(review_id),
+         functools.partial(_get_studies_export_row, extraction_fields=extraction_fields)),
+        ('screenings', get_screenings_schema(), get_screenings_export_query(review_id),
+         list),
+        )
+    with get_engine(server_side_cursors=True).connect() as conn:
+        for table_name, schema, query, get_row in exports:
+            writer = ColumnarWriter(
+                get_export_filepath(exports_dir, review_id, table_name, fmt), schema, fmt)
+            try:
+                results = conn.execute(query)
+                while True:
+                    chunk = results.fetchmany(batch_size)
+                    if not chunk:
+                        break
+                    writer.write_rows([get_row(result) for result in chunk])
+            except Exception:
+                writer.discard()
+                raise
+            writer.close()
+            logger.info(
+                '<Review(id=%s)>: %s %s exported to %s',
+                review_id, writer.n_rows, table_name, writer.filepath)
+
+    lock.release()
+
+
+REVIEW_STATUS_COUNTS_GROUND_TRUTH = """
+    SELECT review_id, 'citation_screening' AS stage, citation_status AS status, COUNT(*) AS count
+    FROM studies
+    WHERE review_id = ANY(:review_ids)
+    GROUP BY review_id, citation_status
+    UNION ALL
+    SELECT review_id, 'fulltext_screening', fulltext_status, COUNT(*)
+    FROM studies
+    WHERE review_id = ANY(:review_ids) AND citation_status = 'included'
+    GROUP BY review_id, fulltext_status
+    UNION ALL
+    SELECT review_id, 'data_extraction', data_extraction_status, COUNT(*)
+    FROM studies
+    WHERE review_id = ANY(:review_ids) AND citation_status = 'included' AND fulltext_status = 'included'
+    GROUP BY review_id, data_extraction_status
+    """
+
+REVIEW_COUNTER_COLUMNS = {
+    ('citation_screening', 'included'): 'num_citations_included',
+    ('citation_screening', 'excluded'): 'num_citations_excluded',
+    ('fulltext_screening', 'included'): 'num_fulltexts_included',
+    ('fulltext_screening', 'excluded'): 'num_fulltexts_excluded',
+    }
+
+
+@celery.task
+def reconcile_review_status_counts(review_id=None):
+    """
+    Compact reviews' trigger-appended status count changes into one row per
+    count, checking their sums -- and the corresponding ``Review.num_*``
+    counters -- against counts computed from scratch along the way, and
+    fixing any that have drifted. If ``review_id`` is None, do all reviews.
+    """
+    engine = get_engine()
+    with engine.connect() as conn:
+        if review_id is None:
+            review_ids = [row[0] for row in conn.execute(select([Review.id]))]
+        else:
+            review_ids = [review_id]
+    n_fixed = 0
+    for chunk in iter_chunks(review_ids, 100):
+        n_fixed += _reconcile_review_status_counts(engine, list(chunk))
+    logger.info(
+        'reconciled status counts for %s reviews; %s counts fixed',
+        len(review_ids), n_fixed)
+
+
+def _reconcile_review_status_counts(engine, review_ids, max_attempts=3):
+    """
+    Returns:
+        int: number of status counts that had drifted and were fixed
+    """
+    # read studies and appended changes from one snapshot, in which they always
+    # agree; changes appended after it are left alone, so nothing needs locking
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with engine.connect() as conn:
+                conn = conn.execution_options(isolation_level='REPEATABLE READ')
+                with conn.begin():
+                    return _compact_review_status_counts(conn, review_ids)
+        except OperationalError as e:
+            # e.g. a review's counters were updated or it was deleted concurrently
+            if getattr(e.orig, 'pgcode', None) != '40001' or attempt == max_attempts:
+                raise
+            logger.info(
+                'serialization failure reconciling status counts for reviews %s, retrying',
+                review_ids)
+
+
+def _compact_review_status_counts(conn, review_ids):
+    stmt = select([ReviewStatusCount.id, ReviewStatusCount.review_id,
+                   ReviewStatusCount.stage, ReviewStatusCount.status,
+                   ReviewStatusCount.count])\
+        .where(ReviewStatusCount.review_id.in_(review_ids))
+    change_ids = []
+    counts = collections.Counter()
+    for change_id, rid, stage, status, count in conn.execute(stmt):
+        change_ids.append(change_id)
+        counts[(rid, stage, status)] += count
+    true_counts = {
+        (rid, stage, status): count
+        for rid, stage, status, count in conn.execute(
+            text(REVIEW_STATUS_COUNTS_GROUND_TRUTH), review_ids=review_ids)}
+    n_fixed = 0
+    for key in sorted(set(counts) | set(true_counts)):
+        count = counts.get(key, 0)
+        true_count = true_counts.get(key, 0)
+        if count != true_count:
+            logger.warning(
+                '<Review(id=%s)>: %s "%s" status count = %s, but should be %s',
+                key[0], key[1], key[2], count, true_count)
+            n_fixed += 1
+    # replace all of the changes seen with a single row per count
+    for ids in iter_chunks(change_ids, 10000):
+        conn.execute(delete(ReviewStatusCount).where(ReviewStatusCount.id.in_(ids)))
+    rows = [{'review_id': rid, 'stage': stage, 'status': status, 'count': count}
+            for (rid, stage, status), count in sorted(true_counts.items())
+            if count != 0]
+    if rows:
+        conn.execute(ReviewStatusCount.__table__.insert(), rows)
+    # only touch reviews whose counters are off, since screenings update them too
+    stmt = select([Review.id] + [getattr(Review, column)
+                                 for column in REVIEW_COUNTER_COLUMNS.values()])\
+        .where(Review.id.in_(review_ids))
+    for row in conn.execute(stmt).fetchall():
+        values = {column: true_counts.get((row.id, stage, status), 0)
+                  for (stage, status), column in REVIEW_COUNTER_COLUMNS.items()}
+        if any(row[column] != value for column, value in values.items()):
+            conn.execute(update(Review).where(Review.id == row.id).values(**values))
+    return n_fixed
@@ -1,11 +1,16 @@
+import functools
 import os
 import shutil
 
 from flask_script import Manager, prompt_bool
 from flask_migrate import MigrateCommand
+from sqlalchemy import update
 
 from colandr import create_app, db
-from colandr.models import User
+from colandr.api.uploads import lock_blob
+from colandr.lib.blobs import get_fulltext_relpath, hash_file, save_blob_from_path
+from colandr.lib.utils import iter_chunks
+from colandr.models import Fulltext, User
 from colandr.config import configs
 
 
@@ -22,13 +27,13 @@ manager.add_command('db', MigrateCommand)
 def reset():
     """
     Drop and then create all tables in the database, clear out all uploaded
-    fulltext files and ranking models on disk, and create an admin user.
+    fulltext files, ranking models, and exports on disk, and create an admin user.
     """
     if prompt_bool("Are you sure you want to reset ALL app data?") is False:
         return
     db.drop_all()
     db.create_all()
-    for dirkey in ('FULLTEXT_UPLOADS_DIR', 'RANKING_MODELS_DIR'):
+    for dirkey in ('FULLTEXT_UPLOADS_DIR', 'RANKING_MODELS_DIR', 'EXPORTS_DIR'):
         shutil.rmtree(manager.app.config[dirkey], ignore_errors=True)
         os.makedirs(manager.app.config[dirkey], exist_ok=True)
 
@@ -52,5 +57,72 @@ def add_admin(name, email, password):
         db.session.rollback()
 
 
+@manager.option('--dry_run', dest='dry_run', action='store_true', default=False,
+                help="only report what would be done, without moving files or updating the db")
+@manager.option('--batch_size', dest='batch_size', type=int, default=500,
+                help="number of fulltexts updated in the db per transaction")
+def migrate_fulltext_uploads(dry_run, batch_size):
+    """
+    Move fulltext files uploaded before content-addressed storage -- saved as
+    `<FULLTEXT_UPLOADS_DIR>/<review_id>/<filename>` -- into the blob store,
+    pointing each fulltext at its file's content hash. Identical files are
+    stored only once. Safe to re-run; already migrated fulltexts are skipped.
+    """
+    uploads_dir = manager.app.config['FULLTEXT_UPLOADS_DIR']
+    results = db.session.query(Fulltext.id, Fulltext.review_id, Fulltext.filename)\
+        .filter(Fulltext.filename != None, Fulltext.content_hash == None)\
+        .order_by(Fulltext.id)\
+        .all()
+    seen_hashes = set()
+    n_stored = n_deduped = n_missing = 0
+    for batch in iter_chunks(results, batch_size):
+        content_hashes = {}
+        filepaths = {}
+        for fulltext_id, review_id, filename in batch:
+            filepath = os.path.join(uploads_dir, get_fulltext_relpath(review_id, filename))
+            if not os.path.isfile(filepath):
+                print('no uploaded file found for <Fulltext(study_id={})> at {}'.format(
+                    fulltext_id, filepath))
+                n_missing += 1
+                continue
+            if dry_run is True:
+                with open(filepath, mode='rb') as f:
+                    content_hash = hash_file(f)
+                is_new = not (
+                    content_hash in seen_hashes or
+                    os.path.isfile(os.path.join(
+                        uploads_dir, get_fulltext_relpath(review_id, filename, content_hash))))
+                seen_hashes.add(content_hash)
+            else:
+                content_hash, is_new = save_blob_from_path(
+                    filepath, uploads_dir, lock=functools.partial(lock_blob, db.session))
+            content_hashes[fulltext_id] = (filename, content_hash)
+            filepaths[fulltext_id] = filepath
+            if is_new:
+                n_stored += 1
+            else:
+                n_deduped += 1
+        if dry_run is False and content_hashes:
+            # skip fulltexts whose files were re-uploaded or deleted in the meantime
+            migrated_ids = []
+            for fulltext_id, (filename, content_hash) in content_hashes.items():
+                result = db.session.execute(
+                    update(Fulltext)
+                    .where(Fulltext.id == fulltext_id)
+                    .where(Fulltext.content_hash == None)
+                    .where(Fulltext.filename == filename)
+                    .values(content_hash=content_hash))
+                if result.rowcount:
+                    migrated_ids.append(fulltext_id)
+            db.session.commit()
+            # only remove the original files once fulltexts point at their blobs
+            for fulltext_id in migrated_ids:
+                try:
+                    os.remove(filepaths[fulltext_id])
+                except FileNotFoundError:
+                    pass
+    print('{}{} fulltext files stored as blobs, {} duplicates of already-stored blobs, {} missing'.format(
+        '[dry run] ' if dry_run else '', n_stored, n_deduped, n_missing))
+
 if __name__ == '__main__':
     manager.run()
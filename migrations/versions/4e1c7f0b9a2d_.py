@@ -0,0 +1,69 @@
+"""store text content vectors as packed float32 bytes
+
+Revision ID: 4e1c7f0b9a2d
+Revises: de440d9ae8bf
+Create Date: 2026-10-18 10:12:41.503817
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4e1c7f0b9a2d'
+down_revision = 'de440d9ae8bf'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+import numpy as np
+
+
+TABLES = ('citations', 'fulltexts')
+BATCH_SIZE = 5000
+
+
+def _convert_rows(table, from_col, to_col, convert):
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text('SELECT id, {from_col} FROM {table} '
+                    'WHERE id > :last_id AND {from_col} IS NOT NULL '
+                    'ORDER BY id LIMIT :limit'.format(table=table, from_col=from_col)),
+            last_id=last_id, limit=BATCH_SIZE).fetchall()
+        if not rows:
+            break
+        params = [{'_id': id_, 'value': value}
+                  for id_, value in ((id_, convert(value)) for id_, value in rows)
+                  if value is not None]
+        if params:
+            conn.execute(
+                sa.text('UPDATE {table} SET {to_col} = :value WHERE id = :_id'.format(
+                    table=table, to_col=to_col)),
+                params)
+        last_id = rows[-1][0]
+
+
+def _array_to_bytes(value):
+    if not value:
+        return None
+    return np.asarray(value, dtype=np.float32).tobytes()
+
+
+def _bytes_to_array(value):
+    return np.frombuffer(value, dtype=np.float32).tolist()
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('text_content_vector_rep_f32', sa.LargeBinary(), nullable=True))
+        _convert_rows(table, 'text_content_vector_rep', 'text_content_vector_rep_f32', _array_to_bytes)
+        op.drop_column(table, 'text_content_vector_rep')
+        op.alter_column(table, 'text_content_vector_rep_f32', new_column_name='text_content_vector_rep')
+
+
+def downgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('text_content_vector_rep_f8', postgresql.ARRAY(sa.Float()), server_default='{}', nullable=True))
+        _convert_rows(table, 'text_content_vector_rep', 'text_content_vector_rep_f8', _bytes_to_array)
+        op.drop_column(table, 'text_content_vector_rep')
+        op.alter_column(table, 'text_content_vector_rep_f8', new_column_name='text_content_vector_rep')
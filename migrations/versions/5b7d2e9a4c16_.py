@@ -0,0 +1,128 @@
+"""add transactionally maintained review status counts
+
+Revision ID: 5b7d2e9a4c16
+Revises: c3a8e5d17f40
+Create Date: 2026-10-18 16:03:27.114208
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2e9a4c16'
+down_revision = 'c3a8e5d17f40'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+REVIEW_STATUS_COUNTS_DDL = [
+    # triggers fire once per statement, not per row: all of a statement's changed
+    # studies -- old versions at -1, new versions at +1 -- are expanded into their
+    # (stage, status) pairs and net deltas summed, then appended as new rows; no
+    # existing row is ever updated, so concurrent writers -- e.g. a long-running
+    # import and screeners of the same review -- never wait on each other
+    """
+    CREATE OR REPLACE FUNCTION update_review_status_counts()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        _changes TEXT;
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            _changes := 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, 1 AS delta FROM new_studies';
+        ELSIF TG_OP = 'DELETE' THEN
+            _changes := 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, -1 AS delta FROM old_studies';
+        ELSE
+            _changes := 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, -1 AS delta FROM old_studies'
+                        || ' UNION ALL '
+                        || 'SELECT review_id, citation_status, fulltext_status, data_extraction_status, 1 AS delta FROM new_studies';
+        END IF;
+        EXECUTE format($sql$
+            INSERT INTO review_status_counts (review_id, stage, status, count)
+            SELECT changes.review_id, stages.stage, stages.status, SUM(changes.delta)
+            FROM (%s) AS changes,
+                LATERAL (VALUES
+                    ('citation_screening', changes.citation_status),
+                    ('fulltext_screening', CASE WHEN changes.citation_status = 'included' THEN changes.fulltext_status END),
+                    ('data_extraction', CASE WHEN changes.citation_status = 'included' AND changes.fulltext_status = 'included' THEN changes.data_extraction_status END)
+                    ) AS stages (stage, status)
+            WHERE stages.status IS NOT NULL
+                -- a review being deleted takes all of its counts with it
+                AND EXISTS (SELECT 1 FROM reviews WHERE reviews.id = changes.review_id)
+            GROUP BY changes.review_id, stages.stage, stages.status
+            HAVING SUM(changes.delta) <> 0
+            $sql$, _changes);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    # statement-level triggers with transition tables can't share events or
+    # list columns, so there's one per event; updates that change none of the
+    # counted columns net out to no deltas
+    """
+    DROP TRIGGER IF EXISTS studies_review_status_counts_insert_trigger ON studies;
+    CREATE TRIGGER studies_review_status_counts_insert_trigger
+    AFTER INSERT ON studies
+    REFERENCING NEW TABLE AS new_studies
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE update_review_status_counts();
+    """,
+    """
+    DROP TRIGGER IF EXISTS studies_review_status_counts_update_trigger ON studies;
+    CREATE TRIGGER studies_review_status_counts_update_trigger
+    AFTER UPDATE ON studies
+    REFERENCING OLD TABLE AS old_studies NEW TABLE AS new_studies
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE update_review_status_counts();
+    """,
+    """
+    DROP TRIGGER IF EXISTS studies_review_status_counts_delete_trigger ON studies;
+    CREATE TRIGGER studies_review_status_counts_delete_trigger
+    AFTER DELETE ON studies
+    REFERENCING OLD TABLE AS old_studies
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE update_review_status_counts();
+    """,
+    ]
+
+BACKFILL_REVIEW_STATUS_COUNTS = """
+    INSERT INTO review_status_counts (review_id, stage, status, count)
+    SELECT review_id, 'citation_screening', citation_status, COUNT(*)
+    FROM studies
+    GROUP BY review_id, citation_status
+    UNION ALL
+    SELECT review_id, 'fulltext_screening', fulltext_status, COUNT(*)
+    FROM studies
+    WHERE citation_status = 'included'
+    GROUP BY review_id, fulltext_status
+    UNION ALL
+    SELECT review_id, 'data_extraction', data_extraction_status, COUNT(*)
+    FROM studies
+    WHERE citation_status = 'included' AND fulltext_status = 'included'
+    GROUP BY review_id, data_extraction_status
+    """
+
+
+def upgrade():
+    op.create_table(
+        'review_status_counts',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('review_id', sa.Integer(), nullable=False),
+        sa.Column('stage', sa.Unicode(length=20), nullable=False),
+        sa.Column('status', sa.Unicode(length=20), nullable=False),
+        sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['review_id'], ['reviews.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+    op.create_index('review_status_counts_review_id_stage_status_idx', 'review_status_counts', ['review_id', 'stage', 'status'], unique=False)
+    # lock out concurrent study writes between backfilling and adding the trigger
+    op.execute('LOCK TABLE studies IN SHARE ROW EXCLUSIVE MODE')
+    op.execute(BACKFILL_REVIEW_STATUS_COUNTS)
+    for ddl in REVIEW_STATUS_COUNTS_DDL:
+        op.execute(ddl)
+
+
+def downgrade():
+    for event in ('insert', 'update', 'delete'):
+        op.execute('DROP TRIGGER IF EXISTS studies_review_status_counts_{}_trigger ON studies'.format(event))
+    op.execute('DROP FUNCTION IF EXISTS update_review_status_counts()')
+    op.drop_index('review_status_counts_review_id_stage_status_idx', table_name='review_status_counts')
+    op.drop_table('review_status_counts')
@@ -0,0 +1,28 @@
+"""add import job status, failed record counts, and last updated time to imports
+
+Revision ID: 8e1f4a6c2d93
+Revises: 5b7d2e9a4c16
+Create Date: 2026-10-18 17:21:09.482731
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8e1f4a6c2d93'
+down_revision = '5b7d2e9a4c16'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('imports', sa.Column('import_status', sa.Unicode(length=20), server_default='finished', nullable=False))
+    op.add_column('imports', sa.Column('num_records_failed', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('imports', sa.Column('original_filename', sa.Unicode(), nullable=True))
+    op.add_column('imports', sa.Column('last_updated', sa.TIMESTAMP(), server_default=sa.text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"), nullable=False))
+
+
+def downgrade():
+    op.drop_column('imports', 'last_updated')
+    op.drop_column('imports', 'original_filename')
+    op.drop_column('imports', 'num_records_failed')
+    op.drop_column('imports', 'import_status')
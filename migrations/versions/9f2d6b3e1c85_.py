@@ -0,0 +1,33 @@
+"""add precomputed study relevance scores
+
+Revision ID: 9f2d6b3e1c85
+Revises: 4e1c7f0b9a2d
+Create Date: 2026-10-18 13:47:05.218390
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9f2d6b3e1c85'
+down_revision = '4e1c7f0b9a2d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('studies', sa.Column('relevance_score', sa.Float(), nullable=True))
+    # match the ORDER BYs used to list studies by relevance, in both directions
+    op.create_index(
+        'studies_review_id_relevance_score_desc_idx', 'studies',
+        ['review_id', sa.text('relevance_score DESC NULLS LAST'), sa.text('id DESC')],
+        unique=False)
+    op.create_index(
+        'studies_review_id_relevance_score_asc_idx', 'studies',
+        ['review_id', sa.text('relevance_score ASC NULLS LAST'), sa.text('id DESC')],
+        unique=False)
+
+
+def downgrade():
+    op.drop_index('studies_review_id_relevance_score_asc_idx', table_name='studies')
+    op.drop_index('studies_review_id_relevance_score_desc_idx', table_name='studies')
+    op.drop_column('studies', 'relevance_score')
@@ -0,0 +1,23 @@
+"""add composite indexes for per-user screening queues
+
+Revision ID: c3a8e5d17f40
+Revises: 9f2d6b3e1c85
+Create Date: 2026-10-18 15:12:41.603927
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3a8e5d17f40'
+down_revision = '9f2d6b3e1c85'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index('studies_review_id_citation_status_idx', 'studies', ['review_id', 'citation_status'], unique=False)
+    op.create_index('studies_review_id_fulltext_status_idx', 'studies', ['review_id', 'fulltext_status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('studies_review_id_fulltext_status_idx', table_name='studies')
+    op.drop_index('studies_review_id_citation_status_idx', table_name='studies')
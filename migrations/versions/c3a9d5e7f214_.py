@@ -0,0 +1,24 @@
+"""add content hash of uploaded file to fulltexts
+
+Revision ID: c3a9d5e7f214
+Revises: 8e1f4a6c2d93
+Create Date: 2026-10-18 19:02:47.118305
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3a9d5e7f214'
+down_revision = '8e1f4a6c2d93'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('fulltexts', sa.Column('content_hash', sa.Unicode(length=64), nullable=True))
+    op.create_index(op.f('ix_fulltexts_content_hash'), 'fulltexts', ['content_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_fulltexts_content_hash'), table_name='fulltexts')
+    op.drop_column('fulltexts', 'content_hash')
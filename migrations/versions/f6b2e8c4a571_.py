@@ -0,0 +1,39 @@
+"""add fulltext passages table, for passage-level text content vectors
+
+Revision ID: f6b2e8c4a571
+Revises: c3a9d5e7f214
+Create Date: 2026-10-18 20:14:33.650192
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f6b2e8c4a571'
+down_revision = 'c3a9d5e7f214'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'fulltext_passages',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('fulltext_id', sa.BigInteger(), nullable=False),
+        sa.Column('review_id', sa.Integer(), nullable=False),
+        sa.Column('passage_index', sa.Integer(), nullable=False),
+        sa.Column('start_offset', sa.Integer(), nullable=False),
+        sa.Column('end_offset', sa.Integer(), nullable=False),
+        sa.Column('text_content_vector_rep', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['fulltext_id'], ['fulltexts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['review_id'], ['reviews.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('fulltext_id', 'passage_index', name='fulltext_passage_index_uc')
+        )
+    op.create_index(op.f('ix_fulltext_passages_fulltext_id'), 'fulltext_passages', ['fulltext_id'], unique=False)
+    op.create_index(op.f('ix_fulltext_passages_review_id'), 'fulltext_passages', ['review_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_fulltext_passages_review_id'), table_name='fulltext_passages')
+    op.drop_index(op.f('ix_fulltext_passages_fulltext_id'), table_name='fulltext_passages')
+    op.drop_table('fulltext_passages')
@@ -1,6 +1,9 @@
 package org.datakind.ci.pdfestrian.pdfExtraction
 
-import java.io.{BufferedWriter, File, FileWriter}
+import java.io.{BufferedReader, BufferedWriter, File, FileWriter, InputStreamReader, OutputStreamWriter}
+import java.net.{InetAddress, ServerSocket, Socket}
+import java.nio.charset.StandardCharsets
+import java.util.concurrent.Executors
 
 import org.apache.pdfbox.pdmodel.PDDocument
 import org.apache.pdfbox.text.PDFTextStripper
@@ -117,4 +120,58 @@ object ExtractHtmlDirectory {
       out.close()
     }
   }
-}
\ No newline at end of file
+}
+
+/**
+  * Long-running text extraction server, so that callers don't pay for JVM startup
+  * and class loading on every PDF. Listens on a local port; each connection sends
+  * one line with the file path of a PDF, and gets back its extracted text (empty
+  * if extraction failed) before the connection is closed.
+  */
+object ExtractTextServer {
+
+  case class ExtractTextServerConfig(host : String = "localhost", port : Int = 8081, numThreads : Int = 4)
+  val parser = new scopt.OptionParser[ExtractTextServerConfig]("extractTextServer") {
+    head("extractTextServer", "0.1")
+
+    opt[String]("host").action((x, c) =>
+      c.copy(host = x)).text("host address on which to listen, default: localhost")
+
+    opt[Int]('p', "port").action((x, c) =>
+      c.copy(port = x)).text("port on which to listen, default: 8081")
+
+    opt[Int]('n', "numThreads").action((x, c) =>
+      c.copy(numThreads = x)).text("number of pdfs to extract at once, default: 4")
+  }
+
+  def handle(socket : Socket) : Unit = {
+    try {
+      val in = new BufferedReader(new InputStreamReader(socket.getInputStream, StandardCharsets.UTF_8))
+      val filename = Option(in.readLine()).map(_.trim).getOrElse("")
+      val txt = if(filename.nonEmpty) ExtractText.extractText(filename) else ""
+      val out = new BufferedWriter(new OutputStreamWriter(socket.getOutputStream, StandardCharsets.UTF_8))
+      out.write(txt)
+      out.flush()
+    } catch {
+      case e : Exception => println("Error extracting text: " + e.getMessage)
+    } finally {
+      socket.close()
+    }
+  }
+
+  def main(args : Array[String]) : Unit = {
+    parser.parse(args, ExtractTextServerConfig()) match {
+      case Some(config) =>
+        val pool = Executors.newFixedThreadPool(config.numThreads)
+        val server = new ServerSocket(config.port, 50, InetAddress.getByName(config.host))
+        println(s"Extracting text on ${config.host}:${config.port} with ${config.numThreads} threads")
+        while(true) {
+          val socket = server.accept()
+          pool.execute(new Runnable {
+            def run() : Unit = handle(socket)
+          })
+        }
+      case None =>
+    }
+  }
+}
@@ -6,6 +6,7 @@ import os
 import random
 from pprint import pprint
 import sys
+import time
 
 from colandr import create_app
 from colandr.config import configs
@@ -320,6 +321,14 @@ def main():
             files={'uploaded_file': (filename, io.open(citations_file, mode='rb'))},
             auth=auth)
         print('POST:', citations_file, '=>', response.url)
+        # citations are imported in the background, so wait for them to finish
+        import_id = response.json()['id']
+        while True:
+            response = session.request(
+                'GET', BASE_URL + 'citations/imports/{}'.format(import_id), auth=auth)
+            if response.json()['import_status'] in ('finished', 'failed'):
+                break
+            time.sleep(1)
 
     # add tags to a small random sample of studies
     results = session.request(
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+"""
+Benchmark parsing of citations files -- RIS (.ris, .txt) and BibTeX (.bib) --
+reporting CPU seconds per 10k records, so that runs on the commits before and
+after a change to the parsers are directly comparable. By default, all citations
+files in ``scripts/data`` are parsed; a synthetic Web of Science-style RIS file
+or BibTeX file with ``--synthetic N`` records can be parsed instead, if no sample
+files are handy. BibTeX files are parsed in chunks of entries, unless ``--whole_file``
+is given, which parses them all at once, as before; compare the two's peak memory
+use with ``--memory``:
+
+    $ python scripts/benchmark_parsers.py --repeat 3
+    $ python scripts/benchmark_parsers.py --synthetic 10000 --n_jobs 4
+    $ python scripts/benchmark_parsers.py --synthetic 10000 --format bib --memory --whole_file
+
+NOTE: CPU seconds are only counted for the benchmarking process itself,
+so compare wall seconds when parsing with ``--n_jobs`` greater than 1.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import glob
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from colandr.lib.parsers import BibTexFile, RisFile
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+PARSERS = {'.bib': BibTexFile, '.ris': RisFile, '.txt': RisFile}
+
+WORDS = ('the of and in to a is for on with by as at from that are this be was '
+         'an effect model data study results analysis use climate forest').split()
+
+
+def write_synthetic_ris_file(filepath, n_records, seed=42):
+    """Write ``n_records`` Web of Science-style RIS records to ``filepath``."""
+    rand = random.Random(seed)
+
+    def words(n):
+        return ' '.join(rand.choice(WORDS) for _ in range(n))
+
+    with io.open(filepath, mode='wt') as f:
+        f.write('FN Clarivate Analytics Web of Science\nVR 1.0\n')
+        for i in range(n_records):
+            authors = ['{}, {}'.format(words(1).title(), rand.choice('ABCDEFG'))
+                       for _ in range(rand.randint(1, 8))]
+            lines = ['PT J', 'AU ' + authors[0]]
+            lines.extend('   ' + author for author in authors[1:])
+            lines.extend([
+                'TI ' + words(12),
+                'SO ' + words(4).upper(),
+                'LA English',
+                'DT Article',
+                'DE ' + '; '.join(words(2) for _ in range(5)),
+                'AB ' + words(200),
+                'TC {}'.format(rand.randint(0, 300)),
+                'SN {:04d}-{:04d}'.format(rand.randint(0, 9999), rand.randint(0, 9999)),
+                'PD ' + rand.choice(['JAN', 'FEB', 'MAR 4', 'SPR']),
+                'PY {}'.format(rand.randint(1990, 2018)),
+                'DA {}/{:02d}/{:02d}'.format(
+                    rand.randint(1990, 2018), rand.randint(1, 12), rand.randint(1, 28)),
+                'DI 10.{}/{}'.format(rand.randint(1000, 9999), i),
+                'WC ' + '; '.join(words(2) for _ in range(3)),
+                'SC ' + '; '.join(words(2) for _ in range(3)),
+                'UT WOS:{:015d}'.format(i),
+                'ER',
+                '',
+                ])
+            f.write('\n'.join(lines) + '\n')
+        f.write('EF\n')
+
+
+def write_synthetic_bibtex_file(filepath, n_records, seed=42):
+    """Write ``n_records`` BibTeX article entries to ``filepath``."""
+    rand = random.Random(seed)
+
+    def words(n):
+        return ' '.join(rand.choice(WORDS) for _ in range(n))
+
+    with io.open(filepath, mode='wt') as f:
+        for i in range(n_records):
+            authors = ' and '.join(
+                '{}, {}'.format(words(1).title(), rand.choice('ABCDEFG'))
+                for _ in range(rand.randint(1, 8)))
+            f.write(
+                '@article{{key{},\n'
+                '  author = {{{}}},\n'
+                '  title = {{{}}},\n'
+                '  journal = {{{}}},\n'
+                '  year = {{{}}},\n'
+                '  month = {{{}}},\n'
+                '  pages = {{{}--{}}},\n'
+                '  keywords = {{{}}},\n'
+                '  abstract = {{{}}}\n'
+                '}}\n\n'.format(
+                    i, authors, words(12), words(4).title(), rand.randint(1990, 2018),
+                    rand.choice(['jan', 'feb', 'mar', '4']), rand.randint(1, 500),
+                    rand.randint(501, 999), '; '.join(words(2) for _ in range(5)),
+                    words(200)))
+
+
+SYNTHETIC_FILE_WRITERS = {
+    'ris': ('.txt', write_synthetic_ris_file),
+    'bib': ('.bib', write_synthetic_bibtex_file),
+    }
+
+
+def benchmark_file(filepath, n_jobs, repeat, whole_file=False, memory=False):
+    ext = os.path.splitext(filepath)[1].lower()
+    parser = PARSERS[ext]
+    parser_kwargs = {'chunk_size': None} if whole_file and ext == '.bib' else {}
+    kwargs = {'n_jobs': n_jobs} if n_jobs > 1 else {}
+    cpu_timings = []
+    wall_timings = []
+    for _ in range(repeat):
+        start_cpu, start_wall = time.process_time(), time.time()
+        n_records = sum(1 for _ in parser(filepath, **parser_kwargs).parse(**kwargs))
+        cpu_timings.append(time.process_time() - start_cpu)
+        wall_timings.append(time.time() - start_wall)
+    cpu_time, wall_time = min(cpu_timings), min(wall_timings)
+    print('{}: {} records, cpu={:.2f}s ({:.2f}s per 10k records), wall={:.2f}s ({:.0f} records/sec)'.format(
+        os.path.basename(filepath), n_records,
+        cpu_time, 10000 * cpu_time / max(n_records, 1),
+        wall_time, n_records / wall_time if wall_time else 0.0))
+    # tracing allocations slows parsing down a lot, so measure memory separately
+    if memory is True:
+        tracemalloc.start()
+        for _ in parser(filepath, **parser_kwargs).parse(**kwargs):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('{}: peak memory={:.1f}MB'.format(os.path.basename(filepath), peak / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark parsing of RIS and BibTeX citations files.')
+    parser.add_argument('filepaths', type=str, nargs='*',
+                        help='citations files to parse; default: all in scripts/data')
+    parser.add_argument('--synthetic', type=int, default=None,
+                        help='parse a synthetic file with this many records instead')
+    parser.add_argument('--format', type=str, default='ris',
+                        choices=sorted(SYNTHETIC_FILE_WRITERS.keys()),
+                        help='file format of the synthetic file')
+    parser.add_argument('--whole_file', action='store_true', default=False,
+                        help='parse BibTeX files all at once, rather than in chunks')
+    parser.add_argument('--memory', action='store_true', default=False,
+                        help='also report peak memory allocated while parsing')
+    parser.add_argument('--n_jobs', type=int, default=1,
+                        help='number of processes among which to split parsing')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of times to parse each file; the fastest run is reported')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        suffix, write_synthetic_file = SYNTHETIC_FILE_WRITERS[args.format]
+        fd, filepath = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            write_synthetic_file(filepath, args.synthetic)
+            benchmark_file(
+                filepath, args.n_jobs, args.repeat,
+                whole_file=args.whole_file, memory=args.memory)
+        finally:
+            os.remove(filepath)
+        return
+
+    filepaths = args.filepaths or sorted(
+        filepath for filepath in glob.glob(os.path.join(DATA_DIR, '*'))
+        if os.path.splitext(filepath)[1].lower() in PARSERS)
+    if not filepaths:
+        print('no citations files found; pass some in, or use --synthetic')
+        return 1
+    for filepath in filepaths:
+        benchmark_file(
+            filepath, args.n_jobs, args.repeat,
+            whole_file=args.whole_file, memory=args.memory)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Benchmark the per-user "pending" and "awaiting_coscreener" screening queue
+queries for a given review and user -- the old ``ARRAY_AGG`` subqueries against
+the current (NOT) EXISTS queries -- optionally printing their query plans.
+Run it against a large review (e.g. 100k studies) in a copy of production data:
+
+    $ python scripts/benchmark_screening_queues.py --review_id 1 --user_id 2 --explain
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select, text
+
+from colandr import create_app, db
+from colandr.api.screening_queues import (
+    citation_awaiting_coscreener_for_user, citation_pending_for_user,
+    fulltext_awaiting_coscreener_for_user, fulltext_pending_for_user)
+from colandr.models import Study
+
+
+OLD_QUERIES = {
+    'citation_pending': """
+        SELECT COUNT(*) FROM studies
+        WHERE review_id = {review_id} AND id IN (
+            SELECT t.id
+            FROM (SELECT studies.id, studies.dedupe_status, studies.citation_status, screenings.user_ids
+                  FROM studies
+                  LEFT JOIN (SELECT citation_id, ARRAY_AGG(user_id) AS user_ids
+                             FROM citation_screenings
+                             GROUP BY citation_id
+                             ) AS screenings
+                  ON studies.id = screenings.citation_id
+                  ) AS t
+            WHERE
+                t.dedupe_status = 'not_duplicate'
+                AND t.citation_status NOT IN ('excluded', 'included', 'conflict')
+                AND (t.citation_status = 'not_screened' OR NOT {user_id} = ANY(t.user_ids)))
+        """,
+    'citation_awaiting_coscreener': """
+        SELECT COUNT(*) FROM studies
+        WHERE review_id = {review_id} AND id IN (
+            SELECT t.id
+            FROM (SELECT studies.id, studies.citation_status, screenings.user_ids
+                  FROM studies
+                  LEFT JOIN (SELECT citation_id, ARRAY_AGG(user_id) AS user_ids
+                             FROM citation_screenings
+                             GROUP BY citation_id
+                             ) AS screenings
+                  ON studies.id = screenings.citation_id
+                  ) AS t
+            WHERE t.citation_status = 'screened_once' AND {user_id} = ANY(t.user_ids))
+        """,
+    'fulltext_pending': """
+        SELECT COUNT(*) FROM studies
+        WHERE review_id = {review_id} AND id IN (
+            SELECT t.id
+            FROM (SELECT studies.id, studies.citation_status, studies.fulltext_status, screenings.user_ids
+                  FROM studies
+                  LEFT JOIN (SELECT fulltext_id, ARRAY_AGG(user_id) AS user_ids
+                             FROM fulltext_screenings
+                             GROUP BY fulltext_id
+                             ) AS screenings
+                  ON studies.id = screenings.fulltext_id
+                  ) AS t
+            WHERE
+                t.citation_status = 'included'
+                AND t.fulltext_status NOT IN ('excluded', 'included', 'conflict')
+                AND (t.fulltext_status = 'not_screened' OR NOT {user_id} = ANY(t.user_ids)))
+        """,
+    'fulltext_awaiting_coscreener': """
+        SELECT COUNT(*) FROM studies
+        WHERE review_id = {review_id} AND id IN (
+            SELECT t.id
+            FROM (SELECT studies.id, studies.fulltext_status, screenings.user_ids
+                  FROM studies
+                  LEFT JOIN (SELECT fulltext_id, ARRAY_AGG(user_id) AS user_ids
+                             FROM fulltext_screenings
+                             GROUP BY fulltext_id
+                             ) AS screenings
+                  ON studies.id = screenings.fulltext_id
+                  ) AS t
+            WHERE t.fulltext_status = 'screened_once' AND {user_id} = ANY(t.user_ids))
+        """,
+    }
+
+NEW_FILTERS = {
+    'citation_pending': citation_pending_for_user,
+    'citation_awaiting_coscreener': citation_awaiting_coscreener_for_user,
+    'fulltext_pending': fulltext_pending_for_user,
+    'fulltext_awaiting_coscreener': fulltext_awaiting_coscreener_for_user,
+    }
+
+
+def get_new_query(name, review_id, user_id):
+    stmt = select([func.count()])\
+        .select_from(Study.__table__)\
+        .where(Study.review_id == review_id)\
+        .where(NEW_FILTERS[name](user_id))
+    return str(stmt.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+
+
+def time_query(conn, query, n_runs):
+    timings = []
+    for _ in range(n_runs):
+        start_time = time.time()
+        result = conn.execute(text(query)).scalar()
+        timings.append(time.time() - start_time)
+    return result, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark old vs. new per-user screening queue queries.')
+    parser.add_argument('--review_id', type=int, required=True)
+    parser.add_argument('--user_id', type=int, required=True)
+    parser.add_argument('--n_runs', type=int, default=5)
+    parser.add_argument('--explain', action='store_true', default=False,
+                        help='print EXPLAIN ANALYZE output for each query')
+    parser.add_argument('--config', type=str,
+                        default=os.getenv('COLANDR_FLASK_CONFIG', 'default'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for name in sorted(OLD_QUERIES.keys()):
+                queries = (
+                    ('old', OLD_QUERIES[name].format(review_id=args.review_id, user_id=args.user_id)),
+                    ('new', get_new_query(name, args.review_id, args.user_id)),
+                    )
+                for version, query in queries:
+                    count, timings = time_query(conn, query, args.n_runs)
+                    print('{:<30} {:<4} count={:<8} median={:.4f}s min={:.4f}s'.format(
+                        name, version, count, statistics.median(timings), min(timings)))
+                    if args.explain is True:
+                        for row in conn.execute(text('EXPLAIN ANALYZE ' + query)):
+                            print('    ' + row[0])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Benchmark the latency of single citation screening writes -- i.e. what a
+screening POST costs, including the model event that updates the screened
+study's status, its fulltext record, and the review's counters -- for a given
+review and user. Every write is rolled back, so no data is changed. Run it
+on the commits before and after a change to the screening write path:
+
+    $ python scripts/benchmark_screening_writes.py --review_id 1 --user_id 2 --n 200
+
+With ``--bulk``, instead screen all ``n`` citations in one set-based write, as
+the bulk screening endpoint does, and report decisions per second.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from colandr import create_app, db
+from colandr.models import CitationScreening, Study, update_screening_statuses
+from colandr.api.screenings import upsert_screenings
+from colandr.api.screening_queues import citation_pending_for_user
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark single citation screening write latency.')
+    parser.add_argument('--review_id', type=int, required=True)
+    parser.add_argument('--user_id', type=int, required=True)
+    parser.add_argument('--n', type=int, default=100,
+                        help='number of pending citations to screen')
+    parser.add_argument('--status', type=str, default='included',
+                        choices=['included', 'excluded'])
+    parser.add_argument('--bulk', action='store_true', default=False,
+                        help='screen all citations in a single bulk write')
+    parser.add_argument('--config', type=str,
+                        default=os.getenv('COLANDR_FLASK_CONFIG', 'default'))
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context():
+        citation_ids = [
+            row[0] for row in
+            db.session.query(Study.id)
+            .filter(Study.review_id == args.review_id)
+            .filter(citation_pending_for_user(args.user_id))
+            .order_by(Study.id)
+            .limit(args.n)]
+        if not citation_ids:
+            print('no pending citations found for this review and user')
+            return 1
+        if args.bulk is True:
+            return benchmark_bulk(args, citation_ids)
+        timings = []
+        for citation_id in citation_ids:
+            start_time = time.time()
+            db.session.add(CitationScreening(
+                args.review_id, args.user_id, citation_id, args.status,
+                exclude_reasons=['benchmark'] if args.status == 'excluded' else None))
+            db.session.flush()
+            timings.append(time.time() - start_time)
+            db.session.rollback()
+        timings.sort()
+        print('{} screenings: median={:.2f}ms p95={:.2f}ms max={:.2f}ms'.format(
+            len(timings),
+            1000 * statistics.median(timings),
+            1000 * timings[int(0.95 * (len(timings) - 1))],
+            1000 * timings[-1]))
+
+
+def benchmark_bulk(args, citation_ids):
+    screenings = [
+        {'study_id': citation_id, 'status': args.status,
+         'exclude_reasons': ['benchmark'] if args.status == 'excluded' else None}
+        for citation_id in citation_ids]
+    with db.engine.connect() as connection:
+        trans = connection.begin()
+        start_time = time.time()
+        upsert_screenings(
+            connection, 'citation', args.review_id, args.user_id, screenings)
+        update_screening_statuses(
+            connection, 'citation', args.review_id, citation_ids)
+        elapsed_time = time.time() - start_time
+        trans.rollback()
+    print('{} screenings in {:.2f}ms: {:.0f} decisions/sec'.format(
+        len(screenings), 1000 * elapsed_time, len(screenings) / elapsed_time))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+from colandr.lib.parsers.bibtex import BibTexFile
+
+
+BIBTEX = """@string{jcb = "Journal of Conservation Biology"}
+
+@article{smith2016,
+  title = {Fishing for answers},
+  author = {Smith, Jane and Doe, John},
+  journal = jcb,
+  abstract = {Corresponding author:
+@jsmith on most platforms, or jsmith@example.org.
+  Results were mixed.},
+  year = {2016}
+}
+
+@article{jones2017,
+  title = {Counting {C}oral},
+  author = {Jones, Ann},
+  journal = jcb,
+  year = {2017}
+}
+
+  @comment{this line is indented, but starts no entry within braces}
+@book(lee2018,
+  title = {Mangroves},
+  author = {Lee, Kim},
+  year = {2018}
+)
+"""
+
+
+def _parse(chunk_size):
+    return list(BibTexFile(io.StringIO(BIBTEX), chunk_size=chunk_size).parse())
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 500])
+def test_chunked_parse_matches_whole_file_parse(chunk_size):
+    records = _parse(None)
+    assert [record['reference_id'] for record in records] == ['smith2016', 'jones2017', 'lee2018']
+    assert _parse(chunk_size) == records
+
+
+def test_macros_carry_over_to_later_chunks():
+    records = _parse(1)
+    assert all(record['journal_name'] == 'Journal of Conservation Biology'
+               for record in records[:2])
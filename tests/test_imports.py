@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from colandr.api.imports import _format_copy_value
+
+
+COPY_ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+
+
+def _parse_copy_field(field):
+    """Decode a field in Postgres' ``COPY`` text format, as the server would."""
+    if field == '\\N':
+        return None
+    chars = []
+    i = 0
+    while i < len(field):
+        char = field[i]
+        if char == '\\':
+            i += 1
+            char = COPY_ESCAPES.get(field[i], field[i])
+        chars.append(char)
+        i += 1
+    return ''.join(chars)
+
+
+def _parse_array_literal(literal):
+    """Decode a one-dimensional Postgres array literal of quoted elements."""
+    assert literal[0] == '{' and literal[-1] == '}'
+    elements = []
+    i = 1
+    while literal[i] != '}':
+        assert literal[i] == '"'
+        i += 1
+        chars = []
+        while literal[i] != '"':
+            if literal[i] == '\\':
+                i += 1
+            chars.append(literal[i])
+            i += 1
+        elements.append(''.join(chars))
+        i += 1
+        if literal[i] == ',':
+            i += 1
+    return elements
+
+
+def _round_trip(value):
+    field = _format_copy_value(value)
+    # a raw tab or newline would split the field or the row
+    assert '\t' not in field and '\n' not in field and '\r' not in field
+    return _parse_copy_field(field)
+
+
+@pytest.mark.parametrize('value', [
+    'plain',
+    'tab\there',
+    'new\nline\r\n',
+    'back\\slash',
+    '\\N',
+    '',
+    ])
+def test_string_round_trips(value):
+    assert _round_trip(value) == value
+
+
+def test_none_is_null():
+    assert _format_copy_value(None) == '\\N'
+    assert _round_trip(None) is None
+
+
+def test_literal_backslash_n_is_not_null():
+    assert _round_trip('\\N') == '\\N'
+
+
+def test_array_elements_round_trip():
+    value = ('say "hi"', 'back\\slash', 'a,b', '{braces}', 'new\nline', 'tab\there', 'NULL', '')
+    assert _parse_array_literal(_round_trip(value)) == list(value)
+    assert _parse_array_literal(_round_trip(list(value))) == list(value)
+
+
+def test_empty_array():
+    assert _round_trip(()) == '{}'
+
+
+def test_dict_round_trips():
+    value = {'notes': 'tab\there', 'path': 'C:\\dir', 'quote': '"', 'lines': ['a\nb'], 'n': 1}
+    assert json.loads(_round_trip(value)) == value
+
+
+def test_numbers_round_trip():
+    assert _round_trip(2016) == '2016'
+    assert _round_trip(1.5) == '1.5'